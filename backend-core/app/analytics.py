@@ -1,54 +1,56 @@
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from collections import defaultdict
-from app.database import db_manager
+from functools import wraps
+import inspect
+from app.database import ChromaDBManager, CommentsSnapshot
 from app.config import settings
 from app.models import CrisisLevel, CrisisAlert, Platform
-from app.openai_service import openai_service
+from app.issue_clusters import IssueClusterer
+from app.issue_summaries import IssueSummaryService, merge_summaries
+from app.openai_service import OpenAIService
+from app.profiling import annotate, stage
+from app.shard_analytics import SENTIMENTS, SEVERITIES, ColumnarComments, ShardedAnalytics
+from app.singleflight import SingleFlight, normalize_key
+import logging
 
+logger = logging.getLogger(__name__)
 
-class AnalyticsService:
+# Секції /api/dashboard (у порядку обчислення)
+DASHBOARD_SECTIONS = ("statistics", "reputation_score", "brands", "alerts", "reviews", "top_issues")
+
+
+def score_comments(metadatas: List[dict]) -> dict:
+    """Оцінка репутації (0-100) за набором коментарів
+
+    Одна формула для поточної оцінки і денної історії: sentiment (позитив 1,
+    нейтрал 0.5, негатив 0) і, якщо є, рейтинги (60% / 40%).
+    """
+    # Підрахунок по sentiment
+    sentiment_counts = {"positive": 0, "negative": 0, "neutral": 0}
+    platform_sentiments = defaultdict(lambda: {"positive": 0, "negative": 0, "neutral": 0, "total": 0})
+    ratings = []
     
-    def calculate_reputation_score(self) -> dict:
-        """Розраховує загальну оцінку репутації (0-100)"""
-        all_comments = db_manager.get_all_comments()
+    for metadata in metadatas:
+        sentiment = metadata.get("sentiment", "neutral")
+        platform = metadata.get("platform", "unknown")
+        rating = metadata.get("rating", 0)
         
-        if not all_comments["metadatas"]:
-            return {
-                "overall_score": 50.0,
-                "trend": "stable",
-                "risk_level": CrisisLevel.LOW,
-                "platform_scores": {},
-                "last_updated": datetime.now()
-            }
-        
-        # Підрахунок по sentiment
-        sentiment_counts = {"positive": 0, "negative": 0, "neutral": 0}
-        platform_sentiments = defaultdict(lambda: {"positive": 0, "negative": 0, "neutral": 0, "total": 0})
-        ratings = []
-        
-        for metadata in all_comments["metadatas"]:
-            sentiment = metadata.get("sentiment", "neutral")
-            platform = metadata.get("platform", "unknown")
-            rating = metadata.get("rating", 0)
-            
-            sentiment_counts[sentiment] += 1
-            platform_sentiments[platform][sentiment] += 1
-            platform_sentiments[platform]["total"] += 1
-            
-            if rating > 0:
-                ratings.append(rating)
-        
-        total = sum(sentiment_counts.values())
-        if total == 0:
-            return {
-                "overall_score": 50.0,
-                "trend": "stable",
-                "risk_level": CrisisLevel.LOW,
-                "platform_scores": {},
-                "last_updated": datetime.now()
-            }
+        sentiment_counts[sentiment] += 1
+        platform_sentiments[platform][sentiment] += 1
+        platform_sentiments[platform]["total"] += 1
         
+        if rating > 0:
+            ratings.append(rating)
+    
+    return score_from_counts(sentiment_counts, platform_sentiments, sum(ratings), len(ratings))
+
+
+def score_from_counts(sentiment_counts: dict, platform_sentiments: dict, rating_sum: float, rating_count: int) -> dict:
+    """Оцінка репутації з готових лічильників (прохід по metadata або агрегат шардів)"""
+    total = sum(sentiment_counts.values())
+    score = None
+    if total:
         # Базовий розрахунок: позитив +1, нейтрал 0, негатив -1
         score = (
             (sentiment_counts["positive"] * 1.0 + 
@@ -57,13 +59,119 @@ class AnalyticsService:
         ) * 100
         
         # Якщо є рейтинги, враховуємо їх
-        if ratings:
-            avg_rating = sum(ratings) / len(ratings)
+        if rating_count:
+            avg_rating = rating_sum / rating_count
             rating_score = (avg_rating / 5.0) * 100
             score = (score * 0.6 + rating_score * 0.4)  # 60% sentiment, 40% rating
+    
+    # Розрахунок по платформах
+    platform_scores = {}
+    for platform, sentiments in platform_sentiments.items():
+        if sentiments["total"] > 0:
+            platform_score = (
+                (sentiments["positive"] * 1.0 + 
+                 sentiments["neutral"] * 0.5) / sentiments["total"]
+            ) * 100
+            platform_scores[platform] = round(platform_score, 1)
+    
+    return {
+        "score": score,
+        "sentiment_counts": sentiment_counts,
+        "platform_scores": platform_scores,
+        "volume": total,
+        "average_rating": round(rating_sum / rating_count, 2) if rating_count else None
+    }
+
+
+def trend_direction(recent_score: float, recent_count: int, previous_score: float, previous_count: int) -> str:
+    """Тренд: середній sentiment останніх 7 днів проти попередніх 7"""
+    if recent_count == 0 or previous_count == 0:
+        return "stable"
+    
+    recent_avg = recent_score / recent_count
+    previous_avg = previous_score / previous_count
+    
+    if recent_avg > previous_avg + 0.1:
+        return "up"
+    elif recent_avg < previous_avg - 0.1:
+        return "down"
+    else:
+        return "stable"
+
+
+def _scan_limit() -> Optional[int]:
+    """Скільки коментарів читає аналітика (None - усі)"""
+    return settings.ANALYTICS_SCAN_LIMIT or None
+
+
+def _coalesced(name: str):
+    """Однакові одночасні виклики (ті самі аргументи і версія даних) рахуються один раз"""
+    def decorator(method):
+        signature = inspect.signature(method)
+        
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            # get_statistics(), get_statistics(None) і get_statistics(filters={}) - один ключ
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            # snapshot - лише джерело тих самих даних, у ключ не входить
+            params = {k: v for k, v in bound.arguments.items() if k not in ("self", "snapshot")}
+            key = (name, normalize_key(params), self.db.data_version)
+            return self.single_flight.do(key, lambda: method(self, *args, **kwargs), cache=f"analytics_{name}")
+        return wrapper
+    return decorator
+
+
+class AnalyticsService:
+    def __init__(
+        self,
+        db: ChromaDBManager,
+        openai: OpenAIService,
+        issue_summaries: IssueSummaryService = None,
+        issue_clusters: IssueClusterer = None,
+        shards: ShardedAnalytics = None
+    ):
+        self.db = db
+        self.openai = openai
+        self.issue_summaries = issue_summaries or IssueSummaryService(db, openai)
+        self.issue_clusters = issue_clusters or IssueClusterer(db)
+        # Великі корпуси агрегуються шардами в пулі процесів (пул стартує при першому такому запиті)
+        self.shards = shards or ShardedAnalytics()
+        # Результати спільні для всіх, хто чекав, - їх не можна змінювати на місці
+        self.single_flight = SingleFlight(memo_seconds=settings.ANALYTICS_MEMO_SECONDS)
+    
+    @_coalesced("reputation_score")
+    def calculate_reputation_score(self, brand_name: str = None, snapshot: CommentsSnapshot = None) -> dict:
+        """Розраховує оцінку репутації (0-100): загальну або одного бренду"""
+        with self.shards.lease(self.db) as columns:
+            if columns is not None:
+                aggregate = self.shards.aggregate(columns, [columns.group({"brand_name": brand_name})])[0]
+                components = score_from_counts(**self._aggregate_counts(columns, aggregate))
+                trend = trend_direction(*aggregate["trend"])
+            else:
+                all_comments = self.db.get_all_comments(limit=_scan_limit(), snapshot=snapshot)
+                if brand_name:
+                    all_comments = {
+                        "metadatas": [m for m in all_comments["metadatas"] if m.get("brand_name") == brand_name]
+                    }
+                components = score_comments(all_comments["metadatas"])
+                trend = None
+        
+        sentiment_counts = components["sentiment_counts"]
+        total = components["volume"]
+        if total == 0:
+            return {
+                "overall_score": 50.0,
+                "trend": "stable",
+                "risk_level": CrisisLevel.LOW,
+                "platform_scores": {},
+                "last_updated": datetime.now()
+            }
+        score = components["score"]
         
-        # Розрахунок тренду (порівняння останніх 7 днів з попередніми 7)
-        trend = self._calculate_trend(all_comments)
+        if trend is None:
+            # Розрахунок тренду (порівняння останніх 7 днів з попередніми 7)
+            trend = self._calculate_trend(all_comments)
         
         # Визначення рівня ризику
         negative_ratio = sentiment_counts["negative"] / total if total > 0 else 0
@@ -74,15 +182,7 @@ class AnalyticsService:
         else:
             risk_level = CrisisLevel.LOW
         
-        # Розрахунок по платформах
-        platform_scores = {}
-        for platform, sentiments in platform_sentiments.items():
-            if sentiments["total"] > 0:
-                platform_score = (
-                    (sentiments["positive"] * 1.0 + 
-                     sentiments["neutral"] * 0.5) / sentiments["total"]
-                ) * 100
-                platform_scores[platform] = round(platform_score, 1)
+        platform_scores = components["platform_scores"]
         
         return {
             "overall_score": round(score, 1),
@@ -127,22 +227,17 @@ class AnalyticsService:
                 previous_score += sentiment_value
                 previous_count += 1
         
-        if recent_count == 0 or previous_count == 0:
-            return "stable"
-        
-        recent_avg = recent_score / recent_count
-        previous_avg = previous_score / previous_count
-        
-        if recent_avg > previous_avg + 0.1:
-            return "up"
-        elif recent_avg < previous_avg - 0.1:
-            return "down"
-        else:
-            return "stable"
+        return trend_direction(recent_score, recent_count, previous_score, previous_count)
     
-    def get_statistics(self, filters: dict = None) -> dict:
+    @_coalesced("statistics")
+    def get_statistics(self, filters: dict = None, snapshot: CommentsSnapshot = None) -> dict:
         """Повертає повну статистику з можливістю фільтрації"""
-        all_comments = db_manager.get_all_comments()
+        with self.shards.lease(self.db) as columns:
+            if columns is not None:
+                return self._sharded_statistics(columns, [filters], snapshot)[0]
+        
+        all_comments = self.db.get_all_comments(limit=_scan_limit(), snapshot=snapshot)
+        rows_scanned = len(all_comments["metadatas"])
         
         # Фільтруємо коментарі якщо є фільтри
         if filters:
@@ -208,7 +303,6 @@ class AnalyticsService:
         
         sentiment_distribution = {"positive": 0, "negative": 0, "neutral": 0}
         platform_distribution = defaultdict(int)
-        category_counts = defaultdict(int)
         severity_distribution = {"low": 0, "medium": 0, "high": 0, "critical": 0}
         ratings = []
         timeline_data = defaultdict(lambda: {"positive": 0, "negative": 0, "neutral": 0})
@@ -216,7 +310,6 @@ class AnalyticsService:
         for metadata in all_comments["metadatas"]:
             sentiment = metadata.get("sentiment", "neutral")
             platform = metadata.get("platform", "unknown")
-            category = metadata.get("category", "general")
             severity = metadata.get("severity", "medium")
             rating = metadata.get("rating", 0)
             
@@ -231,13 +324,6 @@ class AnalyticsService:
             platform_distribution[platform] += 1
             severity_distribution[severity] += 1
             
-            # Обробка категорій (може бути строкою з комами)
-            if ", " in category:
-                for cat in category.split(", "):
-                    category_counts[cat.strip()] += 1
-            else:
-                category_counts[category] += 1
-            
             if rating > 0:
                 ratings.append(rating)
             
@@ -245,11 +331,8 @@ class AnalyticsService:
             date_key = timestamp.strftime("%Y-%m-%d")
             timeline_data[date_key][sentiment] += 1
         
-        # Топ категорії
-        top_categories = [
-            {"category": cat, "count": count}
-            for cat, count in sorted(category_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-        ]
+        # Топ категорії: по кодах канонічних категорій
+        top_categories = self.db.categories.top(all_comments["metadatas"], limit=10)
         
         # Timeline список
         timeline_list = [
@@ -257,7 +340,9 @@ class AnalyticsService:
             for date, sentiments in sorted(timeline_data.items())
         ]
         
-        reputation_score = self.calculate_reputation_score()
+        reputation_score = self.calculate_reputation_score(snapshot=snapshot)
+        
+        annotate(filters=filters, rows_scanned=rows_scanned, rows_returned=len(all_comments["metadatas"]))
         
         return {
             "total_mentions": len(all_comments["metadatas"]),
@@ -276,7 +361,7 @@ class AnalyticsService:
         hour_ago = now - timedelta(hours=1)
         
         # Отримуємо коментарі за останню годину
-        recent_comments = db_manager.get_comments_by_timerange(hour_ago, now)
+        recent_comments = self.db.get_comments_by_timerange(hour_ago, now)
         
         if not recent_comments["metadatas"]:
             return None
@@ -325,17 +410,14 @@ class AnalyticsService:
         else:
             crisis_level = CrisisLevel.LOW
         
-        # Аналіз LLM для рекомендацій
-        mentions_data = [
-            {
-                "body": doc,
-                "sentiment": meta.get("sentiment"),
-                "platform": meta.get("platform")
-            }
-            for doc, meta in zip(recent_comments["documents"][:20], recent_comments["metadatas"][:20])
-        ]
-        
-        llm_analysis = openai_service.analyze_crisis_severity(mentions_data)
+        # Резюме негативу (спільне з алертами і чатом): LLM для нових згадок - у фоні,
+        # тут лише збережене (вікно в годину може захопити вчорашній день)
+        self.issue_summaries.schedule(
+            None,
+            zip(recent_comments["ids"], recent_comments["documents"], recent_comments["metadatas"])
+        )
+        summaries = self.issue_summaries.cached(None, days=2)
+        llm_analysis = merge_summaries(summaries) if summaries else {}
         
         # Визначення платформи з найбільшим негативом
         platform_negatives = defaultdict(int)
@@ -348,15 +430,15 @@ class AnalyticsService:
         return CrisisAlert(
             crisis_level=crisis_level,
             platform=Platform(main_platform) if main_platform else None,
-            description=llm_analysis.get("summary", f"Виявлено сплеск негативних згадувань: {mentions_last_hour} за годину (baseline: {baseline})"),
+            description=llm_analysis.get("summary") or f"Виявлено сплеск негативних згадувань: {mentions_last_hour} за годину (baseline: {baseline})",
             affected_count=mentions_last_hour,
             critical_keywords=critical_keywords,
             timestamp=now,
-            recommendations=llm_analysis.get("recommendations", [
+            recommendations=llm_analysis.get("recommendations") or [
                 "Перевірити статус сервісів",
                 "Підготувати офіційну заяву",
                 "Активувати кризову команду"
-            ])
+            ]
         )
     
     def _calculate_baseline(self) -> float:
@@ -364,7 +446,7 @@ class AnalyticsService:
         now = datetime.now()
         start = now - timedelta(days=settings.BASELINE_DAYS)
         
-        all_comments = db_manager.get_comments_by_timerange(start, now)
+        all_comments = self.db.get_comments_by_timerange(start, now)
         
         if not all_comments["metadatas"]:
             return 1.0  # Мінімальний baseline
@@ -374,17 +456,79 @@ class AnalyticsService:
         
         return max(mentions_per_hour, 1.0)  # Мінімум 1
 
+    def _sharded_statistics(self, columns: ColumnarComments, filters_list: List[dict], snapshot: CommentsSnapshot = None) -> List[dict]:
+        """get_statistics для кількох наборів фільтрів одним шардованим проходом"""
+        aggregates = self.shards.aggregate(columns, [columns.group(filters) for filters in filters_list])
+        reputation_score = self.calculate_reputation_score(snapshot=snapshot)
+        
+        results = []
+        for filters, aggregate in zip(filters_list, aggregates):
+            counts = self._aggregate_counts(columns, aggregate)
+            severity_distribution = {severity: 0 for severity in SEVERITIES}
+            for severity, count in zip(columns.vocab["severity"], aggregate["severity"].tolist()):
+                if count or severity in severity_distribution:
+                    severity_distribution[severity] = count
+            
+            sentiments = columns.vocab["sentiment"]
+            timeline_data = defaultdict(lambda: {"positive": 0, "negative": 0, "neutral": 0})
+            for key, count in aggregate["timeline"].items():
+                day, code = divmod(key, len(sentiments))
+                timeline_data[day][sentiments[code]] = count
+            
+            annotate(filters=filters, rows_scanned=columns.rows, rows_returned=aggregate["rows"], shards=self.shards.workers)
+            results.append({
+                "total_mentions": aggregate["rows"],
+                "sentiment_distribution": counts["sentiment_counts"],
+                "platform_distribution": {
+                    platform: sentiments_count["total"] for platform, sentiments_count in counts["platform_sentiments"].items()
+                },
+                "severity_distribution": severity_distribution,
+                "average_rating": round(aggregate["rating_sum"] / aggregate["rating_count"], 2) if aggregate["rating_count"] else None,
+                "top_categories": self.db.categories.top_counts(self.db.categories.count_masks(aggregate["masks"]), limit=10),
+                "timeline_data": [
+                    {"date": datetime.fromordinal(day).strftime("%Y-%m-%d"), **sentiments_count}
+                    for day, sentiments_count in sorted(timeline_data.items())
+                ],
+                "reputation_score": reputation_score
+            })
+        return results
+    
+    @staticmethod
+    def _aggregate_counts(columns: ColumnarComments, aggregate: dict) -> dict:
+        """Агрегат шардів -> аргументи score_from_counts (як у проході по metadata)"""
+        sentiments = columns.vocab["sentiment"]
+        matrix = aggregate["platform_sentiment"].reshape(len(columns.vocab["platform"]), len(sentiments))
+        
+        sentiment_counts = {sentiment: 0 for sentiment in SENTIMENTS}
+        for sentiment, count in zip(sentiments, matrix.sum(axis=0).tolist()):
+            if count or sentiment in sentiment_counts:
+                sentiment_counts[sentiment] = count
+        platform_sentiments = {}
+        for platform, row in zip(columns.vocab["platform"], matrix.tolist()):
+            if sum(row):
+                platform_sentiments[platform] = {**dict(zip(sentiments, row)), "total": sum(row)}
+        
+        return {
+            "sentiment_counts": sentiment_counts,
+            "platform_sentiments": platform_sentiments,
+            "rating_sum": aggregate["rating_sum"],
+            "rating_count": aggregate["rating_count"],
+        }
+    
     def compare_brands(self, brand_names: List[str], filters: dict = None) -> List[dict]:
         """Порівняння брендів"""
         comparisons = []
+        # Додаємо brand_name до фільтрів
+        brand_filters = [{**(filters or {}), "brand_name": brand_name} for brand_name in brand_names]
         
-        for brand_name in brand_names:
-            # Додаємо brand_name до фільтрів
-            brand_filters = filters.copy() if filters else {}
-            brand_filters["brand_name"] = brand_name
-            
-            # Отримуємо статистику для бренду
-            stats = self.get_statistics(filters=brand_filters)
+        with self.shards.lease(self.db) as columns:
+            if columns is not None:
+                # Великий корпус: усі бренди одним проходом по шардах
+                brand_stats = self._sharded_statistics(columns, brand_filters)
+            else:
+                brand_stats = [self.get_statistics(filters=f) for f in brand_filters]
+        
+        for brand_name, stats in zip(brand_names, brand_stats):
             
             if stats["total_mentions"] == 0:
                 continue
@@ -437,7 +581,8 @@ class AnalyticsService:
         
         return comparisons
 
-    def check_negative_spike_alert(self, brand_name: str = None) -> Optional[dict]:
+    @_coalesced("negative_spike_alert")
+    def check_negative_spike_alert(self, brand_name: str = None, snapshot: CommentsSnapshot = None) -> Optional[dict]:
         """Перевірка різкого збільшення негативних згадок"""
         from datetime import timezone
         
@@ -446,7 +591,7 @@ class AnalyticsService:
         four_days_ago = now - timedelta(days=settings.ALERT_CHECK_DAYS * 2)
         
         # Отримуємо коментарі за останні 2 дні
-        all_recent = db_manager.get_all_comments(limit=10000)
+        all_recent = self.db.get_all_comments(limit=10000, snapshot=snapshot)
         
         recent_comments = {
             "ids": [],
@@ -516,29 +661,20 @@ class AnalyticsService:
         # Перевірка чи є збільшення
         if negative_increase_ratio >= settings.ALERT_NEGATIVE_INCREASE_THRESHOLD:
             # Збираємо топ проблем
-            category_counts = defaultdict(int)
-            for meta in recent_comments["metadatas"]:
-                if meta.get("sentiment") == "negative":
-                    category = meta.get("category", "general")
-                    if ", " in category:
-                        for cat in category.split(", "):
-                            category_counts[cat.strip()] += 1
-                    else:
-                        category_counts[category] += 1
-            
-            top_issues = [
-                {"category": cat, "count": count}
-                for cat, count in sorted(category_counts.items(), key=lambda x: x[1], reverse=True)
-            ][:5]
+            top_issues = self.db.categories.top(
+                (meta for meta in recent_comments["metadatas"] if meta.get("sentiment") == "negative"),
+                limit=5
+            )
             
-            # Генеруємо AI summary
-            negative_comments = [
-                {"body": doc, "sentiment": meta.get("sentiment"), "platform": meta.get("platform")}
-                for doc, meta in zip(recent_comments["documents"], recent_comments["metadatas"])
-                if meta.get("sentiment") == "negative"
-            ][:20]
-            
-            ai_analysis = openai_service.analyze_negative_spike(negative_comments, negative_increase_ratio)
+            # AI summary - з резюме по днях (спільні з детекцією криз і чатом).
+            # Перевірка йде з ingest, дашборду і live, тому LLM не чекаємо:
+            # нові згадки підсумовуються у фоні, тут - збережені резюме вікна
+            self.issue_summaries.schedule(
+                brand_name,
+                zip(recent_comments["ids"], recent_comments["documents"], recent_comments["metadatas"])
+            )
+            summaries = self.issue_summaries.cached(brand_name, days=settings.ALERT_CHECK_DAYS + 1)
+            ai_analysis = merge_summaries(summaries) if summaries else {}
             
             return {
                 "brand_name": brand_name or "All brands",
@@ -547,7 +683,8 @@ class AnalyticsService:
                 "total_mentions": len(recent_comments["metadatas"]),
                 "increase_ratio": negative_increase_ratio,
                 "baseline_negative": baseline_negative,
-                "ai_summary": ai_analysis.get("summary", "Збільшення негативних згадок"),
+                "ai_summary": ai_analysis.get("summary") or f"Виявлено збільшення негативних згадок у {negative_increase_ratio:.1f} разів. Потрібна увага.",
+                "main_issues": ai_analysis.get("main_issues", []),
                 "top_issues": top_issues,
                 "recommendations": ai_analysis.get("recommendations", [])
             }
@@ -555,5 +692,75 @@ class AnalyticsService:
         return None
 
 
-# Singleton
-analytics_service = AnalyticsService()
+    @_coalesced("brands")
+    def get_brands(self, snapshot: CommentsSnapshot = None) -> List[str]:
+        """Список брендів (з memo, як і решта секцій дашборду)"""
+        return self.db.get_all_brands(snapshot=snapshot)
+
+    @_coalesced("reviews_page")
+    def get_reviews_page(self, filters: dict, snapshot: CommentsSnapshot = None) -> dict:
+        """Сторінка відгуків за фільтрами (як /api/reviews/filter)"""
+        return self.db.filter_comments(filters, snapshot=snapshot)
+
+    def get_dashboard(
+        self,
+        brand_name: str = None,
+        date_from: str = None,
+        date_to: str = None,
+        reviews_limit: int = 20,
+        sections: List[str] = None
+    ) -> dict:
+        """Усі секції дашборду з одного проходу по коментарях
+
+        Кожна секція кешується окремо (тим самим ключем, що й окремий
+        endpoint), тому після запису перераховуються лише ті, чий memo
+        протух, а коментарі читаються не більше одного разу.
+        Помилка однієї секції не ламає решту - вона потрапляє в "errors".
+        """
+        sections = sections or list(DASHBOARD_SECTIONS)
+        snapshot = CommentsSnapshot(self.db)
+
+        period = {"brand_name": brand_name, "date_from": date_from, "date_to": date_to}
+        stats_filters = {k: v for k, v in period.items() if v} or None
+        review_filters = {
+            **{k: v for k, v in period.items() if v},
+            "limit": reviews_limit,
+            "offset": 0,
+            "sort_by": "timestamp",
+            "sort_order": "desc"
+        }
+
+        # Порожнє сховище: секції з коментарів не читають і не рахують нічого
+        empty = self.db.comments_collection.count() == 0
+
+        builders = {
+            "statistics": lambda: self.get_statistics(filters=stats_filters, snapshot=snapshot),
+            "reputation_score": lambda: self.calculate_reputation_score(snapshot=snapshot),
+            "brands": lambda: self.get_brands(snapshot=snapshot),
+            "alerts": lambda: self.check_negative_spike_alert(brand_name=brand_name, snapshot=snapshot) if not empty else None,
+            "reviews": lambda: self.get_reviews_page(review_filters, snapshot=snapshot) if not empty else {
+                "results": [], "total": 0, "filtered_count": 0, "returned_count": 0, "offset": 0, "limit": reviews_limit
+            },
+            # З таблиць кластерів, без читання коментарів
+            "top_issues": lambda: self.issue_clusters.top_issues(brand_name, date_from, date_to, limit=5),
+        }
+
+        result = {}
+        errors = {}
+        for name in sections:
+            try:
+                with stage(f"dashboard_{name}"):
+                    result[name] = builders[name]()
+            except Exception as e:
+                logger.error(f"Dashboard section {name} failed: {str(e)}")
+                errors[name] = str(e)
+
+        annotate(dashboard_sections=sections, comments_reads=snapshot.reads)
+
+        return {
+            "sections": result,
+            "errors": errors,
+            "review_filters": review_filters,
+            "comments_reads": snapshot.reads,
+            "data_version": self.db.data_version
+        }
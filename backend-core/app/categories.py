@@ -0,0 +1,297 @@
+"""
+Канонічні категорії: довільні рядки від LLM -> стабільні коди
+
+Категорії приходять з pdmodule як вільний текст ("оплата", "payment",
+"payments issue"), тому поле category має високу кардинальність, а
+top_categories і фільтр по категоріях рахують синоніми окремо.
+Кожен рядок зводиться до коду канонічної категорії:
+1. точний збіг з аліасом (після нормалізації регістру і розділювачів);
+2. збіг слів з аліасами ("payments issue" -> payments, "payment crash" -> обидві);
+3. збережене рішення для цього рядка (SQLite, спільне для процесів; рядок,
+   якого немає в кеші процесу, перечитується - його міг вирішити інший процес);
+4. косинусна схожість embedding рядка з аліасами (CATEGORY_MATCH_MIN_SIMILARITY),
+   інакше - other. Рішення зберігається, тож embedding на рядок рахується раз.
+   Якщо два процеси вирішили рядок одночасно, обидва беруть збережене першим.
+
+Коди коментаря зберігаються поруч із сирим рядком як бітова маска
+(metadata category_mask, int): біт N - категорія з кодом N. Підрахунок і
+фільтр працюють з масками; для старих записів без маски вона рахується з
+рядка (рішення кешовані). Коди лише дописуються в кінець CANONICAL_CATEGORIES.
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.metrics import CATEGORY_DECISIONS
+
+logger = logging.getLogger(__name__)
+
+# (id, назва, аліаси); код - позиція в списку
+CANONICAL_CATEGORIES = [
+    ("general", "загальне", ["загальне", "general", "общее", "misc"]),
+    ("payment", "оплата", [
+        "оплата", "платіж", "платежі", "оплата карткою", "payment", "payments", "billing", "checkout",
+        "card payment", "платеж", "оплата картой"
+    ]),
+    ("delivery", "доставка", [
+        "доставка", "кур'єр", "delivery", "shipping", "shipment", "logistics", "courier", "курьер"
+    ]),
+    ("app", "додаток", [
+        "додаток", "застосунок", "функціональність", "app", "application", "mobile app",
+        "functionality", "приложение"
+    ]),
+    ("crash", "краш", [
+        "краш", "вилітає", "баги", "баг", "помилка", "збій", "crash", "crashes", "bug", "bugs",
+        "error", "glitch", "вылетает", "ошибка"
+    ]),
+    ("quality", "якість", ["якість", "брак", "quality", "defect", "defects", "качество"]),
+    ("size", "розмір", ["розмір", "розміри", "size", "sizing", "fit", "размер"]),
+    ("support", "підтримка", [
+        "підтримка", "сервіс", "обслуговування", "support", "customer service", "service",
+        "customer support", "поддержка", "сервис"
+    ]),
+    ("returns", "повернення", [
+        "повернення", "обмін", "return", "returns", "refund", "refunds", "exchange", "возврат"
+    ]),
+    ("price", "ціна", ["ціна", "ціни", "вартість", "дорого", "price", "prices", "pricing", "cost", "цена"]),
+    ("interface", "інтерфейс", [
+        "інтерфейс", "навігація", "interface", "ui", "ux", "usability", "navigation", "интерфейс"
+    ]),
+    ("promotions", "акції", [
+        "акції", "акція", "знижки", "знижка", "promotion", "promotions", "discount", "discounts",
+        "sale", "акции", "скидки"
+    ]),
+    ("assortment", "асортимент", [
+        "асортимент", "наявність", "assortment", "range", "selection", "availability", "stock",
+        "ассортимент"
+    ]),
+    ("fraud", "шахрайство", ["шахрайство", "fraud", "scam", "мошенничество"]),
+    ("product", "продукт", ["продукт", "товар", "дизайн", "product", "item", "design", "товары"]),
+    ("order", "замовлення", ["замовлення", "order", "orders", "заказ"]),
+    ("account", "акаунт", [
+        "акаунт", "логін", "реєстрація", "пароль", "account", "login", "sign in", "registration",
+        "password", "аккаунт"
+    ]),
+    ("other", "інше", ["інше", "other", "другое"]),
+]
+
+# Маска зберігається як int64 ChromaDB: біт 63 - знак
+assert len(CANONICAL_CATEGORIES) < 63
+
+CATEGORY_IDS = [category_id for category_id, _, _ in CANONICAL_CATEGORIES]
+CATEGORY_CODES = {category_id: code for code, category_id in enumerate(CATEGORY_IDS)}
+OTHER_CODE = CATEGORY_CODES["other"]
+
+SEPARATORS = re.compile(r"[\s_\-/]+")
+
+
+def normalize_category(raw: str) -> str:
+    return SEPARATORS.sub(" ", (raw or "").strip().lower()).strip()
+
+
+# Нормалізований аліас (а також id і назва) -> код
+ALIASES = {
+    normalize_category(alias): code
+    for code, (category_id, label, aliases) in enumerate(CANONICAL_CATEGORIES)
+    for alias in [category_id, label, *aliases]
+}
+
+
+def mentioned_codes(text: str) -> List[int]:
+    """Коди категорій, аліаси яких трапляються у вільному тексті (без embedding)"""
+    words = re.findall(r"[\w']+", (text or "").lower())
+    padded = f" {' '.join(words)} "
+    return sorted({code for alias, code in ALIASES.items() if f" {alias} " in padded})
+
+
+def split_raw(category: str) -> List[str]:
+    """Рядок metadata category (через кому) -> список сирих категорій"""
+    return [part.strip() for part in (category or "").split(",") if part.strip()]
+
+
+class CategoryCanonicalizer:
+    """Рядок категорії -> коди канонічних категорій (з кешем рішень)"""
+
+    def __init__(self, embed: Callable[[List[str]], list], path: str = None):
+        self.embed = embed
+        self.path = path or settings.CATEGORIES_PATH or os.path.join(
+            settings.CHROMA_PERSIST_DIR, "categories.sqlite3"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._aliases = ALIASES
+        # (нормовані embeddings аліасів, їхні коди) - рахуються при першому невідомому рядку
+        self._alias_vectors = None
+        # Маска по сирому рядку metadata category (для записів без category_mask)
+        self._mask_cache: Dict[str, int] = {}
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS category_decisions (
+                    raw TEXT PRIMARY KEY,
+                    code INTEGER NOT NULL,
+                    similarity REAL NOT NULL,
+                    created_at TEXT NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            self._decisions = {
+                raw: code for raw, code in conn.execute("SELECT raw, code FROM category_decisions")
+            }
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _embedding_match(self, normalized: str) -> Tuple[int, float]:
+        """Без self._lock: inference моделі не має блокувати потоки з відомими рядками"""
+        if self._alias_vectors is None:
+            aliases = list(self._aliases)
+            vectors = np.asarray(self.embed(aliases), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            # Одне присвоєння: інший потік бачить або нічого, або матрицю з кодами
+            self._alias_vectors = (vectors / norms, [self._aliases[alias] for alias in aliases])
+        alias_matrix, alias_codes = self._alias_vectors
+
+        vector = np.asarray(self.embed([normalized])[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return OTHER_CODE, 0.0
+        similarities = alias_matrix @ (vector / norm)
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        if similarity < settings.CATEGORY_MATCH_MIN_SIMILARITY:
+            return OTHER_CODE, similarity
+        return alias_codes[best], similarity
+
+    def _stored_decision(self, normalized: str) -> Optional[int]:
+        """Рішення з SQLite (могло з'явитись від іншого процесу) - і в кеш процесу"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT code FROM category_decisions WHERE raw = ?", (normalized,)).fetchone()
+        if row is None:
+            return None
+        with self._lock:
+            self._decisions[normalized] = row[0]
+        return row[0]
+
+    def _known_codes(self, normalized: str) -> List[int]:
+        """Коди з аліасів і вже збережених рішень (без embedding); [] - невідомий рядок"""
+        if normalized in self._aliases:
+            return [self._aliases[normalized]]
+        matched = [self._aliases[token] for token in normalized.split(" ") if token in self._aliases]
+        if matched:
+            return matched
+        with self._lock:
+            code = self._decisions.get(normalized)
+        if code is None:
+            code = self._stored_decision(normalized)
+        return [code] if code is not None else []
+
+    def codes(self, raw: str) -> List[int]:
+        """Коди канонічних категорій для сирого рядка ("payment crash" - два коди)
+
+        Невідомий рядок зводиться за схожістю і рішення зберігається - лише
+        для категорій з даних (ingest), не для введення користувача (filter_mask).
+        """
+        normalized = normalize_category(raw)
+        if not normalized:
+            return [CATEGORY_CODES["general"]]
+        known = self._known_codes(normalized)
+        if known:
+            return known
+
+        code, similarity = self._embedding_match(normalized)
+        with self._connect() as conn:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO category_decisions VALUES (?, ?, ?, ?)",
+                (normalized, code, similarity, datetime.now().isoformat())
+            ).rowcount
+            # Рядок міг вирішити інший процес чи потік: діє те, що збережено першим
+            code = conn.execute("SELECT code FROM category_decisions WHERE raw = ?", (normalized,)).fetchone()[0]
+        with self._lock:
+            self._decisions[normalized] = code
+        if inserted:
+            CATEGORY_DECISIONS.labels(result="matched" if code != OTHER_CODE else "other").inc()
+            logger.info(f"Category '{raw}' -> {CATEGORY_IDS[code]} (similarity {similarity:.2f})")
+        return [code]
+
+    def mask(self, raws: Iterable[str]) -> int:
+        """Бітова маска кодів для списку сирих категорій"""
+        result = 0
+        for raw in raws:
+            for code in self.codes(raw):
+                result |= 1 << code
+        return result
+
+    def filter_mask(self, raws: Iterable[str]) -> int:
+        """Маска фільтра з введення користувача: лише аліаси і збережені рішення
+
+        Нічого не зберігає і не рахує embedding; нерозпізнаний рядок не дає
+        кодів, тож фільтр лише з таких рядків (маска 0) нічого не знаходить.
+        """
+        result = 0
+        for raw in raws:
+            for code in self._known_codes(normalize_category(raw)):
+                result |= 1 << code
+        return result
+
+    def metadata_mask(self, metadata: dict) -> int:
+        """Маска коментаря: збережена або з рядка category (старі записи)"""
+        stored = metadata.get("category_mask")
+        if stored is not None:
+            return stored
+        category = metadata.get("category") or "general"
+        cached = self._mask_cache.get(category)
+        if cached is None:
+            cached = self._mask_cache[category] = self.mask(split_raw(category))
+        return cached
+
+    @staticmethod
+    def ids(mask: int) -> List[str]:
+        return [category_id for code, category_id in enumerate(CATEGORY_IDS) if mask >> code & 1]
+
+    def count(self, metadatas: Iterable[dict]) -> Counter:
+        """Кількість коментарів по канонічних категоріях (рахуємо маски, а не рядки)"""
+        return self.count_masks(Counter(self.metadata_mask(metadata) for metadata in metadatas))
+
+    def count_masks(self, by_mask: Dict[int, int]) -> Counter:
+        """{маска: кількість коментарів} -> кількість по канонічних категоріях"""
+        counts = Counter()
+        for mask, count in by_mask.items():
+            for category_id in self.ids(mask):
+                counts[category_id] += count
+        return counts
+
+    def top(self, metadatas: Iterable[dict], limit: Optional[int] = 10) -> List[dict]:
+        """top_categories: [{"category", "id", "count"}] (category - назва для показу, id - канонічний id)"""
+        return self.top_counts(self.count(metadatas), limit)
+
+    @staticmethod
+    def top_counts(counts: Counter, limit: Optional[int] = 10) -> List[dict]:
+        labels = {category_id: label for category_id, label, _ in CANONICAL_CATEGORIES}
+        return [
+            {"category": labels[category_id], "id": category_id, "count": count}
+            for category_id, count in counts.most_common(limit)
+        ]
+
+    def catalog(self) -> List[dict]:
+        """Канонічні категорії з кодами і рядками, зведеними до них за схожістю"""
+        with self._lock:
+            decisions = dict(self._decisions)
+        learned = {}
+        for raw, code in sorted(decisions.items()):
+            learned.setdefault(code, []).append(raw)
+        return [
+            {"code": code, "category": category_id, "label": label, "aliases": aliases, "learned": learned.get(code, [])}
+            for code, (category_id, label, aliases) in enumerate(CANONICAL_CATEGORIES)
+        ]
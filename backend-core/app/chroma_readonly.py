@@ -0,0 +1,70 @@
+"""
+Сегменти ChromaDB для процесів, що лише читають (INGEST_MODE=queue)
+
+Пише тільки writer (scripts/ingest_writer.py). API воркер відкриває ту саму
+директорію з ReadOnlySegmentManager:
+- метадані читаються зі спільної SQLite, тож записи writer-а видно одразу,
+  а сам воркер у таблиці метаданих нічого не пише;
+- HNSW сегменти тримаються в пам'яті і ніколи не зберігаються на диск
+  (_persist пропускається); нові записи writer-а вони дочитують з
+  embeddings queue на місці (catch_up), без перевідкриття клієнта.
+
+Підключається через налаштування chroma_segment_manager_impl.
+"""
+from typing import Sequence, Type
+
+from overrides import override
+
+from chromadb.segment import SegmentImplementation, SegmentType
+from chromadb.segment.impl.manager.local import LocalSegmentManager
+from chromadb.segment.impl.metadata.sqlite import SqliteMetadataSegment
+from chromadb.segment.impl.vector.local_persistent_hnsw import PersistentLocalHnswSegment
+from chromadb.types import EmbeddingRecord, Segment
+
+SEGMENT_MANAGER_IMPL = "app.chroma_readonly.ReadOnlySegmentManager"
+
+
+class ReadOnlyHnswSegment(PersistentLocalHnswSegment):
+    """HNSW сегмент читача: файли індексу пише лише writer"""
+
+    @override
+    def _persist(self) -> None:
+        pass
+
+    def catch_up(self) -> None:
+        """Дочитати записи з embeddings queue після max_seq_id сегмента"""
+        if not self._running or not self._topic:
+            return
+        # subscribe одразу доганяє (backfill) записи після start
+        subscription = self._consumer.subscribe(self._topic, self._write_records, start=self.max_seqid())
+        self._consumer.unsubscribe(subscription)
+
+
+class ReadOnlyMetadataSegment(SqliteMetadataSegment):
+    """Сегмент метаданих читача: таблиці наповнює writer"""
+
+    @override
+    def _write_metadata(self, records: Sequence[EmbeddingRecord]) -> None:
+        pass
+
+
+READ_ONLY_IMPLS = {
+    SegmentType.HNSW_LOCAL_PERSISTED: ReadOnlyHnswSegment,
+    SegmentType.SQLITE: ReadOnlyMetadataSegment,
+}
+
+
+class ReadOnlySegmentManager(LocalSegmentManager):
+    """LocalSegmentManager з read-only сегментами"""
+
+    @override
+    def _cls(self, segment: Segment) -> Type[SegmentImplementation]:
+        return READ_ONLY_IMPLS.get(SegmentType(segment["type"])) or super()._cls(segment)
+
+    def catch_up(self) -> None:
+        """Підтягнути записи writer-а в завантажені HNSW сегменти"""
+        with self._lock:
+            instances = list(self._instances.values())
+        for instance in instances:
+            if isinstance(instance, ReadOnlyHnswSegment):
+                instance.catch_up()
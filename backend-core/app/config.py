@@ -6,12 +6,23 @@ load_dotenv()
 
 class Settings:
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
     
     # Telegram Bot
     TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
     TELEGRAM_CHAT_ID: str = os.getenv("TELEGRAM_CHAT_ID", "")
     
     CHROMA_PERSIST_DIR: str = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+    
+    # Embeddings: default (ONNX MiniLM) або hash (офлайн, для бенчмарків/dev)
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "default")
+    HASH_EMBEDDING_DIM: int = int(os.getenv("HASH_EMBEDDING_DIM", "384"))
+    # Пул embedding воркерів: одночасні виклики з різних запитів - один пакет моделі
+    EMBEDDING_BATCHING: bool = os.getenv("EMBEDDING_BATCHING", "true").lower() == "true"
+    EMBEDDING_WORKERS: int = int(os.getenv("EMBEDDING_WORKERS", "2"))
+    EMBEDDING_BATCH_MAX_SIZE: int = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))  # текстів у мікро-пакеті
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "2"))  # очікування доповнення
+    EMBEDDING_INTRA_OP_THREADS: int = int(os.getenv("EMBEDDING_INTRA_OP_THREADS", "0"))  # ONNX; 0 - як вирішить runtime
     PORT: int = int(os.getenv("PORT", "8000"))
     
     # Crisis detection parameters (renamed to Alert Detection)
@@ -27,6 +38,101 @@ class Settings:
     # Baseline calculation
     BASELINE_DAYS: int = 30
     
+    # Прогрів моделі embedding та індексів у фоні після старту
+    WARMUP_ON_STARTUP: bool = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+    
+    # Single-flight аналітики: скільки секунд віддавати готовий результат повторним запитам
+    ANALYTICS_MEMO_SECONDS: float = float(os.getenv("ANALYTICS_MEMO_SECONDS", "2"))
+    # Скільки коментарів читають get_statistics і оцінка репутації (0 - усі)
+    ANALYTICS_SCAN_LIMIT: int = int(os.getenv("ANALYTICS_SCAN_LIMIT", "1000"))
+    # Від скількох рядків агрегація йде шардами в пулі процесів (app/shard_analytics.py, 0 - вимкнено)
+    ANALYTICS_PARALLEL_MIN_ROWS: int = int(os.getenv("ANALYTICS_PARALLEL_MIN_ROWS", "200000"))
+    ANALYTICS_WORKERS: int = int(os.getenv("ANALYTICS_WORKERS", "0"))  # 0 - кількість ядер
+    
+    # Профілювання та slow-query log
+    SLOW_QUERY_THRESHOLD_MS: float = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "1000"))
+    SLOW_QUERY_LOG_SIZE: int = int(os.getenv("SLOW_QUERY_LOG_SIZE", "500"))
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # 0.01 = 1% запитів
+    PROFILE_STORE_SIZE: int = 50
+    
+    # Запис: direct (один воркер) або queue (N воркерів + scripts/ingest_writer.py)
+    INGEST_MODE: str = os.getenv("INGEST_MODE", "direct")
+    INGEST_QUEUE_PATH: str = os.getenv("INGEST_QUEUE_PATH", "")  # за замовчуванням у CHROMA_PERSIST_DIR
+    INGEST_REFRESH_INTERVAL: float = float(os.getenv("INGEST_REFRESH_INTERVAL", "2"))
+    INGEST_WRITER_POLL_INTERVAL: float = float(os.getenv("INGEST_WRITER_POLL_INTERVAL", "0.2"))
+    INGEST_WRITER_BATCH: int = 500  # операцій за один прохід writer
+    INGEST_RETENTION_HOURS: int = 24
+    
+    # Квантизований int8 індекс замість HNSW для пошуку (колекції через кому, напр. "comments")
+    VECTOR_INDEX_COLLECTIONS: list = [
+        name.strip() for name in os.getenv("VECTOR_INDEX_COLLECTIONS", "").split(",") if name.strip()
+    ]
+    VECTOR_INDEX_DIR: str = os.getenv("VECTOR_INDEX_DIR", "")  # за замовчуванням CHROMA_PERSIST_DIR/vector_index
+    VECTOR_INDEX_RERANK_FACTOR: int = int(os.getenv("VECTOR_INDEX_RERANK_FACTOR", "10"))  # кандидатів на результат
+    VECTOR_INDEX_SCAN_CHUNK: int = 16384  # рядків int8 на один крок скану
+    
+    # Денна історія оцінки репутації (scripts/reputation_history.py)
+    REPUTATION_HISTORY_PATH: str = os.getenv("REPUTATION_HISTORY_PATH", "")  # за замовчуванням у CHROMA_PERSIST_DIR
+    REPUTATION_HISTORY_DEFAULT_DAYS: int = 90  # період /api/reputation-score/history без date_from
+    
+    # Резюме проблем по (бренд, день, sentiment) - спільні для алертів, криз і чату
+    ISSUE_SUMMARIES_PATH: str = os.getenv("ISSUE_SUMMARIES_PATH", "")  # SQLite, за замовчуванням у CHROMA_PERSIST_DIR
+    ISSUE_SUMMARY_MIN_NEW_COMMENTS: int = int(os.getenv("ISSUE_SUMMARY_MIN_NEW_COMMENTS", "5"))  # нових згадок для оновлення
+    ISSUE_SUMMARY_MIN_NEW_RATIO: float = 0.2  # ... і не менше цієї частки вже врахованих
+    ISSUE_SUMMARY_SAMPLE: int = 30  # згадок у промпті (найсерйозніші)
+    ISSUE_SUMMARY_DAYS: int = 3  # період /api/issue-summaries і контексту чату
+    
+    # Канонічні категорії (app/categories.py): рішення для невідомих рядків категорій
+    CATEGORIES_PATH: str = os.getenv("CATEGORIES_PATH", "")  # SQLite, за замовчуванням у CHROMA_PERSIST_DIR
+    CATEGORY_MATCH_MIN_SIMILARITY: float = float(os.getenv("CATEGORY_MATCH_MIN_SIMILARITY", "0.6"))  # нижче - other
+    
+    # Кластери проблем з embeddings негативних коментарів (оновлюються при ingest)
+    ISSUE_CLUSTERING: bool = os.getenv("ISSUE_CLUSTERING", "true").lower() == "true"
+    ISSUE_CLUSTERS_PATH: str = os.getenv("ISSUE_CLUSTERS_PATH", "")  # SQLite, за замовчуванням у CHROMA_PERSIST_DIR
+    ISSUE_CLUSTER_NEW_DISTANCE: float = float(os.getenv("ISSUE_CLUSTER_NEW_DISTANCE", "0.4"))  # косинусна, далі - новий кластер
+    ISSUE_CLUSTER_MAX: int = int(os.getenv("ISSUE_CLUSTER_MAX", "200"))
+    ISSUE_CLUSTER_EXAMPLES: int = 3  # прикладів на кластер
+    ISSUE_CLUSTER_SENTIMENTS: list = ["negative"]
+    
+    # Пакетні чернетки відповідей (/api/generate-response/bulk)
+    DRAFTS_PATH: str = os.getenv("DRAFTS_PATH", "")  # SQLite, за замовчуванням у CHROMA_PERSIST_DIR
+    DRAFT_JOB_CONCURRENCY: int = int(os.getenv("DRAFT_JOB_CONCURRENCY", "4"))  # одночасних LLM викликів
+    DRAFT_JOB_KNOWLEDGE_BATCH: int = 64  # коментарів на один пакетний пошук по базі знань
+    DRAFT_JOB_MAX_COMMENTS: int = int(os.getenv("DRAFT_JOB_MAX_COMMENTS", "500"))
+    # Чернетки для high/critical коментарів одразу після ingest (процес, що пише)
+    DRAFT_PRECOMPUTE: bool = os.getenv("DRAFT_PRECOMPUTE", "false").lower() == "true"
+    DRAFT_PRECOMPUTE_SEVERITIES: list = ["high", "critical"]
+    # Ціна OpenAI за 1M токенів (USD) для оцінки вартості задач; за замовчуванням gpt-4o-mini
+    OPENAI_PROMPT_PRICE_PER_1M: float = float(os.getenv("OPENAI_PROMPT_PRICE_PER_1M", "0.15"))
+    OPENAI_COMPLETION_PRICE_PER_1M: float = float(os.getenv("OPENAI_COMPLETION_PRICE_PER_1M", "0.60"))
+    
+    # Live події (/api/live): дельти по брендах для підписаних клієнтів
+    LIVE_SUBSCRIBER_QUEUE: int = int(os.getenv("LIVE_SUBSCRIBER_QUEUE", "200"))  # далі - найстаріші відкидаються
+    LIVE_HEARTBEAT_SECONDS: float = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+    LIVE_STATS_INTERVAL: float = float(os.getenv("LIVE_STATS_INTERVAL", "1"))  # не частіше для одного бренду
+    LIVE_MAX_REVIEWS_PER_BATCH: int = 20  # review подій на бренд з одного запису (решта - у лічильниках)
+    
+    # Токенізатор (tiktoken) для підрахунку токенів промптів і нарізки документів
+    TOKENIZER_ENCODING: str = os.getenv("TOKENIZER_ENCODING", "o200k_base")  # gpt-4o / gpt-4o-mini
+    
+    # Маршрутизація чату: metric (шаблон з агрегатів) / comparison / open (RAG)
+    CHAT_ROUTING: bool = os.getenv("CHAT_ROUTING", "true").lower() == "true"
+    CHAT_ROUTER_MIN_CONFIDENCE: float = float(os.getenv("CHAT_ROUTER_MIN_CONFIDENCE", "0.8"))  # нижче - open
+    
+    # Бюджет токенів на промпт чату (системна інструкція + контекст + запитання)
+    CONTEXT_TOKEN_BUDGETS: dict = {
+        "gpt-4o-mini": 3000,
+        "gpt-4o": 4000,
+    }
+    DEFAULT_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+    # Контекст бази знань у промпті чернеток відповідей
+    RESPONSE_CONTEXT_TOKENS: int = int(os.getenv("RESPONSE_CONTEXT_TOKENS", "800"))
+    
+    # База знань: документи зберігаються чанками
+    KB_CHUNK_TOKENS: int = int(os.getenv("KB_CHUNK_TOKENS", "300"))
+    KB_CHUNK_OVERLAP_TOKENS: int = int(os.getenv("KB_CHUNK_OVERLAP_TOKENS", "50"))
+    KB_MAX_CHUNKS_PER_DOC: int = 2  # скільки чанків одного документа може повернути пошук
+    
     # Collections
     COMMENTS_COLLECTION: str = "comments"
     DOCUMENTS_COLLECTION: str = "documents"
@@ -0,0 +1,98 @@
+"""
+Збирання контексту для промптів у межах бюджету токенів
+
+Кандидати (коментарі, чанки бази знань) ранжуються за релевантністю,
+майже однакові коментарі відкидаються, а решта додається, поки
+вистачає бюджету. Фіксовані частини промпту (системна інструкція,
+статистика, запитання) резервуються наперед.
+"""
+from typing import Dict, List
+
+from app.config import settings
+from app.text_index import tokenize
+from app.tokens import count_tokens, truncate_to_tokens
+
+# Дві репліки з такою часткою спільних слів вважаємо дублікатами
+NEAR_DUPLICATE_JACCARD = 0.8
+
+# Кандидат, для якого лишилось менше токенів, не додаємо навіть обрізаним
+MIN_SNIPPET_TOKENS = 20
+
+
+def context_budget(model: str = None) -> int:
+    """Бюджет токенів на весь промпт для моделі"""
+    model = model or settings.OPENAI_MODEL
+    return settings.CONTEXT_TOKEN_BUDGETS.get(model, settings.DEFAULT_CONTEXT_TOKEN_BUDGET)
+
+
+class ContextBuilder:
+    """Наповнює промпт найрелевантнішими фрагментами до бюджету токенів"""
+
+    def __init__(self, budget_tokens: int):
+        self.budget_tokens = budget_tokens
+        self.reserved_tokens = 0
+        self._candidates = []
+
+    def reserve(self, *texts: str):
+        """Фіксовані частини промпту, що займають бюджет"""
+        self.reserved_tokens += sum(count_tokens(text) for text in texts)
+
+    def add_ranked(self, section: str, snippets: List[str], weight: float = 1.0, max_item_tokens: int = None):
+        """Кандидати секції у порядку спадання релевантності
+
+        Релевантність рахується за рангом (weight / (rank + 1)), тому секції
+        з різних джерел (BM25, вектор, RRF) порівнювані між собою.
+        """
+        for rank, snippet in enumerate(snippets):
+            if snippet:
+                self._candidates.append({
+                    "section": section,
+                    "text": snippet,
+                    "score": weight / (rank + 1),
+                    "max_tokens": max_item_tokens
+                })
+
+    @staticmethod
+    def _is_near_duplicate(terms: set, seen: List[set]) -> bool:
+        for other in seen:
+            union = len(terms | other)
+            if union and len(terms & other) / union >= NEAR_DUPLICATE_JACCARD:
+                return True
+        return False
+
+    def build(self) -> Dict:
+        """Повертає {"sections": {назва: [фрагменти]}, "tokens": використано, "dropped": відкинуто}"""
+        available = self.budget_tokens - self.reserved_tokens
+        sections = {}
+        seen_terms = []
+        used = 0
+        dropped = 0
+
+        for candidate in sorted(self._candidates, key=lambda c: c["score"], reverse=True):
+            terms = set(tokenize(candidate["text"]))
+            if self._is_near_duplicate(terms, seen_terms):
+                dropped += 1
+                continue
+
+            limit = available - used
+            if candidate["max_tokens"]:
+                limit = min(limit, candidate["max_tokens"])
+            if limit < MIN_SNIPPET_TOKENS:
+                dropped += 1
+                continue
+
+            text = truncate_to_tokens(candidate["text"], limit)
+            if not text:
+                dropped += 1
+                continue
+            tokens = count_tokens(text)
+            # +1 на перенос рядка між фрагментами
+            used += tokens + 1
+            seen_terms.append(terms)
+            sections.setdefault(candidate["section"], []).append(text)
+
+        return {
+            "sections": sections,
+            "tokens": self.reserved_tokens + used,
+            "dropped": dropped
+        }
@@ -1,55 +1,329 @@
-import chromadb
-from chromadb.config import Settings as ChromaSettings
 from app.config import settings
+from app.metrics import CHROMA_OPERATION_DURATION, track_duration
+from app.profiling import stage, annotate
+from app.text_index import BM25Index, is_keyword_query, reciprocal_rank_fusion
+from app.tokens import chunk_text
+from app.vector_index import build_vector_indexes
+from app.categories import CategoryCanonicalizer, split_raw
+from contextlib import contextmanager
+import hashlib
+import logging
+import threading
 import uuid
 from typing import List, Dict, Optional
 from datetime import datetime
+from pathlib import Path
 import json
+import time
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# Формат снапшоту (manifest.json -> format_version)
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+class InstrumentedCollection:
+    """Проксі над колекцією ChromaDB, що пише тривалість операцій у метрики"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        # count(), name, metadata та інше - без змін
+        return getattr(self._collection, name)
+
+    @contextmanager
+    def _track(self, operation: str):
+        with stage(f"chroma_{operation}"), track_duration(
+            CHROMA_OPERATION_DURATION,
+            collection=self._collection.name,
+            operation=operation
+        ):
+            yield
+
+    def add(self, *args, **kwargs):
+        with self._track("add"):
+            return self._collection.add(*args, **kwargs)
+
+    def upsert(self, *args, **kwargs):
+        with self._track("upsert"):
+            return self._collection.upsert(*args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        with self._track("get"):
+            return self._collection.get(*args, **kwargs)
+
+    def query(self, *args, **kwargs):
+        with self._track("query"):
+            return self._collection.query(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with self._track("delete"):
+            return self._collection.delete(*args, **kwargs)
+
+
+class CommentsSnapshot:
+    """Один прохід по коментарях на кілька обчислень (дашборд)
+
+    Коментарі читаються один раз з найбільшим лімітом і лише тоді, коли
+    якійсь секції вони справді потрібні (не з кешу). get(limit) віддає
+    префікс - ChromaDB повертає записи в одному порядку, тож це ті самі
+    рядки, що й get_all_comments(limit).
+    """
+
+    def __init__(self, db: "ChromaDBManager", max_limit: int = 10000):
+        self.db = db
+        self.max_limit = max_limit
+        self.reads = 0
+        self._comments = None
+        self._lock = threading.Lock()
+
+    def get(self, limit: Optional[int] = 1000) -> dict:
+        if limit is None or limit > self.max_limit:
+            return self.db.get_all_comments(limit=limit)
+        with self._lock:
+            if self._comments is None:
+                self._comments = self.db.get_all_comments(limit=self.max_limit)
+                self.reads += 1
+        if limit >= len(self._comments["ids"]):
+            return self._comments
+        return {
+            key: self._comments[key][:limit]
+            for key in ("ids", "documents", "metadatas")
+        }
 
 
 class ChromaDBManager:
-    def __init__(self):
+    def __init__(self, ingest_queue=None):
+        # Черга single-writer (INGEST_MODE=queue): записи йдуть у writer-процес
+        self.ingest_queue = ingest_queue
+        # Версія даних: росте з кожним застосованим записом
+        # (у режимі черги - seq з change log, на момент відкриття клієнта)
+        self._data_version = ingest_queue.applied_version() if ingest_queue is not None else 0
+        # BM25 індекс коментарів: будується у warm_up (або при першому пошуку), далі ведеться при записі
+        self._text_index = None
+        self._text_index_lock = threading.Lock()
+        # Слухачі застосованих записів (live події): викликаються після запису
+        self._change_listeners = []
+        # int8 індекси замість HNSW для пошуку (VECTOR_INDEX_COLLECTIONS)
+        self.vector_indexes = build_vector_indexes()
+        # Хеш ID чанків бази знань (рахується при першому зверненні після зміни)
+        self._knowledge_version = None
+        self._open()
+        # Канонічні категорії: embedding функція та сама, що в колекцій (після reload - нова)
+        self.categories = CategoryCanonicalizer(lambda texts: self.embedding_function(texts))
+    
+    def _open(self):
+        """Відкриває клієнт і колекції"""
+        # chromadb імпортуємо тут: імпорт важкий, а app.main має стартувати швидко
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+        from app.embeddings import build_embedding_function
+        
+        chroma_settings = {"anonymized_telemetry": False}
+        if self.ingest_queue is not None:
+            # Процес лише читає: сегменти без запису на диск (app/chroma_readonly.py)
+            from app.chroma_readonly import SEGMENT_MANAGER_IMPL
+            chroma_settings["chroma_segment_manager_impl"] = SEGMENT_MANAGER_IMPL
+        
         self.client = chromadb.PersistentClient(
             path=settings.CHROMA_PERSIST_DIR,
-            settings=ChromaSettings(anonymized_telemetry=False)
+            settings=ChromaSettings(**chroma_settings)
         )
         
+        self.embedding_function = build_embedding_function()
+        
         # Ініціалізація колекцій
-        self.comments_collection = self.client.get_or_create_collection(
+        self.comments_collection = InstrumentedCollection(self.client.get_or_create_collection(
             name=settings.COMMENTS_COLLECTION,
-            metadata={"description": "User comments and reviews"}
-        )
+            metadata={"description": "User comments and reviews"},
+            embedding_function=self.embedding_function
+        ))
         
-        self.documents_collection = self.client.get_or_create_collection(
+        self.documents_collection = InstrumentedCollection(self.client.get_or_create_collection(
             name=settings.DOCUMENTS_COLLECTION,
-            metadata={"description": "Brand documents and knowledge base"}
-        )
+            metadata={"description": "Brand documents and knowledge base"},
+            embedding_function=self.embedding_function
+        ))
         
-        self.serp_collection = self.client.get_or_create_collection(
+        self.serp_collection = InstrumentedCollection(self.client.get_or_create_collection(
             name=settings.SERP_COLLECTION,
-            metadata={"description": "Google SERP results"}
-        )
+            metadata={"description": "Google SERP results"},
+            embedding_function=self.embedding_function
+        ))
     
-    def add_comment(self, comment_data: dict) -> str:
-        """Додати коментар до ChromaDB"""
+    def reload(self, data_version: int = None, applied_ops: List[dict] = None):
+        """Підхоплює записи іншого процесу (writer) з change log без перевідкриття клієнта
+
+        Метадані ChromaDB читаються зі спільної SQLite і видимі одразу.
+        Завантажені HNSW сегменти (read-only, app/chroma_readonly.py) дочитують
+        нові записи з embeddings queue, int8 індекси - нові рядки з файлів.
+        applied_ops - операції з change log, якими оновлюємо BM25 індекс.
+        """
+        from chromadb.segment import SegmentManager
+        
+        applied_ops = applied_ops or []
+        self.client._system.instance(SegmentManager).catch_up()
+        for index in self.vector_indexes.values():
+            index.refresh()
+        for op in applied_ops:
+            self._update_text_index(op["op"], op["payload"])
+            if op["payload"].get("collection") == settings.DOCUMENTS_COLLECTION:
+                self._knowledge_version = None
+        if data_version is not None:
+            self._data_version = data_version
+        for op in applied_ops:
+            self.notify_change(op["op"], op["payload"])
+    
+    @property
+    def data_version(self) -> int:
+        """Версія даних, видима цьому процесу (ключ для кешів)"""
+        return self._data_version
+    
+    @property
+    def knowledge_version(self) -> str:
+        """Версія бази знань: змінюється з кожним додаванням або видаленням документа
+
+        Хеш відсортованих ID чанків - однаковий у всіх процесах, що бачать
+        ті самі документи.
+        """
+        if self._knowledge_version is None:
+            ids = sorted(self.documents_collection.get(include=[])["ids"])
+            self._knowledge_version = hashlib.sha1("\n".join(ids).encode("utf-8")).hexdigest()[:16]
+        return self._knowledge_version
+    
+    def add_change_listener(self, listener):
+        """listener(op, payload) - після кожного застосованого запису, видимого процесу"""
+        self._change_listeners.append(listener)
+    
+    def notify_change(self, op: str, payload: dict):
+        """Викликає слухачів (writer-процес робить це сам після apply_write)"""
+        for listener in self._change_listeners:
+            try:
+                listener(op, payload)
+            except Exception as e:
+                # Слухач не має ламати запис
+                logger.error(f"Change listener failed: {str(e)}")
+    
+    def _write(self, op: str, payload: dict):
+        """Запис напряму або через чергу single-writer
+
+        У режимі черги слухачі дізнаються про запис з change log (reload),
+        коли writer його застосує.
+        """
+        if self.ingest_queue is not None:
+            self.ingest_queue.submit(op, payload)
+        else:
+            self.apply_write(op, payload)
+            self.notify_change(op, payload)
+    
+    def apply_write(self, op: str, payload: dict):
+        """Застосовує операцію запису (викликає writer-процес або _write напряму)
+
+        Операції:
+        - add: {"collection", "ids", "documents", "metadatas"} (+ "embeddings" - готові, зі снапшоту)
+        - delete: {"collection", "ids"}
+        - delete_brand: {"brand_name"}
+        """
+        if op == "add":
+            collection = self._named_collections()[payload["collection"]]
+            vector_index = self._writable_vector_index(payload["collection"])
+            ids = payload["ids"]
+            batch_size = self.client.max_batch_size
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                documents = payload["documents"][start:end]
+                if payload.get("embeddings") is not None:
+                    embeddings = np.asarray(payload["embeddings"][start:end], dtype=np.float32)
+                elif vector_index is not None:
+                    # Для int8 індексу embedding рахуємо самі - один раз для обох індексів
+                    embeddings = self.embedding_function(documents)
+                else:
+                    embeddings = None
+                collection.add(
+                    ids=ids[start:end],
+                    documents=documents,
+                    metadatas=payload["metadatas"][start:end],
+                    embeddings=embeddings.tolist() if isinstance(embeddings, np.ndarray) else embeddings
+                )
+                if vector_index is not None:
+                    vector_index.add(ids[start:end], embeddings)
+        elif op == "delete":
+            self._named_collections()[payload["collection"]].delete(ids=payload["ids"])
+            if payload["collection"] in self.vector_indexes:
+                self.vector_indexes[payload["collection"]].delete(payload["ids"])
+        elif op == "delete_brand":
+            ids_to_delete = self._brand_comment_ids(payload["brand_name"])
+            if ids_to_delete:
+                self.comments_collection.delete(ids=ids_to_delete)
+                if settings.COMMENTS_COLLECTION in self.vector_indexes:
+                    self.vector_indexes[settings.COMMENTS_COLLECTION].delete(ids_to_delete)
+                if self._text_index is not None:
+                    self._text_index.remove(ids_to_delete)
+        else:
+            raise ValueError(f"Невідома операція запису: {op}")
+        
+        if op in ("add", "delete"):
+            self._update_text_index(op, payload)
+            if payload["collection"] == settings.DOCUMENTS_COLLECTION:
+                self._knowledge_version = None
+        self._data_version += 1
+    
+    def _update_text_index(self, op: str, payload: dict):
+        """Підтримує BM25 індекс актуальним після запису (свого чи writer-а)"""
+        # Під локом побудови: запис під час побудови не загубиться (add ідемпотентний)
+        with self._text_index_lock:
+            if self._text_index is None:
+                return
+            if op == "add" and payload["collection"] == settings.COMMENTS_COLLECTION:
+                self._text_index.add(payload["ids"], payload["documents"])
+            elif op == "delete" and payload["collection"] == settings.COMMENTS_COLLECTION:
+                self._text_index.remove(payload["ids"])
+            elif op == "delete_brand":
+                # Change log не містить ID видалених записів - перебудовуємо тут (потік
+                # change log), пошук тим часом іде по старому індексу
+                self._text_index = self._build_text_index()
+    
+    def _build_text_index(self) -> BM25Index:
+        with stage("text_index_build"):
+            index = BM25Index()
+            for page in self.iter_comments(include=["documents"]):
+                index.add(page["ids"], page["documents"])
+        return index
+    
+    @property
+    def text_index(self) -> BM25Index:
+        """BM25 індекс коментарів (будується у warm_up; якщо його не було - при першому зверненні)"""
+        if self._text_index is None:
+            with self._text_index_lock:
+                if self._text_index is None:
+                    self._text_index = self._build_text_index()
+        return self._text_index
+    
+    def _prepare_comment(self, comment_data: dict) -> tuple:
+        """Готує (id, текст для embedding, metadata) для коментаря"""
         comment_id = str(uuid.uuid4())
         
         # Підготовка метаданих (ChromaDB підтримує тільки str, int, float, bool)
         # Категорії конвертуємо в строку через кому
-        category = comment_data.get("category", "general")
+        category = comment_data.get("category") or "general"
         if isinstance(category, list):
             category = ", ".join(category)
+        category_mask = self.categories.mask(split_raw(category) or ["general"])
         
         metadata = {
-            "brand_name": comment_data.get("brand_name", "Unknown"),  # Додаємо brand_name
-            "author": comment_data.get("author", ""),  # Додаємо author
+            "brand_name": comment_data.get("brand_name") or "Unknown",  # Додаємо brand_name
+            "author": comment_data.get("author") or "",  # Додаємо author
             "platform": comment_data["platform"],
             "sentiment": comment_data["sentiment"],
             "timestamp": comment_data["timestamp"].isoformat(),
             "rating": float(comment_data.get("rating", 0)) if comment_data.get("rating") else 0.0,
             "category": category,
-            "severity": comment_data.get("severity", "medium"),
-            "backlink": comment_data.get("backlink", ""),
+            "category_mask": category_mask,  # коди канонічних категорій (app/categories.py)
+            "severity": comment_data.get("severity") or "medium",
+            "backlink": comment_data.get("backlink") or "",
         }
         
         # Формування тексту для embedding
@@ -57,16 +331,32 @@ class ChromaDBManager:
         if comment_data.get("llm_description"):
             full_text += f"\n\nОпис: {comment_data['llm_description']}"
         
-        self.comments_collection.add(
-            ids=[comment_id],
-            documents=[full_text],
-            metadatas=[metadata]
-        )
+        return comment_id, full_text, metadata
+    
+    def add_comment(self, comment_data: dict) -> str:
+        """Додати коментар до ChromaDB"""
+        return self.add_comments([comment_data])[0]
+    
+    def add_comments(self, comments_data: List[dict]) -> List[str]:
+        """Додати пакет коментарів (embedding і запис пакетами по max_batch_size)"""
+        prepared = [self._prepare_comment(c) for c in comments_data]
         
-        return comment_id
+        self._write("add", {
+            "collection": settings.COMMENTS_COLLECTION,
+            "ids": [p[0] for p in prepared],
+            "documents": [p[1] for p in prepared],
+            "metadatas": [p[2] for p in prepared]
+        })
+        
+        return [p[0] for p in prepared]
     
     def add_document(self, title: str, content: str, doc_type: str = "general", metadata: dict = None) -> str:
-        """Додати документ до бази знань"""
+        """Додати документ до бази знань
+
+        Документ ділиться на чанки (KB_CHUNK_TOKENS з перекриттям), кожен чанк -
+        окремий запис з parent_id; усі чанки проходять embedding одним пакетом.
+        Повертає ID документа (parent_id).
+        """
         doc_id = str(uuid.uuid4())
         
         doc_metadata = {
@@ -81,11 +371,18 @@ class ChromaDBManager:
                 if isinstance(value, (str, int, float, bool)):
                     doc_metadata[key] = value
         
-        self.documents_collection.add(
-            ids=[doc_id],
-            documents=[f"{title}\n\n{content}"],
-            metadatas=[doc_metadata]
-        )
+        chunks = chunk_text(content) or [""]
+        
+        self._write("add", {
+            "collection": settings.DOCUMENTS_COLLECTION,
+            "ids": [f"{doc_id}:{i}" for i in range(len(chunks))],
+            # Назва в кожному чанку: без неї чанк із середини документа втрачає контекст
+            "documents": [f"{title}\n\n{chunk}" for chunk in chunks],
+            "metadatas": [
+                {**doc_metadata, "parent_id": doc_id, "chunk_index": i, "chunk_count": len(chunks)}
+                for i in range(len(chunks))
+            ]
+        })
         
         return doc_id
     
@@ -101,36 +398,233 @@ class ChromaDBManager:
             "timestamp": serp_data["timestamp"].isoformat(),
         }
         
-        self.serp_collection.add(
-            ids=[serp_id],
-            documents=[f"{serp_data['title']}\n{serp_data['snippet']}"],
-            metadatas=[metadata]
-        )
+        self._write("add", {
+            "collection": settings.SERP_COLLECTION,
+            "ids": [serp_id],
+            "documents": [f"{serp_data['title']}\n{serp_data['snippet']}"],
+            "metadatas": [metadata]
+        })
         
         return serp_id
     
-    def search_comments(self, query: str, n_results: int = 10, filter_dict: dict = None) -> dict:
-        """Пошук по коментарях"""
-        results = self.comments_collection.query(
-            query_texts=[query],
-            n_results=n_results,
-            where=filter_dict if filter_dict else None
-        )
+    def search_comments(
+        self,
+        query: str,
+        n_results: int = 10,
+        filter_dict: dict = None,
+        mode: str = "auto"
+    ) -> dict:
+        """Пошук по коментарях
+
+        mode:
+        - vector: лише embedding пошук
+        - keyword: лише BM25 (без embedding)
+        - hybrid: BM25 + вектор, злиття через reciprocal rank fusion
+        - auto: keyword для ключових запитів (коди, SKU, один терм, "фраза"),
+          інакше hybrid; якщо BM25 нічого не знайшов - vector
+        """
+        if mode == "auto":
+            mode = "keyword" if is_keyword_query(query) else "hybrid"
+        
+        if mode == "vector":
+            return self._vector_search(query, n_results, filter_dict)
+        
+        candidates = n_results if mode == "keyword" else max(n_results * 3, 30)
+        if filter_dict:
+            # Частина кандидатів відсіється where
+            candidates *= 5
+        
+        with stage("bm25"):
+            keyword_hits = self.text_index.search(query, limit=candidates)
+        keyword_ids = [doc_id for doc_id, _ in keyword_hits]
+        records = self._get_records(keyword_ids, filter_dict)
+        keyword_ids = [doc_id for doc_id in keyword_ids if doc_id in records]
+        
+        if mode == "keyword":
+            if not keyword_ids:
+                return self._vector_search(query, n_results, filter_dict)
+            scores = dict(keyword_hits)
+            ranked = [(doc_id, scores[doc_id]) for doc_id in keyword_ids[:n_results]]
+            return self._format_search_results(ranked, records, "keyword")
+        
+        vector_results = self._vector_search(query, max(n_results * 3, 30), filter_dict)
+        vector_ids = vector_results["ids"][0]
+        for doc_id, document, metadata in zip(vector_ids, vector_results["documents"][0], vector_results["metadatas"][0]):
+            records[doc_id] = (document, metadata)
+        
+        ranked = reciprocal_rank_fusion([keyword_ids, vector_ids])[:n_results]
+        return self._format_search_results(ranked, records, "hybrid")
+    
+    def search_comments_batch(self, queries: List[str], n_results: int = 10, filter_dict: dict = None) -> List[dict]:
+        """Семантичний пошук для кількох запитів: один пакет embedding і один query
+
+        Повертає для кожного запиту (у тому ж порядку) ids, documents, metadatas, distances.
+        """
+        # Однакові запити рахуємо один раз
+        unique = list(dict.fromkeys(queries))
+        annotate(filters=filter_dict, queries=len(queries), unique_queries=len(unique))
+        results = self._query(settings.COMMENTS_COLLECTION, unique, n_results, filter_dict)
+        
+        position = {query: i for i, query in enumerate(unique)}
+        return [
+            {
+                key: results[key][position[query]]
+                for key in ("ids", "documents", "metadatas", "distances")
+            }
+            for query in queries
+        ]
+    
+    def _writable_vector_index(self, name: str):
+        """int8 індекс, у який треба дописувати записи колекції (None - немає або не побудований)
+
+        Індекс, увімкнений для колекції з даними, спершу будується
+        scripts/build_vector_index.py - інакше в ньому були б лише нові записи.
+        """
+        vector_index = self.vector_indexes.get(name)
+        if vector_index is None:
+            return None
+        if not vector_index.exists and self._named_collections()[name].count() > 0:
+            logger.warning(f"Vector index for {name} is not built, run scripts/build_vector_index.py")
+            return None
+        return vector_index
+    
+    def _vector_search(self, query: str, n_results: int, filter_dict: dict = None) -> dict:
+        results = self._query(settings.COMMENTS_COLLECTION, [query], n_results, filter_dict)
+        # Score з відстані (квадрат L2): 1 для збігу, спадає з відстанню - більше краще, як у BM25/RRF
+        results["scores"] = [
+            [round(1.0 / (1.0 + max(distance, 0.0)), 6) for distance in distances]
+            for distances in results["distances"]
+        ]
+        results["mode"] = "vector"
         return results
     
-    def search_knowledge(self, query: str, n_results: int = 5) -> dict:
-        """Пошук по базі знань"""
-        results = self.documents_collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
+    def _query(self, name: str, query_texts: List[str], n_results: int, where: dict = None) -> dict:
+        """query() колекції: через int8 індекс, якщо він увімкнений і побудований, інакше HNSW"""
+        collection = self._named_collections()[name]
+        vector_index = self.vector_indexes.get(name)
+        if vector_index is None or not vector_index.exists:
+            return collection.query(query_texts=query_texts, n_results=n_results, where=where or None)
+        
+        embeddings = self.embedding_function(query_texts)
+        rows = None
+        if where:
+            # where резолвимо один раз у рядки індексу і шукаємо лише серед них
+            rows = vector_index.rows_of(collection.get(where=where, include=[])["ids"])
+        # Один скан int8 кодів на всі запити пакета
+        batch_ids, batch_distances = vector_index.search(embeddings, n_results, rows=rows)
+        
+        found_ids = list(dict.fromkeys(doc_id for ids in batch_ids for doc_id in ids))
+        found = collection.get(ids=found_ids) if found_ids else {"ids": [], "documents": [], "metadatas": []}
+        records = {
+            doc_id: (document, metadata)
+            for doc_id, document, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+        
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for ids, distances in zip(batch_ids, batch_distances):
+            kept = [(doc_id, distance) for doc_id, distance in zip(ids, distances) if doc_id in records]
+            results["ids"].append([doc_id for doc_id, _ in kept])
+            results["documents"].append([records[doc_id][0] for doc_id, _ in kept])
+            results["metadatas"].append([records[doc_id][1] for doc_id, _ in kept])
+            results["distances"].append([distance for _, distance in kept])
         return results
     
-    def get_all_comments(self, limit: int = 1000) -> dict:
-        """Отримати всі коментарі"""
+    def _get_records(self, ids: List[str], filter_dict: dict = None) -> Dict[str, tuple]:
+        """id -> (document, metadata) для заданих ID (з урахуванням where)"""
+        if not ids:
+            return {}
+        result = self.comments_collection.get(ids=ids, where=filter_dict if filter_dict else None)
+        return {
+            doc_id: (document, metadata)
+            for doc_id, document, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+        }
+    
+    def _format_search_results(self, ranked: List[tuple], records: Dict[str, tuple], mode: str) -> dict:
+        """Результати у форматі ChromaDB query (списки в списках) + scores"""
+        ranked = [(doc_id, score) for doc_id, score in ranked if doc_id in records]
+        return {
+            "ids": [[doc_id for doc_id, _ in ranked]],
+            "documents": [[records[doc_id][0] for doc_id, _ in ranked]],
+            "metadatas": [[records[doc_id][1] for doc_id, _ in ranked]],
+            "scores": [[round(score, 6) for _, score in ranked]],
+            "mode": mode
+        }
+    
+    def search_knowledge(self, query: str, n_results: int = 5, per_document: int = None) -> dict:
+        """Пошук по базі знань: найкращі чанки, не більше per_document з одного документа"""
+        return self.search_knowledge_batch([query], n_results, per_document)[0]
+    
+    def search_knowledge_batch(self, queries: List[str], n_results: int = 5, per_document: int = None) -> List[dict]:
+        """search_knowledge для кількох запитів: один пакет embedding і один query"""
+        per_document = per_document or settings.KB_MAX_CHUNKS_PER_DOC
+        if not queries:
+            return []
+        
+        # Беремо з запасом: частину кандидатів відріже ліміт на документ
+        results = self._query(settings.DOCUMENTS_COLLECTION, queries, n_results * 3)
+        
+        batch = []
+        for q in range(len(queries)):
+            selected = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+            per_parent = {}
+            for doc_id, document, metadata, distance in zip(
+                results["ids"][q], results["documents"][q], results["metadatas"][q], results["distances"][q]
+            ):
+                # Документи, додані до чанкування, - один запис без parent_id
+                parent_id = metadata.get("parent_id", doc_id)
+                if per_parent.get(parent_id, 0) >= per_document:
+                    continue
+                per_parent[parent_id] = per_parent.get(parent_id, 0) + 1
+                
+                selected["ids"].append(doc_id)
+                selected["documents"].append(document)
+                selected["metadatas"].append(metadata)
+                selected["distances"].append(distance)
+                if len(selected["ids"]) == n_results:
+                    break
+            
+            batch.append({key: [values] for key, values in selected.items()})
+        return batch
+    
+    def rechunk_documents(self) -> int:
+        """Переносить документи, додані до чанкування, у чанки (повертає кількість)"""
+        legacy = [
+            (doc_id, document, metadata)
+            for doc_id, document, metadata in zip(*(
+                self.documents_collection.get()[key] for key in ("ids", "documents", "metadatas")
+            ))
+            if "parent_id" not in metadata
+        ]
+        
+        for doc_id, document, metadata in legacy:
+            title = metadata.get("title", "")
+            # add_document зберігав "назва\n\nвміст"
+            content = document[len(title):].lstrip("\n") if document.startswith(title) else document
+            extra = {k: v for k, v in metadata.items() if k not in ("title", "doc_type", "timestamp")}
+            self.add_document(title, content, metadata.get("doc_type", "general"), extra)
+            self._write("delete", {"collection": settings.DOCUMENTS_COLLECTION, "ids": [doc_id]})
+        
+        return len(legacy)
+    
+    def get_all_comments(self, limit: Optional[int] = 1000, snapshot: CommentsSnapshot = None) -> dict:
+        """Отримати всі коментарі (зі спільного знімка, якщо він переданий)"""
+        if snapshot is not None:
+            return snapshot.get(limit)
         results = self.comments_collection.get(limit=limit)
         return results
     
+    def iter_comments(self, include: List[str] = None, page_size: int = 5000):
+        """Усі коментарі сторінками (без ліміту get_all_comments)"""
+        offset = 0
+        while True:
+            page = self.comments_collection.get(
+                limit=page_size, offset=offset, include=include or ["documents", "metadatas"]
+            )
+            if not page["ids"]:
+                break
+            yield page
+            offset += page_size
+    
     def get_comments_by_timerange(self, start_time: datetime, end_time: datetime) -> dict:
         """Отримати коментарі за часовий проміжок"""
         all_comments = self.get_all_comments()
@@ -152,6 +646,15 @@ class ChromaDBManager:
             "metadatas": filtered_metadata
         }
     
+    def _get_by_ids(self, ids: List[str], chunk_size: int = 5000) -> dict:
+        """get() для великої кількості ID (частинами, щоб не впертись у ліміт SQLite)"""
+        merged = {"ids": [], "documents": [], "metadatas": []}
+        for start in range(0, len(ids), chunk_size):
+            chunk = self.comments_collection.get(ids=ids[start:start + chunk_size])
+            for key in merged:
+                merged[key].extend(chunk[key])
+        return merged
+    
     def get_comment_by_id(self, comment_id: str) -> Optional[dict]:
         """Отримати коментар по ID"""
         try:
@@ -166,130 +669,137 @@ class ChromaDBManager:
             pass
         return None
     
-    def filter_comments(self, filters: dict) -> dict:
+    def filter_comments(self, filters: dict, snapshot: CommentsSnapshot = None) -> dict:
         """Фільтрація коментарів за різними критеріями"""
-        # Отримуємо всі коментарі
-        all_comments = self.get_all_comments(limit=10000)
-        
-        if not all_comments["ids"]:
-            return {
-                "results": [],
-                "total": 0,
-                "filtered_count": 0
-            }
+        # Предикат text звужує вибірку через BM25 індекс ще до читання з ChromaDB
+        text_ids = None
+        if filters.get("text"):
+            with stage("text_match"):
+                text_ids = self.text_index.match(filters["text"])
+        
+        if text_ids is not None:
+            all_comments = self._get_by_ids(list(text_ids))
+        else:
+            # Отримуємо всі коментарі
+            all_comments = self.get_all_comments(limit=10000, snapshot=snapshot)
         
-        # Фільтруємо коментарі
+        # Фільтруємо коментарі (порожня вибірка проходить той самий шлях - однакова форма відповіді)
         filtered_results = []
+        # Категорії фільтра -> маска кодів (синоніми і мови зводяться до одного коду);
+        # нерозпізнані рядки не збігаються ні з чим
+        categories_mask = self.categories.filter_mask(filters["categories"]) if filters.get("categories") else None
         
-        for i, (comment_id, document, metadata) in enumerate(zip(
-            all_comments["ids"],
-            all_comments["documents"],
-            all_comments["metadatas"]
-        )):
-            # Фільтр по brand_name
-            if filters.get("brand_name"):
-                if metadata.get("brand_name") != filters["brand_name"]:
-                    continue
-            
-            # Фільтр по severity
-            if filters.get("severity"):
-                if metadata.get("severity") not in filters["severity"]:
-                    continue
-            
-            # Фільтр по sentiment
-            if filters.get("sentiment"):
-                if metadata.get("sentiment") not in filters["sentiment"]:
-                    continue
-            
-            # Фільтр по platforms
-            if filters.get("platforms"):
-                if metadata.get("platform") not in filters["platforms"]:
-                    continue
-            
-            # Фільтр по categories (хоча б одна категорія збігається)
-            if filters.get("categories"):
-                comment_categories = metadata.get("category", "").split(", ")
-                if not any(cat in filters["categories"] for cat in comment_categories):
-                    continue
-            
-            # Фільтр по rating
-            rating = metadata.get("rating", 0)
-            if filters.get("rating_min") is not None:
-                if rating < filters["rating_min"]:
-                    continue
-            if filters.get("rating_max") is not None:
-                if rating > filters["rating_max"]:
-                    continue
-            
-            # Фільтр по даті
-            if filters.get("date_from") or filters.get("date_to"):
-                try:
-                    from datetime import timezone
-                    timestamp_str = metadata["timestamp"]
-                    timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                    # Нормалізуємо timezone
-                    if timestamp.tzinfo is None:
-                        timestamp = timestamp.replace(tzinfo=timezone.utc)
-                except:
-                    continue
+        with stage("filter"):
+            for i, (comment_id, document, metadata) in enumerate(zip(
+                all_comments["ids"],
+                all_comments["documents"],
+                all_comments["metadatas"]
+            )):
+                # Фільтр по brand_name
+                if filters.get("brand_name"):
+                    if metadata.get("brand_name") != filters["brand_name"]:
+                        continue
                 
-                if filters.get("date_from"):
-                    try:
-                        date_from = datetime.fromisoformat(filters["date_from"].replace('Z', '+00:00'))
-                        if date_from.tzinfo is None:
-                            date_from = date_from.replace(tzinfo=timezone.utc)
-                        if timestamp < date_from:
-                            continue
-                    except:
-                        pass
+                # Фільтр по severity
+                if filters.get("severity"):
+                    if metadata.get("severity") not in filters["severity"]:
+                        continue
+                
+                # Фільтр по sentiment
+                if filters.get("sentiment"):
+                    if metadata.get("sentiment") not in filters["sentiment"]:
+                        continue
+                
+                # Фільтр по platforms
+                if filters.get("platforms"):
+                    if metadata.get("platform") not in filters["platforms"]:
+                        continue
+                
+                # Фільтр по categories (хоча б одна канонічна категорія збігається)
+                if categories_mask is not None:
+                    if not self.categories.metadata_mask(metadata) & categories_mask:
+                        continue
+                
+                # Фільтр по rating
+                rating = metadata.get("rating", 0)
+                if filters.get("rating_min") is not None:
+                    if rating < filters["rating_min"]:
+                        continue
+                if filters.get("rating_max") is not None:
+                    if rating > filters["rating_max"]:
+                        continue
                 
-                if filters.get("date_to"):
+                # Фільтр по даті
+                if filters.get("date_from") or filters.get("date_to"):
                     try:
-                        date_to = datetime.fromisoformat(filters["date_to"].replace('Z', '+00:00'))
-                        if date_to.tzinfo is None:
-                            date_to = date_to.replace(tzinfo=timezone.utc)
-                        if timestamp > date_to:
-                            continue
+                        from datetime import timezone
+                        timestamp_str = metadata["timestamp"]
+                        timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+                        # Нормалізуємо timezone
+                        if timestamp.tzinfo is None:
+                            timestamp = timestamp.replace(tzinfo=timezone.utc)
                     except:
-                        pass
-            
-            # Додаємо до результатів
-            filtered_results.append({
-                "id": comment_id,
-                "brand_name": metadata.get("brand_name", "Unknown"),
-                "text": document,
-                "author": metadata.get("author", ""),
-                "platform": metadata.get("platform"),
-                "sentiment": metadata.get("sentiment"),
-                "severity": metadata.get("severity"),
-                "category": metadata.get("category", "").split(", ") if metadata.get("category") else [],
-                "rating": metadata.get("rating"),
-                "timestamp": metadata.get("timestamp"),
-                "backlink": metadata.get("backlink")
-            })
+                        continue
+                    
+                    if filters.get("date_from"):
+                        try:
+                            date_from = datetime.fromisoformat(filters["date_from"].replace('Z', '+00:00'))
+                            if date_from.tzinfo is None:
+                                date_from = date_from.replace(tzinfo=timezone.utc)
+                            if timestamp < date_from:
+                                continue
+                        except:
+                            pass
+                    
+                    if filters.get("date_to"):
+                        try:
+                            date_to = datetime.fromisoformat(filters["date_to"].replace('Z', '+00:00'))
+                            if date_to.tzinfo is None:
+                                date_to = date_to.replace(tzinfo=timezone.utc)
+                            if timestamp > date_to:
+                                continue
+                        except:
+                            pass
+                
+                # Додаємо до результатів
+                filtered_results.append({
+                    "id": comment_id,
+                    "brand_name": metadata.get("brand_name", "Unknown"),
+                    "text": document,
+                    "author": metadata.get("author", ""),
+                    "platform": metadata.get("platform"),
+                    "sentiment": metadata.get("sentiment"),
+                    "severity": metadata.get("severity"),
+                    "category": metadata.get("category", "").split(", ") if metadata.get("category") else [],
+                    "canonical_categories": self.categories.ids(self.categories.metadata_mask(metadata)),
+                    "rating": metadata.get("rating"),
+                    "timestamp": metadata.get("timestamp"),
+                    "backlink": metadata.get("backlink")
+                })
         
         # Сортування
-        severity_order = {"critical": 4, "high": 3, "medium": 2, "low": 1}
-        
-        sort_by = filters.get("sort_by", "timestamp")
-        sort_order = filters.get("sort_order", "desc")
-        reverse = (sort_order == "desc")
-        
-        if sort_by == "severity":
-            filtered_results.sort(
-                key=lambda x: severity_order.get(x.get("severity", "low"), 0),
-                reverse=reverse
-            )
-        elif sort_by == "rating":
-            filtered_results.sort(
-                key=lambda x: x.get("rating", 0),
-                reverse=reverse
-            )
-        else:  # timestamp
-            filtered_results.sort(
-                key=lambda x: x.get("timestamp", ""),
-                reverse=reverse
-            )
+        with stage("sort"):
+            severity_order = {"critical": 4, "high": 3, "medium": 2, "low": 1}
+            
+            sort_by = filters.get("sort_by", "timestamp")
+            sort_order = filters.get("sort_order", "desc")
+            reverse = (sort_order == "desc")
+            
+            if sort_by == "severity":
+                filtered_results.sort(
+                    key=lambda x: severity_order.get(x.get("severity", "low"), 0),
+                    reverse=reverse
+                )
+            elif sort_by == "rating":
+                filtered_results.sort(
+                    key=lambda x: x.get("rating", 0),
+                    reverse=reverse
+                )
+            else:  # timestamp
+                filtered_results.sort(
+                    key=lambda x: x.get("timestamp", ""),
+                    reverse=reverse
+                )
         
         # Пагінація
         offset = filters.get("offset", 0)
@@ -297,6 +807,12 @@ class ChromaDBManager:
         
         paginated_results = filtered_results[offset:offset + limit]
         
+        annotate(
+            filters={k: v for k, v in filters.items() if k not in ("limit", "offset")},
+            rows_scanned=len(all_comments["ids"]),
+            rows_returned=len(filtered_results)
+        )
+        
         return {
             "results": paginated_results,
             "total": len(all_comments["ids"]),
@@ -306,9 +822,9 @@ class ChromaDBManager:
             "limit": limit
         }
 
-    def get_all_brands(self) -> List[str]:
+    def get_all_brands(self, snapshot: CommentsSnapshot = None) -> List[str]:
         """Отримати список всіх брендів"""
-        all_comments = self.get_all_comments(limit=10000)
+        all_comments = self.get_all_comments(limit=10000, snapshot=snapshot)
         brands = set()
         for metadata in all_comments.get("metadatas", []):
             brand = metadata.get("brand_name")
@@ -316,20 +832,200 @@ class ChromaDBManager:
                 brands.add(brand)
         return sorted(list(brands))
     
+    def _brand_comment_ids(self, brand_name: str) -> List[str]:
+        """ID всіх коментарів бренду (фільтр на боці ChromaDB, без документів)"""
+        return self.comments_collection.get(where={"brand_name": brand_name}, include=[])["ids"]
+    
     def delete_brand_data(self, brand_name: str) -> int:
-        """Видалити всі дані по бренду"""
-        all_comments = self.get_all_comments(limit=10000)
-        ids_to_delete = []
-        
-        for i, metadata in enumerate(all_comments.get("metadatas", [])):
-            if metadata.get("brand_name") == brand_name:
-                ids_to_delete.append(all_comments["ids"][i])
-        
-        if ids_to_delete:
-            self.comments_collection.delete(ids=ids_to_delete)
+        """Видалити всі дані по бренду
+
+        У режимі черги повертає кількість записів на момент постановки в чергу.
+        """
+        count = len(self._brand_comment_ids(brand_name))
+        if count:
+            self._write("delete_brand", {"brand_name": brand_name})
+        return count
+
+    def _named_collections(self) -> Dict[str, object]:
+        """Усі колекції (ім'я -> колекція)"""
+        return {
+            settings.COMMENTS_COLLECTION: self.comments_collection,
+            settings.DOCUMENTS_COLLECTION: self.documents_collection,
+            settings.SERP_COLLECTION: self.serp_collection,
+        }
+
+    def collection_sizes(self) -> Dict[str, int]:
+        """Кількість записів у кожній колекції"""
+        return {
+            name: collection.count()
+            for name, collection in self._named_collections().items()
+        }
+
+    def build_vector_index(self, name: str, page_size: int = 5000) -> int:
+        """Перебудувати int8 індекс колекції з embeddings ChromaDB, повертає кількість записів"""
+        vector_index = self.vector_indexes.get(name)
+        if vector_index is None:
+            raise ValueError(f"Колекції {name} немає у VECTOR_INDEX_COLLECTIONS")
         
-        return len(ids_to_delete)
+        collection = self._named_collections()[name]
+        vector_index.clear()
+        offset = 0
+        while True:
+            page = collection.get(limit=page_size, offset=offset, include=["embeddings"])
+            if not page["ids"]:
+                break
+            vector_index.add(page["ids"], page["embeddings"])
+            offset += page_size
+        return len(vector_index)
+
+    # ==================== SNAPSHOTS ====================
+
+    def export_snapshot(self, target_dir: str, page_size: int = 5000) -> dict:
+        """Експорт усіх колекцій разом з embeddings у директорію снапшоту
+
+        Для кожної колекції пишемо:
+        - <name>.parquet - id, document, metadata (JSON)
+        - <name>.npy - матриця embeddings float32 (рядки в тому ж порядку, що й parquet)
+        """
+        import pandas as pd
+
+        target = Path(target_dir)
+        target.mkdir(parents=True, exist_ok=True)
+
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "created_at": datetime.now().isoformat(),
+            "collections": {}
+        }
+
+        for name, collection in self._named_collections().items():
+            ids, documents, metadatas, embeddings = [], [], [], []
+
+            # Читаємо сторінками, щоб не тягнути всю колекцію одним запитом
+            offset = 0
+            while True:
+                page = collection.get(
+                    limit=page_size,
+                    offset=offset,
+                    include=["documents", "metadatas", "embeddings"]
+                )
+                if not page["ids"]:
+                    break
+                ids.extend(page["ids"])
+                documents.extend(page["documents"])
+                metadatas.extend(page["metadatas"])
+                embeddings.extend(page["embeddings"])
+                offset += len(page["ids"])
+
+            frame = pd.DataFrame({
+                "id": ids,
+                "document": documents,
+                "metadata": [json.dumps(m or {}, ensure_ascii=False) for m in metadatas],
+            })
+            frame.to_parquet(target / f"{name}.parquet", index=False, compression="zstd")
+
+            vectors = np.asarray(embeddings, dtype=np.float32)
+            if not ids:
+                vectors = np.zeros((0, 0), dtype=np.float32)
+            np.save(target / f"{name}.npy", vectors)
+
+            manifest["collections"][name] = {
+                "count": len(ids),
+                "dimension": int(vectors.shape[1]) if len(ids) else 0,
+            }
+
+        with open(target / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
 
+        return manifest
+
+    def import_snapshot(self, source_dir: str, batch_size: int = None) -> dict:
+        """Відновлення колекцій зі снапшоту без повторного embedding
+
+        Кожен пакет - звичайний запис add (з готовими embeddings): версія даних,
+        BM25 індекс і слухачі (live, кластери, чернетки) бачать імпорт так само,
+        як ingest. ID, що вже існують у колекції, ChromaDB пропускає.
+        У режимі черги імпорт відхиляється: писати в базу може лише writer.
+        """
+        import pandas as pd
+
+        if self.ingest_queue is not None:
+            raise RuntimeError(
+                "Імпорт снапшоту в режимі INGEST_MODE=queue недоступний: зупиніть API і writer "
+                "та запустіть імпорт з INGEST_MODE=direct"
+            )
+
+        source = Path(source_dir)
+        with open(source / "manifest.json", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Непідтримувана версія снапшоту: {manifest.get('format_version')}")
+
+        batch_size = batch_size or self.client.max_batch_size
+        collections = self._named_collections()
+        restored = {}
+
+        for name, info in manifest["collections"].items():
+            if name not in collections:
+                raise ValueError(f"Невідома колекція у снапшоті: {name}")
+
+            frame = pd.read_parquet(source / f"{name}.parquet")
+            vectors = np.load(source / f"{name}.npy", mmap_mode="r")
+
+            if len(frame) != info["count"] or len(vectors) != len(frame):
+                raise ValueError(f"Снапшот колекції {name} пошкоджено: кількість записів не збігається")
+
+            ids = frame["id"].tolist()
+            documents = frame["document"].tolist()
+            metadatas = [json.loads(m) for m in frame["metadata"]]
+
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                self._write("add", {
+                    "collection": name,
+                    "ids": ids[start:end],
+                    "documents": documents[start:end],
+                    # Порожній metadata ChromaDB не приймає
+                    "metadatas": [m or None for m in metadatas[start:end]],
+                    "embeddings": np.asarray(vectors[start:end], dtype=np.float32)
+                })
+
+            restored[name] = len(ids)
+
+        return restored
+
+    # ==================== WARM-UP ====================
+
+    def warm_up(self) -> Dict[str, float]:
+        """Прогрів: модель embedding, HNSW індекси колекцій, BM25 індекс, метадані коментарів
+
+        Повертає тривалість кожного кроку в секундах.
+        """
+        timings = {}
+
+        started = time.perf_counter()
+        vector = self.embedding_function(["warm-up"])[0]
+        timings["embedding_model"] = time.perf_counter() - started
+
+        # Перший query завантажує HNSW сегмент колекції в пам'ять
+        for name, collection in self._named_collections().items():
+            started = time.perf_counter()
+            vector_index = self.vector_indexes.get(name)
+            if vector_index is not None and vector_index.exists:
+                # HNSW цієї колекції для читання не потрібен - не завантажуємо
+                vector_index.warm_up()
+            elif collection.count() > 0:
+                collection.query(query_embeddings=[vector], n_results=1, include=[])
+            timings[f"index_{name}"] = time.perf_counter() - started
+
+        # BM25 для keyword/hybrid пошуку і фільтра text - до readiness, а не в першому запиті
+        started = time.perf_counter()
+        self.text_index
+        timings["text_index"] = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        self.get_all_comments()
+        timings["comments_metadata"] = time.perf_counter() - started
 
-# Singleton instance
-db_manager = ChromaDBManager()
+        return timings
@@ -0,0 +1,148 @@
+"""
+Dependencies для FastAPI: сервіси створюються ліниво при першому зверненні
+"""
+import threading
+from functools import wraps
+
+from app.analytics import AnalyticsService
+from app.config import settings
+from app.database import ChromaDBManager
+from app.drafts import BulkDrafter, DraftPrecomputer, DraftStore
+from app.ingest_alerts import IngestAlertChecker
+from app.ingest_queue import IngestQueue, ChangeLogFollower
+from app.intent_router import IntentRouter
+from app.issue_clusters import IssueClusterer
+from app.issue_summaries import IssueSummaryService
+from app.live import EventBus, LivePublisher
+from app.metrics import ALERT_QUEUE_DEPTH, INGEST_QUEUE_DEPTH
+from app.openai_service import OpenAIService
+from app.reputation_history import ReputationHistory
+from app.telegram_service import TelegramService
+
+
+def _lazy_singleton(factory):
+    """Один екземпляр на процес; безпечно для фонового warm-up і запитів одночасно"""
+    lock = threading.Lock()
+    instance = []
+
+    @wraps(factory)
+    def get():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    get.is_initialized = lambda: bool(instance)
+    get.cache_clear = instance.clear
+    return get
+
+
+@_lazy_singleton
+def get_ingest_queue() -> IngestQueue:
+    """Черга single-writer (лише для INGEST_MODE=queue)"""
+    queue = IngestQueue()
+    INGEST_QUEUE_DEPTH.set_function(queue.pending_count)
+    return queue
+
+
+@_lazy_singleton
+def get_db_manager() -> ChromaDBManager:
+    """Dependency для ChromaDB"""
+    if settings.INGEST_MODE == "queue":
+        return ChromaDBManager(ingest_queue=get_ingest_queue())
+    return ChromaDBManager()
+
+
+@_lazy_singleton
+def get_change_log_follower() -> ChangeLogFollower:
+    """Оновлення індексів воркера за change log writer-а"""
+    return ChangeLogFollower(get_ingest_queue(), get_db_manager())
+
+
+@_lazy_singleton
+def get_openai_service() -> OpenAIService:
+    """Dependency для OpenAI сервісу"""
+    return OpenAIService()
+
+
+@_lazy_singleton
+def get_intent_router() -> IntentRouter:
+    """Маршрутизатор повідомлень чату (правила + локальна модель)"""
+    return IntentRouter()
+
+
+@_lazy_singleton
+def get_issue_summary_service() -> IssueSummaryService:
+    """Резюме проблем по брендах за день (алерти, кризи, чат)"""
+    return IssueSummaryService(get_db_manager(), get_openai_service())
+
+
+@_lazy_singleton
+def get_issue_clusterer() -> IssueClusterer:
+    """Кластери проблем: читання у воркерах, оновлення - у процесі, що застосовує записи"""
+    clusterer = IssueClusterer(get_db_manager())
+    if settings.ISSUE_CLUSTERING and settings.INGEST_MODE != "queue":
+        clusterer.start()
+    return clusterer
+
+
+@_lazy_singleton
+def get_analytics_service() -> AnalyticsService:
+    """Dependency для аналітики"""
+    return AnalyticsService(
+        db=get_db_manager(),
+        openai=get_openai_service(),
+        issue_summaries=get_issue_summary_service(),
+        issue_clusters=get_issue_clusterer()
+    )
+
+
+@_lazy_singleton
+def get_reputation_history() -> ReputationHistory:
+    """Денна історія оцінки репутації"""
+    return ReputationHistory(get_db_manager())
+
+
+@_lazy_singleton
+def get_draft_store() -> DraftStore:
+    """Збережені чернетки відповідей і стан пакетних задач"""
+    return DraftStore()
+
+
+@_lazy_singleton
+def get_bulk_drafter() -> BulkDrafter:
+    """Пакетні задачі чернеток"""
+    return BulkDrafter(get_db_manager(), get_openai_service(), get_draft_store())
+
+
+@_lazy_singleton
+def get_draft_precomputer() -> DraftPrecomputer:
+    """Чернетки після ingest (DRAFT_PRECOMPUTE): лише в процесі, що застосовує записи"""
+    precomputer = DraftPrecomputer(get_db_manager(), get_openai_service(), get_draft_store())
+    precomputer.start()
+    return precomputer
+
+
+@_lazy_singleton
+def get_telegram_service() -> TelegramService:
+    """Dependency для Telegram алертів"""
+    service = TelegramService()
+    ALERT_QUEUE_DEPTH.set_function(service.queue_depth)
+    return service
+
+
+@_lazy_singleton
+def get_ingest_alert_checker() -> IngestAlertChecker:
+    """Алерти сплеску після застосованих записів: лише в процесі, що їх застосовує"""
+    checker = IngestAlertChecker(get_db_manager(), get_analytics_service(), get_telegram_service())
+    checker.start()
+    return checker
+
+
+@_lazy_singleton
+def get_live_publisher() -> LivePublisher:
+    """Live події: стартує з першою підпискою, до того запис їх не публікує"""
+    publisher = LivePublisher(EventBus(), get_db_manager(), get_analytics_service())
+    publisher.start()
+    return publisher
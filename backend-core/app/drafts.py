@@ -0,0 +1,445 @@
+"""
+Пакетні чернетки відповідей: задача на top-N відгуків + сховище за comment_id
+
+Задача (POST /api/generate-response/bulk) вибирає коментарі тими самими
+фільтрами, що /api/reviews/filter, шукає контекст у базі знань пакетами
+(один embedding виклик на DRAFT_JOB_KNOWLEDGE_BATCH коментарів) і генерує
+чернетки, тримаючи не більше DRAFT_JOB_CONCURRENCY одночасних LLM викликів.
+Чернетки і стан задачі лежать у SQLite, тож будь-який воркер віддає їх
+за comment_id / job_id.
+
+DraftPrecomputer (DRAFT_PRECOMPUTE) - та сама генерація одразу після
+ingest для high/critical коментарів. Чернетки зберігаються з версією бази
+знань; після зміни бази знань старі видаляються, а /api/generate-response
+віддає збережені лише для поточної версії.
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from app.config import settings
+from app.metrics import DRAFT_JOB_COMMENTS, DRAFT_PRECOMPUTE_COMMENTS
+from app.models import ResponseDraft, ResponseTone
+
+logger = logging.getLogger(__name__)
+
+# Параметрів у одному SQL IN (...)
+SQL_IN_BATCH = 500
+
+
+def estimate_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    """Оцінка вартості в USD за цінами з налаштувань"""
+    return round(
+        (prompt_tokens * settings.OPENAI_PROMPT_PRICE_PER_1M
+         + completion_tokens * settings.OPENAI_COMPLETION_PRICE_PER_1M) / 1_000_000,
+        6
+    )
+
+
+def drafts_usable(stored: Optional[Dict], tone_adjustment: float, tones: List[ResponseTone]) -> bool:
+    """Чи віддає /api/generate-response збережені чернетки на такий запит
+
+    stored - з get_drafts(kb_version=поточна версія); потрібні та сама
+    tone_adjustment і всі запитані стилі.
+    """
+    if not stored or stored["tone_adjustment"] != tone_adjustment:
+        return False
+    stored_tones = {draft.tone for draft in stored["drafts"]}
+    return all(tone in stored_tones for tone in tones)
+
+
+class DraftStore:
+    """SQLite: response_drafts (comment_id -> чернетки) і draft_jobs (job_id -> стан задачі)"""
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.DRAFTS_PATH or os.path.join(
+            settings.CHROMA_PERSIST_DIR, "response_drafts.sqlite3"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS response_drafts (
+                    comment_id TEXT PRIMARY KEY,
+                    brand_name TEXT,
+                    drafts TEXT NOT NULL,
+                    context_tokens INTEGER,
+                    job_id TEXT,
+                    created_at TEXT NOT NULL,
+                    kb_version TEXT,
+                    tone_adjustment REAL
+                ) WITHOUT ROWID
+                """
+            )
+            # Таблиці, створені до версіонування чернеток
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(response_drafts)")}
+            for column, column_type in (("kb_version", "TEXT"), ("tone_adjustment", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE response_drafts ADD COLUMN {column} {column_type}")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS draft_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def save_drafts(
+        self,
+        comment_id: str,
+        brand_name: str,
+        drafts: List[ResponseDraft],
+        context_tokens: int = None,
+        job_id: str = None,
+        kb_version: str = None,
+        tone_adjustment: float = None
+    ):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO response_drafts
+                    (comment_id, brand_name, drafts, context_tokens, job_id, created_at, kb_version, tone_adjustment)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    comment_id,
+                    brand_name,
+                    json.dumps([draft.model_dump(mode="json") for draft in drafts], ensure_ascii=False),
+                    context_tokens,
+                    job_id,
+                    datetime.now().isoformat(),
+                    kb_version,
+                    tone_adjustment
+                )
+            )
+
+    def get_drafts(self, comment_id: str, kb_version: str = None) -> Optional[Dict]:
+        """Збережені чернетки (з kb_version - лише згенеровані з цією версією бази знань)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT brand_name, drafts, context_tokens, job_id, created_at, kb_version, tone_adjustment
+                FROM response_drafts WHERE comment_id = ?
+                """,
+                (comment_id,)
+            ).fetchone()
+        if row is None or (kb_version is not None and row[5] != kb_version):
+            return None
+        brand_name, drafts, context_tokens, job_id, created_at, stored_version, tone_adjustment = row
+        return {
+            "comment_id": comment_id,
+            "brand_name": brand_name,
+            "drafts": [ResponseDraft(**draft) for draft in json.loads(drafts)],
+            "context_tokens": context_tokens,
+            "job_id": job_id,
+            "created_at": created_at,
+            "kb_version": stored_version,
+            "tone_adjustment": tone_adjustment
+        }
+
+    def invalidate(self, kb_version: str) -> int:
+        """Видалити чернетки, згенеровані з іншою версією бази знань"""
+        with self._connect() as conn:
+            return conn.execute(
+                "DELETE FROM response_drafts WHERE kb_version IS NULL OR kb_version != ?", (kb_version,)
+            ).rowcount
+
+    def existing(
+        self,
+        comment_ids: List[str],
+        kb_version: str,
+        tone_adjustment: float,
+        tones: List[ResponseTone]
+    ) -> Set[str]:
+        """Які з comment_ids мають чернетки, що їх віддасть /api/generate-response (drafts_usable)"""
+        found = set()
+        with self._connect() as conn:
+            for start in range(0, len(comment_ids), SQL_IN_BATCH):
+                chunk = comment_ids[start:start + SQL_IN_BATCH]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"""
+                    SELECT comment_id, drafts, tone_adjustment FROM response_drafts
+                    WHERE kb_version = ? AND comment_id IN ({placeholders})
+                    """,
+                    [kb_version, *chunk]
+                )
+                for comment_id, drafts, stored_adjustment in rows:
+                    stored = {
+                        "drafts": [ResponseDraft(**draft) for draft in json.loads(drafts)],
+                        "tone_adjustment": stored_adjustment
+                    }
+                    if drafts_usable(stored, tone_adjustment, tones):
+                        found.add(comment_id)
+        return found
+
+    def save_job(self, job: Dict):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO draft_jobs VALUES (?, ?, ?)",
+                (job["job_id"], json.dumps(job, ensure_ascii=False), datetime.now().isoformat())
+            )
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Стан задачі + progress (частка оброблених коментарів)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT state FROM draft_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = json.loads(row[0])
+        processed = job["completed"] + job["fallback"] + job["failed"]
+        job["progress"] = round(processed / job["total"], 4) if job["total"] else (1.0 if job["status"] == "done" else 0.0)
+        return job
+
+
+def draft_comment(
+    openai_service,
+    store: DraftStore,
+    comment: Dict,
+    knowledge_docs: List[str],
+    tones: List[ResponseTone],
+    tone_adjustment: float,
+    kb_version: str,
+    job_id: str = None
+) -> tuple:
+    """Згенерувати і зберегти чернетки одного коментаря: (status, usage)
+
+    status - completed, fallback (OpenAI не відповів, не зберігаємо - наступний
+    запуск спробує знову) або failed.
+    """
+    usage = {}
+    try:
+        context, context_tokens = openai_service.build_response_context(knowledge_docs)
+        drafts = openai_service.generate_response_drafts(
+            comment=comment["text"],
+            brand_name=comment.get("brand_name") or "Unknown",
+            context=context,
+            tones=tones,
+            tone_adjustment=tone_adjustment,
+            usage=usage
+        )
+        if usage.get("fallback"):
+            return "fallback", usage
+        store.save_drafts(
+            comment["id"], comment.get("brand_name"), drafts, context_tokens,
+            job_id=job_id, kb_version=kb_version, tone_adjustment=tone_adjustment
+        )
+        return "completed", usage
+    except Exception as e:
+        logger.error(f"Draft for comment {comment['id']} failed: {str(e)}")
+        return "failed", usage
+
+
+class BulkDrafter:
+    """Запуск пакетних задач чернеток у фонових потоках"""
+
+    def __init__(self, db_manager, openai_service, store: DraftStore):
+        self.db = db_manager
+        self.openai = openai_service
+        self.store = store
+
+    def start(
+        self,
+        filters: Dict,
+        tones: List[ResponseTone],
+        tone_adjustment: float = 0.5,
+        overwrite: bool = False
+    ) -> Dict:
+        """Створити задачу і запустити її у фоні (повертає початковий стан)"""
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "status": "queued",
+            "filters": filters,
+            "tones": [tone.value for tone in tones],
+            "total": 0,
+            "selected": 0,
+            "skipped": 0,
+            "completed": 0,
+            "fallback": 0,
+            "failed": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "estimated_cost_usd": 0.0,
+            "created_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None
+        }
+        self.store.save_job(job)
+
+        threading.Thread(
+            target=self._run,
+            args=(job, tones, tone_adjustment, overwrite),
+            name=f"draft-job-{job['job_id'][:8]}",
+            daemon=True
+        ).start()
+        return dict(job)
+
+    def _run(self, job: Dict, tones: List[ResponseTone], tone_adjustment: float, overwrite: bool):
+        job["status"] = "running"
+        job["started_at"] = datetime.now().isoformat()
+        try:
+            filters = dict(job["filters"])
+            filters["limit"] = min(filters.get("limit") or settings.DRAFT_JOB_MAX_COMMENTS, settings.DRAFT_JOB_MAX_COMMENTS)
+            selection = self.db.filter_comments(filters)["results"]
+
+            kb_version = self.db.knowledge_version
+            if not overwrite:
+                # Пропускаємо лише чернетки, які /api/generate-response справді віддасть
+                done = self.store.existing(
+                    [comment["id"] for comment in selection], kb_version, tone_adjustment, tones
+                )
+                pending = [comment for comment in selection if comment["id"] not in done]
+            else:
+                pending = selection
+            job["selected"] = len(selection)
+            job["skipped"] = len(selection) - len(pending)
+            job["total"] = len(pending)
+            DRAFT_JOB_COMMENTS.labels(status="skipped").inc(job["skipped"])
+            self.store.save_job(job)
+
+            lock = threading.Lock()
+            with ThreadPoolExecutor(max_workers=settings.DRAFT_JOB_CONCURRENCY, thread_name_prefix="draft-job") as pool:
+                futures = []
+                for start in range(0, len(pending), settings.DRAFT_JOB_KNOWLEDGE_BATCH):
+                    chunk = pending[start:start + settings.DRAFT_JOB_KNOWLEDGE_BATCH]
+                    # Контекст для всього пакета - один embedding виклик
+                    knowledge = self.db.search_knowledge_batch([comment["text"] for comment in chunk], n_results=5)
+                    for comment, found in zip(chunk, knowledge):
+                        futures.append(pool.submit(
+                            self._draft_one, job, lock, comment, found["documents"][0], tones, tone_adjustment, kb_version
+                        ))
+                for future in futures:
+                    future.result()
+
+            job["status"] = "done"
+        except Exception as e:
+            logger.error(f"Draft job {job['job_id']} failed: {str(e)}")
+            job["status"] = "failed"
+            job["error"] = str(e)
+        finally:
+            job["finished_at"] = datetime.now().isoformat()
+            self.store.save_job(job)
+
+    def _draft_one(
+        self,
+        job: Dict,
+        lock: threading.Lock,
+        comment: Dict,
+        knowledge_docs: List[str],
+        tones: List[ResponseTone],
+        tone_adjustment: float,
+        kb_version: str
+    ):
+        status, usage = draft_comment(
+            self.openai, self.store, comment, knowledge_docs, tones, tone_adjustment, kb_version, job["job_id"]
+        )
+
+        DRAFT_JOB_COMMENTS.labels(status=status).inc()
+        with lock:
+            job[status] += 1
+            job["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            job["completion_tokens"] += usage.get("completion_tokens", 0)
+            job["estimated_cost_usd"] = estimate_cost(job["prompt_tokens"], job["completion_tokens"])
+            self.store.save_job(job)
+
+
+class DraftPrecomputer:
+    """Слухач ChromaDBManager: чернетки для high/critical коментарів одразу після ingest
+
+    Працює в процесі, що застосовує записи (напряму або ingest writer), щоб
+    воркери не генерували ті самі чернетки кілька разів. Шлях запису лише
+    кладе коментарі в обмежену чергу; при переповненні коментар
+    пропускається (чернетку згенерує /api/generate-response або bulk задача).
+    """
+
+    def __init__(self, db_manager, openai_service, store: DraftStore, max_pending: int = 1000):
+        self.db = db_manager
+        self.openai = openai_service
+        self.store = store
+        self.tones = list(ResponseTone)
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def on_change(self, op: str, payload: dict):
+        if op not in ("add", "delete") or payload.get("collection") not in (
+            settings.COMMENTS_COLLECTION, settings.DOCUMENTS_COLLECTION
+        ):
+            return
+
+        if payload["collection"] == settings.DOCUMENTS_COLLECTION:
+            # База знань змінилась - усі збережені чернетки застаріли
+            removed = self.store.invalidate(self.db.knowledge_version)
+            DRAFT_PRECOMPUTE_COMMENTS.labels(status="invalidated").inc(removed)
+            return
+
+        if op != "add":
+            return
+        for comment_id, document, metadata in zip(payload["ids"], payload["documents"], payload["metadatas"]):
+            if metadata.get("severity") not in settings.DRAFT_PRECOMPUTE_SEVERITIES:
+                continue
+            try:
+                self._pending.put_nowait({"id": comment_id, "text": document, "brand_name": metadata.get("brand_name")})
+            except queue.Full:
+                DRAFT_PRECOMPUTE_COMMENTS.labels(status="dropped").inc()
+
+    def _next_batch(self) -> List[Dict]:
+        try:
+            batch = [self._pending.get(timeout=1.0)]
+        except queue.Empty:
+            return []
+        while len(batch) < settings.DRAFT_JOB_KNOWLEDGE_BATCH:
+            try:
+                batch.append(self._pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        tone_adjustment = 0.5
+        with ThreadPoolExecutor(max_workers=settings.DRAFT_JOB_CONCURRENCY, thread_name_prefix="draft-precompute") as pool:
+            while not self._stop.is_set():
+                batch = self._next_batch()
+                if not batch:
+                    continue
+                try:
+                    # Версію беремо до пошуку: якщо база зміниться посеред пакета, чернетки не вважатимуться актуальними
+                    kb_version = self.db.knowledge_version
+                    knowledge = self.db.search_knowledge_batch([comment["text"] for comment in batch], n_results=5)
+                    futures = [
+                        pool.submit(
+                            draft_comment, self.openai, self.store, comment, found["documents"][0],
+                            self.tones, tone_adjustment, kb_version
+                        )
+                        for comment, found in zip(batch, knowledge)
+                    ]
+                    for future in futures:
+                        status, _ = future.result()
+                        DRAFT_PRECOMPUTE_COMMENTS.labels(status=status).inc()
+                except Exception as e:
+                    logger.error(f"Draft precompute batch failed: {str(e)}")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.db.add_change_listener(self.on_change)
+        self._thread = threading.Thread(target=self._run, name="draft-precompute", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
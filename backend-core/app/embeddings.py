@@ -0,0 +1,232 @@
+"""
+Embedding функції для колекцій ChromaDB
+"""
+import os
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+from app.config import settings
+from app.metrics import EMBEDDING_BATCH_SIZE, EMBEDDING_DURATION, EMBEDDING_QUEUE_WAIT, EMBEDDED_TEXTS
+from app.profiling import stage
+
+
+class TimedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Обгортка, що вимірює час embedding для метрик"""
+
+    def __init__(self, inner: EmbeddingFunction):
+        self.inner = inner
+
+    def __call__(self, input: Documents) -> Embeddings:
+        started = time.perf_counter()
+        try:
+            with stage("embedding"):
+                return self.inner(input)
+        finally:
+            EMBEDDING_DURATION.observe(time.perf_counter() - started)
+            EMBEDDED_TEXTS.inc(len(input))
+
+
+class HashEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Офлайн embedding через feature hashing токенів
+
+    Детермінована, не потребує моделі та мережі. Тексти зі спільними
+    словами отримують близькі вектори, тому пошук лишається осмисленим
+    для бенчмарків і локальної розробки (але не для production якості).
+    """
+
+    TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def __call__(self, input: Documents) -> Embeddings:
+        vectors = np.zeros((len(input), self.dimension), dtype=np.float32)
+        for row, text in enumerate(input):
+            for token in self.TOKEN_PATTERN.findall(text.lower()):
+                h = zlib.crc32(token.encode("utf-8"))
+                # Старший біт хешу - знак, щоб колізії частково компенсувались
+                vectors[row, h % self.dimension] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).tolist()
+
+
+class TunedONNXMiniLM(ONNXMiniLM_L6_V2):
+    """ONNX MiniLM ChromaDB з заданою кількістю потоків на один виклик
+
+    Пакети рахують кілька воркерів пулу одночасно: без обмеження кожен
+    виклик бере всі ядра, і воркери лише заважають один одному.
+    Модель завантажується один раз (під локом - перший виклик можуть
+    зробити кілька воркерів одночасно) і одразу з потрібними SessionOptions.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_lock = threading.RLock()
+
+    def _download_model_if_not_exists(self) -> None:
+        with self._init_lock:
+            super()._download_model_if_not_exists()
+
+    def _init_model_and_tokenizer(self) -> None:
+        if self.model is not None:
+            return
+        with self._init_lock:
+            if self.model is not None:
+                return
+            folder = os.path.join(self.DOWNLOAD_PATH, self.EXTRACTED_FOLDER_NAME)
+            tokenizer = self.Tokenizer.from_file(os.path.join(folder, "tokenizer.json"))
+            # Як у ChromaDB: sentence-transformers обрізає до 256 токенів
+            tokenizer.enable_truncation(max_length=256)
+            tokenizer.enable_padding(pad_id=0, pad_token="[PAD]", length=256)
+
+            available = self.ort.get_available_providers()
+            if not self._preferred_providers:
+                self._preferred_providers = available
+            elif not set(self._preferred_providers).issubset(available):
+                raise ValueError(f"Preferred providers must be subset of available providers: {available}")
+
+            options = self.ort.SessionOptions()
+            if settings.EMBEDDING_INTRA_OP_THREADS > 0:
+                options.intra_op_num_threads = settings.EMBEDDING_INTRA_OP_THREADS
+                options.inter_op_num_threads = 1
+            self.tokenizer = tokenizer
+            self.model = self.ort.InferenceSession(
+                os.path.join(folder, "model.onnx"),
+                providers=self._preferred_providers,
+                sess_options=options
+            )
+
+
+class _EmbeddingRequest:
+    __slots__ = ("texts", "future", "queued_at")
+
+    def __init__(self, texts: list):
+        self.texts = texts
+        self.future = Future()
+        self.queued_at = time.perf_counter()
+
+
+class BatchingEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Пул воркерів embedding з мікро-пакетами між запитами
+
+    Виклик кладе тексти в чергу і чекає Future. Воркер бере перший запит і
+    доповнює пакет іншими, поки в ньому не буде max_batch текстів або не
+    мине max_wait від постановки першого; результат ділиться між викликами.
+    Запити, більші за max_batch (ingest пакети), йдуть у окрему чергу -
+    воркери завжди спершу беруть дрібні, тож пошук не чекає за великим ingest.
+    """
+
+    def __init__(self, inner: EmbeddingFunction, workers: int, max_batch: int, max_wait_ms: float):
+        self.inner = inner
+        self.workers = max(1, workers)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._interactive = deque()
+        self._bulk = deque()
+        self._condition = threading.Condition()
+        self._start_lock = threading.Lock()
+        self._threads = []
+        # Процес, у якому запущені потоки: після fork (воркер gunicorn) їх немає
+        self._pid = None
+
+    def _ensure_started(self):
+        # Потоки стартують з першим викликом і заново в дочірньому процесі після fork
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            pid = os.getpid()
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                # Стан батьківського процесу: його потоків і запитів тут немає,
+                # а condition міг бути захоплений у момент fork
+                self._condition = threading.Condition()
+                self._interactive.clear()
+                self._bulk.clear()
+            self._threads = []
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"embedding-worker-{number}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._pid = pid
+
+    def __call__(self, input: Documents) -> Embeddings:
+        if not input:
+            return []
+        self._ensure_started()
+        request = _EmbeddingRequest(list(input))
+        with self._condition:
+            (self._bulk if len(request.texts) > self.max_batch else self._interactive).append(request)
+            self._condition.notify()
+        return request.future.result()
+
+    def _next_batch(self) -> tuple:
+        """(черга, запити) - під локом condition"""
+        while not self._interactive and not self._bulk:
+            self._condition.wait()
+        if not self._interactive:
+            return "bulk", [self._bulk.popleft()]
+
+        batch = [self._interactive.popleft()]
+        size = len(batch[0].texts)
+        deadline = batch[0].queued_at + self.max_wait
+        while size < self.max_batch:
+            if self._interactive:
+                if size + len(self._interactive[0].texts) > self.max_batch:
+                    break
+                request = self._interactive.popleft()
+                batch.append(request)
+                size += len(request.texts)
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            self._condition.wait(remaining)
+        return "interactive", batch
+
+    def _run(self):
+        while True:
+            with self._condition:
+                queue_name, batch = self._next_batch()
+
+            started = time.perf_counter()
+            for request in batch:
+                EMBEDDING_QUEUE_WAIT.labels(queue=queue_name).observe(started - request.queued_at)
+            texts = [text for request in batch for text in request.texts]
+            EMBEDDING_BATCH_SIZE.observe(len(texts))
+            try:
+                embeddings = self.inner(texts)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            offset = 0
+            for request in batch:
+                request.future.set_result(embeddings[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+
+
+def build_embedding_function() -> EmbeddingFunction:
+    """Embedding функція для всіх колекцій (EMBEDDING_BACKEND: default | hash)"""
+    if settings.EMBEDDING_BACKEND == "hash":
+        inner = HashEmbeddingFunction(settings.HASH_EMBEDDING_DIM)
+    else:
+        inner = TunedONNXMiniLM()
+    if settings.EMBEDDING_BATCHING:
+        inner = BatchingEmbeddingFunction(
+            inner,
+            workers=settings.EMBEDDING_WORKERS,
+            max_batch=settings.EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS
+        )
+    return TimedEmbeddingFunction(inner)
@@ -0,0 +1,69 @@
+"""
+Алерти сплеску негативу після ingest
+
+Перевірка сплеску має бачити щойно додані відгуки. У режимі черги
+add_comments у запиті лише ставить запис у чергу, тож перевірка в самому
+запиті рахувала старі дані і пропускала сплеск, який цей ingest спричинив.
+IngestAlertChecker - слухач ChromaDBManager у процесі, що застосовує записи
+(API в direct режимі, ingest writer у режимі черги): бренди застосованих
+записів перевіряються у фоновому потоці, алерти йдуть у чергу Telegram.
+"""
+import logging
+import threading
+from typing import Set
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class IngestAlertChecker:
+    """Слухач записів: check_negative_spike_alert для брендів нових коментарів"""
+
+    def __init__(self, db_manager, analytics_service, telegram_service):
+        self.db = db_manager
+        self.analytics = analytics_service
+        self.telegram = telegram_service
+        # Бренди, чекають перевірки; серія записів одного бренду - одна перевірка
+        self._pending: Set[str] = set()
+        self._pending_cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def on_change(self, op: str, payload: dict):
+        """Не блокує шлях запису: лише запам'ятовує бренди"""
+        if op != "add" or payload.get("collection") != settings.COMMENTS_COLLECTION:
+            return
+        brands = {metadata.get("brand_name") for metadata in payload["metadatas"] if metadata}
+        with self._pending_cond:
+            self._pending.update(brand for brand in brands if brand)
+            self._pending_cond.notify()
+
+    def check(self, brand_name: str):
+        alert = self.analytics.check_negative_spike_alert(brand_name=brand_name)
+        if alert:
+            logger.warning(f"Alert detected for brand {brand_name}: {alert['increase_ratio']:.1f}x increase")
+            # Відправляємо в Telegram (фонова черга)
+            self.telegram.enqueue_alert(alert)
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._pending_cond:
+                if not self._pending:
+                    self._pending_cond.wait(timeout=1.0)
+                brands, self._pending = self._pending, set()
+            for brand_name in sorted(brands):
+                try:
+                    self.check(brand_name)
+                except Exception as e:
+                    logger.error(f"Error checking alerts for {brand_name}: {str(e)}")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.db.add_change_listener(self.on_change)
+        self._thread = threading.Thread(target=self._run, name="ingest-alerts", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
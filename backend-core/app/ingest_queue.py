@@ -0,0 +1,255 @@
+"""
+Single-writer ingestion: черга записів у SQLite + writer + change log для читачів
+
+chromadb.PersistentClient не можна ділити між процесами, тому в режимі
+INGEST_MODE=queue API воркери (uvicorn --workers N) лише ставлять записи
+в чергу, а застосовує їх один writer процес (scripts/ingest_writer.py).
+Застосовані записи утворюють change log: seq останнього застосованого запису -
+це версія даних, за якою читачі дочитують нові записи в свої індекси.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueue:
+    """Черга операцій запису (SQLite у WAL режимі, безпечна між процесами)"""
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.INGEST_QUEUE_PATH or os.path.join(
+            settings.CHROMA_PERSIST_DIR, "ingest_queue.sqlite3"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS write_ops (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    op TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    applied_at TEXT
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_write_ops_status ON write_ops (status, seq)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # З'єднання на виклик: воркери - різні процеси, а запити - різні потоки
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def submit(self, op: str, payload: dict) -> int:
+        """Поставити операцію в чергу, повертає seq"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO write_ops (op, payload, created_at) VALUES (?, ?, ?)",
+                (op, json.dumps(payload, ensure_ascii=False), datetime.now().isoformat())
+            )
+            return cursor.lastrowid
+
+    def pending(self, limit: int = 500) -> List[dict]:
+        """Незастосовані операції в порядку seq"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT seq, op, payload FROM write_ops WHERE status = 'pending' ORDER BY seq LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [{"seq": seq, "op": op, "payload": json.loads(payload)} for seq, op, payload in rows]
+
+    def mark_applied(self, seqs: List[int]):
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE write_ops SET status = 'applied', applied_at = ? WHERE seq = ?",
+                [(now, seq) for seq in seqs]
+            )
+
+    def mark_failed(self, seq: int, error: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE write_ops SET status = 'failed', error = ?, applied_at = ? WHERE seq = ?",
+                (error, datetime.now().isoformat(), seq)
+            )
+
+    def applied_version(self) -> int:
+        """seq останньої обробленої операції - версія даних у сховищі"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM write_ops WHERE status != 'pending'"
+            ).fetchone()
+        return row[0]
+
+    def applied_ops(self, after_seq: int, up_to_seq: int) -> List[dict]:
+        """Застосовані операції з change log у діапазоні (after_seq, up_to_seq]"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT seq, op, payload FROM write_ops WHERE status = 'applied' AND seq > ? AND seq <= ? ORDER BY seq",
+                (after_seq, up_to_seq)
+            ).fetchall()
+        return [{"seq": seq, "op": op, "payload": json.loads(payload)} for seq, op, payload in rows]
+
+    def pending_count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM write_ops WHERE status = 'pending'").fetchone()[0]
+
+    def stats(self) -> Dict:
+        """Стан черги для /api/admin/ingest"""
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM write_ops GROUP BY status").fetchall())
+            last_errors = conn.execute(
+                "SELECT seq, op, error, applied_at FROM write_ops WHERE status = 'failed' ORDER BY seq DESC LIMIT 10"
+            ).fetchall()
+        return {
+            "pending": counts.get("pending", 0),
+            "applied": counts.get("applied", 0),
+            "failed": counts.get("failed", 0),
+            "applied_version": self.applied_version(),
+            "last_errors": [
+                {"seq": seq, "op": op, "error": error, "failed_at": failed_at}
+                for seq, op, error, failed_at in last_errors
+            ]
+        }
+
+    def prune(self, older_than_hours: int):
+        """Видалити старі оброблені операції (остання лишається - вона тримає версію)"""
+        cutoff = (datetime.now() - timedelta(hours=older_than_hours)).isoformat()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                DELETE FROM write_ops
+                WHERE status != 'pending' AND applied_at < ?
+                  AND seq < (SELECT MAX(seq) FROM write_ops WHERE status != 'pending')
+                """,
+                (cutoff,)
+            )
+
+
+class IngestWriter:
+    """Єдиний процес, що застосовує черговані записи до ChromaDB"""
+
+    def __init__(self, queue: IngestQueue, db_manager):
+        self.queue = queue
+        self.db = db_manager
+
+    def _groups(self, ops: List[dict]) -> List[List[dict]]:
+        """Послідовні add в одну колекцію зливаємо: один пакет embedding замість багатьох"""
+        groups = []
+        for op in ops:
+            previous = groups[-1][-1] if groups else None
+            if (
+                previous is not None
+                and op["op"] == "add" and previous["op"] == "add"
+                and op["payload"]["collection"] == previous["payload"]["collection"]
+            ):
+                groups[-1].append(op)
+            else:
+                groups.append([op])
+        return groups
+
+    def _apply_one(self, op: dict) -> bool:
+        try:
+            self.db.apply_write(op["op"], op["payload"])
+            self.queue.mark_applied([op["seq"]])
+            self.db.notify_change(op["op"], op["payload"])
+            return True
+        except Exception as e:
+            logger.error(f"Ingest op {op['seq']} ({op['op']}) failed: {str(e)}")
+            self.queue.mark_failed(op["seq"], str(e))
+            return False
+
+    def run_once(self, limit: int = None) -> int:
+        """Застосувати наявні операції, повертає кількість оброблених"""
+        ops = self.queue.pending(limit or settings.INGEST_WRITER_BATCH)
+
+        for group in self._groups(ops):
+            if len(group) == 1:
+                self._apply_one(group[0])
+                continue
+
+            merged = {
+                "collection": group[0]["payload"]["collection"],
+                "ids": [i for op in group for i in op["payload"]["ids"]],
+                "documents": [d for op in group for d in op["payload"]["documents"]],
+                "metadatas": [m for op in group for m in op["payload"]["metadatas"]]
+            }
+            try:
+                self.db.apply_write("add", merged)
+                self.queue.mark_applied([op["seq"] for op in group])
+                self.db.notify_change("add", merged)
+            except Exception as e:
+                # Один битий запис не має блокувати решту пакета
+                logger.warning(f"Merged add of {len(group)} ops failed, retrying one by one: {str(e)}")
+                for op in group:
+                    self._apply_one(op)
+
+        return len(ops)
+
+    def run_forever(self, stop_event: threading.Event = None):
+        stop_event = stop_event or threading.Event()
+        last_prune = 0.0
+
+        while not stop_event.is_set():
+            processed = self.run_once()
+            if processed:
+                logger.info(f"Applied {processed} ingest ops (version {self.queue.applied_version()})")
+
+            if time.monotonic() - last_prune > 3600:
+                self.queue.prune(settings.INGEST_RETENTION_HOURS)
+                last_prune = time.monotonic()
+
+            if not processed:
+                stop_event.wait(settings.INGEST_WRITER_POLL_INTERVAL)
+
+
+class ChangeLogFollower:
+    """Фоновий потік API воркера: дочитує записи, коли writer щось застосував"""
+
+    def __init__(self, queue: IngestQueue, db_manager):
+        self.queue = queue
+        self.db = db_manager
+        self.last_refresh_at: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self) -> bool:
+        """Підхопити записи, якщо версія в change log новіша за нашу"""
+        version = self.queue.applied_version()
+        if version <= self.db.data_version:
+            return False
+
+        applied_ops = self.queue.applied_ops(self.db.data_version, version)
+        self.db.reload(data_version=version, applied_ops=applied_ops)
+        self.last_refresh_at = datetime.now().isoformat()
+        logger.info(f"Caught up with change log at version {version}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(settings.INGEST_REFRESH_INTERVAL):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Change log refresh failed: {str(e)}")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="ingest-follower", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,313 @@
+"""
+Маршрутизація повідомлень чату без LLM: metric / comparison / open
+
+- metric - питання про цифри ("скільки відгуків у Zara?"): відповідь за
+  шаблоном з агрегатів get_statistics, без пошуку і без OpenAI;
+- comparison - порівняння двох і більше брендів (compare_brands);
+- open - решта: повний RAG (статистика, пошук, база знань, OpenAI).
+
+Питання з цифрами, що називає тему чи категорію ("скільки відгуків про
+оплату"), йде в open: агрегати не рахують відгуки за темою.
+
+Спершу правила (ключові слова), далі маленька модель на CPU - мультиноміальний
+наївний Байєс по префіксах слів, навчений при імпорті на прикладах нижче
+(мікросекунди на повідомлення). Непевні рішення моделі йдуть в open.
+"""
+import math
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from app.categories import mentioned_codes
+from app.config import settings
+from app.metrics import CHAT_ROUTES
+
+COMPARISON_KEYWORDS = ['порівня', 'порівнай', 'порівняти', 'vs', 'проти', 'compare', 'чи краще', 'відмінності']
+
+# Ознаки відкритого питання: цифрами не відповісти
+OPEN_CUES = re.compile(
+    r"чому|навіщо|як покращ|що робити|що порадиш|порад|поясни|проаналізуй|опиши|"
+    r"why|how to|how can|explain|recommend|suggest|analy[sz]e|"
+    r"почему|как улучш|что делать|объясни",
+    re.IGNORECASE
+)
+
+METRIC_CUES = re.compile(
+    r"скільки|кількість|відсот|частка|середн|розподіл|"
+    r"how many|how much|number of|percent|share of|average|distribution|"
+    r"сколько|количество|процент|средн",
+    re.IGNORECASE
+)
+
+# Метрика -> ключові слова (перевіряються по нижньому регістру)
+METRIC_KINDS = {
+    "mentions": ["відгук", "згад", "коментар", "review", "mention", "comment", "отзыв", "упомин"],
+    "rating": ["рейтинг", "зірк", "rating", "stars", "оценк"],
+    "reputation": ["репутац", "reputation", "score", "оцінк"],
+    "sentiment": ["негатив", "позитив", "нейтрал", "настр", "sentiment", "negative", "positive", "neutral", "тональн"],
+    "severity": ["критичн", "серйозн", "severity", "critical", "критичес"],
+    "categories": ["категор", "categor", "скарг", "complaint", "жалоб"],
+    "platforms": ["платформ", "platform", "app store", "google play", "джерел"],
+}
+
+# Слова, що не задають тему: службові, "бренд", "останні" тощо. Решта слів
+# metric питання поза ключовими словами метрик і періодів - тема
+# ("скільки відгуків про оплату"), яку агрегатами не відповісти
+FILLER_WORDS = {
+    "у", "в", "за", "про", "по", "і", "й", "та", "з", "із", "на", "до", "від", "для", "це", "є",
+    "як", "яка", "який", "яке", "які", "чи", "що", "а", "топ", "днів", "дні",
+    "the", "a", "an", "is", "are", "was", "were", "of", "for", "in", "on", "at", "to", "by", "with",
+    "does", "do", "did", "have", "has", "had", "there", "we", "our", "what", "its", "top", "days",
+    "и", "с", "о", "об", "от", "это", "есть", "какой", "какая", "какое", "какие", "ли", "дней",
+}
+FILLER_PREFIXES = (
+    "бренд", "brand", "остан", "last", "past", "загал", "всьо", "total", "overall", "всего",
+    "зараз", "now", "сейчас", "цьог", "this", "этот", "этом",
+)
+
+# Період з повідомлення -> днів назад
+PERIODS = [
+    (re.compile(r"сьогодні|today|сегодня", re.IGNORECASE), 1),
+    (re.compile(r"тиждень|тижня|week|неделю|недели", re.IGNORECASE), 7),
+    (re.compile(r"місяць|місяця|month|месяц", re.IGNORECASE), 30),
+]
+
+TRAINING_EXAMPLES = {
+    "metric": [
+        "скільки відгуків у бренду",
+        "скільки негативних відгуків за тиждень",
+        "яка кількість згадок сьогодні",
+        "який середній рейтинг",
+        "яка оцінка репутації бренду",
+        "який відсоток негативу",
+        "розподіл відгуків по платформах",
+        "скільки критичних скарг",
+        "топ категорії скарг",
+        "яка репутація бренду",
+        "який рейтинг у бренду",
+        "how many reviews does the brand have",
+        "what is the average rating",
+        "what is the reputation score",
+        "percent of negative reviews",
+        "number of mentions this week",
+        "сколько отзывов у бренда",
+        "какой средний рейтинг",
+        "сколько негативных упоминаний",
+    ],
+    "comparison": [
+        "порівняй бренди",
+        "хто кращий за репутацією",
+        "порівняння двох брендів",
+        "чим відрізняються бренди",
+        "чи краще один бренд за інший",
+        "compare brands",
+        "which brand is better",
+        "brand versus brand",
+        "сравни бренды",
+        "какой бренд лучше",
+    ],
+    "open": [
+        "чому клієнти незадоволені",
+        "що робити з негативом",
+        "як покращити репутацію",
+        "на що скаржаться користувачі",
+        "поясни проблеми з доставкою",
+        "що кажуть про новий додаток",
+        "проаналізуй відгуки про оплату",
+        "дай поради команді підтримки",
+        "що пишуть про повернення товару",
+        "why are customers unhappy",
+        "what do people say about delivery",
+        "how to improve the app",
+        "explain the payment issues",
+        "почему клиенты недовольны",
+        "что пишут про доставку",
+        "как улучшить сервис",
+    ],
+}
+
+TOKEN_PATTERN = re.compile(r"[\w']+", re.UNICODE)
+
+
+def features(text: str) -> List[str]:
+    """Префікси слів (грубий стемінг для uk/ru/en) + біграми префіксів"""
+    words = [word[:5] for word in TOKEN_PATTERN.findall(text.lower())]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+class NaiveBayesIntentModel:
+    """Мультиноміальний наївний Байєс зі згладжуванням Лапласа"""
+
+    def __init__(self, examples: Dict[str, List[str]]):
+        self.log_priors = {}
+        self.log_likelihoods = {}
+        self.log_unknown = {}
+        total = sum(len(texts) for texts in examples.values())
+        vocabulary = {feature for texts in examples.values() for text in texts for feature in features(text)}
+
+        for label, texts in examples.items():
+            counts = Counter(feature for text in texts for feature in features(text))
+            denominator = sum(counts.values()) + len(vocabulary)
+            self.log_priors[label] = math.log(len(texts) / total)
+            self.log_likelihoods[label] = {
+                feature: math.log((count + 1) / denominator) for feature, count in counts.items()
+            }
+            self.log_unknown[label] = math.log(1 / denominator)
+
+    def predict(self, text: str) -> tuple:
+        """(label, ймовірність)"""
+        tokens = features(text)
+        scores = {
+            label: prior + sum(
+                self.log_likelihoods[label].get(token, self.log_unknown[label]) for token in tokens
+            )
+            for label, prior in self.log_priors.items()
+        }
+        best = max(scores, key=scores.get)
+        # softmax по логарифмах
+        top = scores[best]
+        total = sum(math.exp(score - top) for score in scores.values())
+        return best, 1.0 / total
+
+
+class IntentRouter:
+    """Рішення про маршрут повідомлення чату"""
+
+    def __init__(self):
+        self.model = NaiveBayesIntentModel(TRAINING_EXAMPLES)
+
+    @staticmethod
+    def metric_kinds(text: str) -> List[str]:
+        lowered = text.lower()
+        return [kind for kind, keywords in METRIC_KINDS.items() if any(k in lowered for k in keywords)]
+
+    @staticmethod
+    def has_topic(text: str, brands: List[str]) -> bool:
+        """Чи названо тему або категорію ("refunds", "про оплату") поза метриками і періодом"""
+        lowered = text.lower()
+        # Слово з маркером цифр чи періоду прибираємо цілком ("середній", "тижня")
+        for pattern in [METRIC_CUES] + [pattern for pattern, _ in PERIODS]:
+            lowered = re.sub(rf"[\w']*(?:{pattern.pattern})[\w']*", " ", lowered, flags=re.IGNORECASE)
+        keywords = [keyword for keywords in METRIC_KINDS.values() for keyword in keywords]
+        # Бренди і фрази метрик ("app store") - не тема, навіть якщо містять аліас категорії
+        for phrase in brands + [keyword for keyword in keywords if " " in keyword]:
+            lowered = lowered.replace(phrase.lower(), " ")
+        if mentioned_codes(lowered):
+            return True
+        return any(
+            not word.isdigit()
+            and word not in FILLER_WORDS
+            and not word.startswith(FILLER_PREFIXES)
+            and not any(keyword in word for keyword in keywords)
+            for word in TOKEN_PATTERN.findall(lowered)
+        )
+
+    @staticmethod
+    def period_days(text: str) -> Optional[int]:
+        for pattern, days in PERIODS:
+            if pattern.search(text):
+                return days
+        return None
+
+    def route(self, message_text: str, brands: List[str]) -> Dict:
+        """{"intent", "method", "confidence", "brands", "metric_kinds", "period_days", "route_ms"}"""
+        started = time.perf_counter()
+        lowered = message_text.lower()
+        mentioned = [brand for brand in brands if brand.lower() in lowered]
+
+        intent, method, confidence = "open", "rule", 1.0
+        is_comparison = any(keyword in lowered for keyword in COMPARISON_KEYWORDS)
+        if is_comparison:
+            # Як і раніше: порівняння лише якщо названо хоча б два бренди
+            intent = "comparison" if len(mentioned) >= 2 else "open"
+        elif OPEN_CUES.search(message_text):
+            intent = "open"
+        elif METRIC_CUES.search(message_text) and self.metric_kinds(message_text):
+            intent = "metric"
+        else:
+            label, confidence = self.model.predict(message_text)
+            method = "model"
+            if confidence < settings.CHAT_ROUTER_MIN_CONFIDENCE:
+                intent = "open"
+            elif label == "comparison":
+                intent = "comparison" if len(mentioned) >= 2 else "open"
+            else:
+                intent = label
+        if intent == "metric" and self.has_topic(message_text, brands):
+            # Кількість відгуків про тему агрегати не знають - повний RAG
+            intent = "open"
+        if intent == "metric" and len(mentioned) >= 2:
+            # Цифри по кількох брендах - це порівняння
+            intent = "comparison"
+        if intent == "metric" and not settings.CHAT_ROUTING:
+            intent = "open"
+
+        CHAT_ROUTES.labels(intent=intent, method=method).inc()
+        return {
+            "intent": intent,
+            "method": method,
+            "confidence": round(confidence, 3),
+            "brands": mentioned[:5],
+            "metric_kinds": self.metric_kinds(message_text) if intent == "metric" else [],
+            "period_days": self.period_days(message_text),
+            "route_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+
+
+def metric_filters(route: Dict) -> dict:
+    """Фільтри get_statistics для metric маршруту"""
+    filters = {}
+    if route["brands"]:
+        filters["brand_name"] = route["brands"][0]
+    if route["period_days"]:
+        start = datetime.now() - timedelta(days=route["period_days"])
+        filters["date_from"] = start.replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+    return filters
+
+
+def answer_metric_question(route: Dict, stats: dict) -> str:
+    """Відповідь за шаблоном з агрегатів (без LLM)"""
+    subject = route["brands"][0] if route["brands"] else "усі бренди"
+    period = f" за останні {route['period_days']} дн." if route["period_days"] else ""
+    total = stats["total_mentions"]
+    if not total:
+        return f"📭 Для {subject}{period} немає жодного відгуку."
+
+    def share(count: int) -> str:
+        return f"{count} ({count / total * 100:.0f}%)"
+
+    sentiment = stats["sentiment_distribution"]
+    severity = stats["severity_distribution"]
+    lines = {
+        "mentions": f"📊 Згадок: {total}",
+        "sentiment": (
+            f"🙂 Позитивних: {share(sentiment.get('positive', 0))}, "
+            f"😐 нейтральних: {share(sentiment.get('neutral', 0))}, "
+            f"😠 негативних: {share(sentiment.get('negative', 0))}"
+        ),
+        "rating": (
+            f"⭐ Середній рейтинг: {stats['average_rating']}/5" if stats.get("average_rating")
+            else "⭐ Рейтингів у відгуках немає"
+        ),
+        "reputation": (
+            f"🏅 Оцінка репутації: {stats['reputation_score']['overall_score']}/100 "
+            f"(ризик: {stats['reputation_score']['risk_level']})"
+        ),
+        "severity": (
+            f"🚨 Критичних: {share(severity.get('critical', 0))}, високих: {share(severity.get('high', 0))}"
+        ),
+        "categories": "🏷️ Топ категорії: " + ", ".join(
+            f"{item['category']} ({item['count']})" for item in stats["top_categories"][:5]
+        ),
+        "platforms": "📱 Платформи: " + ", ".join(
+            f"{platform} ({count})"
+            for platform, count in sorted(stats["platform_distribution"].items(), key=lambda x: x[1], reverse=True)
+        ),
+    }
+
+    kinds = route["metric_kinds"] or ["mentions", "sentiment", "rating", "reputation"]
+    if "mentions" not in kinds:
+        kinds = ["mentions"] + kinds
+    return f"**{subject}{period}**\n" + "\n".join(lines[kind] for kind in METRIC_KINDS if kind in kinds)
@@ -0,0 +1,346 @@
+"""
+Кластери проблем з embeddings негативних коментарів (онлайн k-means)
+
+top_categories залежить від вільних рядків категорій від LLM ("delivery",
+"доставка", "late delivery"...), тому одна проблема розпадається на синоніми.
+Тут кожен негативний коментар при ingest потрапляє в найближчий кластер за
+збереженим embedding (косинусна відстань):
+- ближче за ISSUE_CLUSTER_NEW_DISTANCE - центроїд зсувається до коментаря з
+  кроком 1/size (mini-batch k-means, окремий learning rate на кластер);
+- далі - новий кластер (поки їх менше ISSUE_CLUSTER_MAX).
+
+У SQLite зберігаються центроїди, розмір, найчастіші канонічні категорії і найближчі
+до центроїда приклади, а також членство коментарів (з брендом і датою) -
+"топ проблем" бренду за період це один GROUP BY, без LLM.
+
+Оновлює кластери лише процес, що застосовує записи (direct режим або ingest
+writer); воркери читають таблиці. Наявні коментарі кластеризує
+scripts/build_issue_clusters.py.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from app.config import settings
+from app.metrics import ISSUE_CLUSTER_ASSIGNMENTS
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class IssueClusterer:
+    """Таблиці issue_clusters (центроїди і статистика) та issue_cluster_members"""
+
+    def __init__(self, db_manager, path: str = None):
+        self.db = db_manager
+        self.path = path or settings.ISSUE_CLUSTERS_PATH or os.path.join(
+            settings.CHROMA_PERSIST_DIR, "issue_clusters.sqlite3"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # Стан writer-а (завантажується при першому оновленні)
+        self._clusters = None
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS issue_clusters (
+                    cluster_id INTEGER PRIMARY KEY,
+                    centroid BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    categories TEXT NOT NULL,
+                    examples TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS issue_cluster_members (
+                    comment_id TEXT PRIMARY KEY,
+                    cluster_id INTEGER NOT NULL,
+                    brand_name TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    distance REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS issue_cluster_members_brand ON issue_cluster_members (brand_name, day)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    # ==================== WRITER ====================
+
+    def _load(self) -> Dict[int, dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT cluster_id, centroid, size, categories, examples FROM issue_clusters"
+            ).fetchall()
+        return {
+            cluster_id: {
+                "centroid": np.frombuffer(centroid, dtype=np.float32).copy(),
+                "size": size,
+                "categories": Counter(json.loads(categories)),
+                "examples": json.loads(examples)
+            }
+            for cluster_id, centroid, size, categories, examples in rows
+        }
+
+    def _remember_example(self, cluster: dict, comment_id: str, document: str, metadata: dict, distance: float):
+        """Найближчі до центроїда приклади (відстань на момент призначення)"""
+        examples = [e for e in cluster["examples"] if e["id"] != comment_id]
+        examples.append({
+            "id": comment_id,
+            "text": document[:300],
+            "brand_name": metadata.get("brand_name"),
+            "distance": round(distance, 4)
+        })
+        examples.sort(key=lambda e: e["distance"])
+        cluster["examples"] = examples[:settings.ISSUE_CLUSTER_EXAMPLES]
+
+    def assign(self, ids: List[str], documents: List[str], metadatas: List[dict], embeddings, spawn: bool = True) -> int:
+        """Призначити коментарі кластерам і зберегти (повертає кількість призначених)
+
+        spawn=False - лише до наявних кластерів, без зсуву центроїдів
+        (повторне призначення після побудови).
+        """
+        if not ids:
+            return 0
+        vectors = normalize(np.asarray(embeddings, dtype=np.float32))
+        categories = self.db.categories
+
+        with self._lock:
+            if self._clusters is None:
+                self._clusters = self._load()
+            changed, members = set(), []
+            # Нормалізовані центроїди рядками матриці; оновлюються на місці
+            cluster_ids = list(self._clusters)
+            matrix = normalize(np.stack([self._clusters[c]["centroid"] for c in cluster_ids])) \
+                if cluster_ids else np.empty((0, vectors.shape[1]), dtype=np.float32)
+
+            for comment_id, document, metadata, vector in zip(ids, documents, metadatas, vectors):
+                row, distance = None, float("inf")
+                if cluster_ids:
+                    similarities = matrix @ vector
+                    row = int(np.argmax(similarities))
+                    distance = float(1.0 - similarities[row])
+
+                if spawn and distance > settings.ISSUE_CLUSTER_NEW_DISTANCE \
+                        and len(cluster_ids) < settings.ISSUE_CLUSTER_MAX:
+                    cluster_id = max(self._clusters, default=-1) + 1
+                    self._clusters[cluster_id] = {
+                        "centroid": vector.copy(), "size": 0, "categories": Counter(), "examples": []
+                    }
+                    cluster_ids.append(cluster_id)
+                    matrix = np.vstack([matrix, vector[None, :]])
+                    row, distance = len(cluster_ids) - 1, 0.0
+                    ISSUE_CLUSTER_ASSIGNMENTS.labels(result="new_cluster").inc()
+                elif row is None:
+                    continue
+                else:
+                    ISSUE_CLUSTER_ASSIGNMENTS.labels(result="assigned").inc()
+
+                cluster_id = cluster_ids[row]
+                cluster = self._clusters[cluster_id]
+                if spawn:
+                    cluster["size"] += 1
+                    cluster["centroid"] += (vector - cluster["centroid"]) / cluster["size"]
+                    matrix[row] = normalize(cluster["centroid"][None, :])[0]
+                cluster["categories"].update(categories.ids(categories.metadata_mask(metadata)))
+                self._remember_example(cluster, comment_id, document, metadata, distance)
+                changed.add(cluster_id)
+                members.append((
+                    comment_id,
+                    cluster_id,
+                    metadata.get("brand_name") or "Unknown",
+                    (metadata.get("timestamp") or "")[:10],
+                    distance
+                ))
+
+            self._save(changed, members)
+        return len(members)
+
+    def _save(self, changed: set, members: List[tuple]):
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO issue_clusters VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        cluster_id,
+                        self._clusters[cluster_id]["centroid"].astype(np.float32).tobytes(),
+                        self._clusters[cluster_id]["size"],
+                        json.dumps(dict(self._clusters[cluster_id]["categories"]), ensure_ascii=False),
+                        json.dumps(self._clusters[cluster_id]["examples"], ensure_ascii=False),
+                        now
+                    )
+                    for cluster_id in changed
+                ]
+            )
+            conn.executemany("INSERT OR REPLACE INTO issue_cluster_members VALUES (?, ?, ?, ?, ?)", members)
+
+    def remove(self, ids: List[str] = None, brand_name: str = None):
+        """Прибрати видалені коментарі з членства і прикладів (центроїди лишаються)"""
+        removed = set(ids or [])
+        with self._lock:
+            with self._connect() as conn:
+                if brand_name is not None:
+                    conn.execute("DELETE FROM issue_cluster_members WHERE brand_name = ?", (brand_name,))
+                else:
+                    conn.executemany("DELETE FROM issue_cluster_members WHERE comment_id = ?", [(i,) for i in removed])
+            if self._clusters is None:
+                return
+            changed = set()
+            for cluster_id, cluster in self._clusters.items():
+                kept = [
+                    e for e in cluster["examples"]
+                    if (e["brand_name"] != brand_name if brand_name is not None else e["id"] not in removed)
+                ]
+                if len(kept) != len(cluster["examples"]):
+                    cluster["examples"] = kept
+                    changed.add(cluster_id)
+            self._save(changed, [])
+
+    def on_change(self, op: str, payload: dict):
+        """Слухач ChromaDBManager: призначення нових негативних коментарів, прибирання видалених"""
+        if op == "delete_brand":
+            self.remove(brand_name=payload["brand_name"])
+            return
+        if payload.get("collection") != settings.COMMENTS_COLLECTION:
+            return
+        if op == "delete":
+            self.remove(ids=payload["ids"])
+            return
+        if op != "add":
+            return
+
+        selected = [
+            (comment_id, document, metadata)
+            for comment_id, document, metadata in zip(payload["ids"], payload["documents"], payload["metadatas"])
+            if metadata.get("sentiment") in settings.ISSUE_CLUSTER_SENTIMENTS
+        ]
+        if not selected:
+            return
+        # Збережені embeddings (ті самі, що в ChromaDB), а не повторний виклик моделі
+        stored = self.db.comments_collection.get(ids=[row[0] for row in selected], include=["embeddings"])
+        embedding_of = dict(zip(stored["ids"], stored["embeddings"]))
+        selected = [row for row in selected if row[0] in embedding_of]
+        self.assign(
+            [row[0] for row in selected],
+            [row[1] for row in selected],
+            [row[2] for row in selected],
+            [embedding_of[row[0]] for row in selected]
+        )
+
+    def start(self):
+        """Підписатися на записи (лише в процесі, що їх застосовує)"""
+        self.db.add_change_listener(self.on_change)
+
+    def rebuild(self, page_size: int = 5000, batch_size: int = 1000) -> dict:
+        """Кластеризувати наявні коментарі з нуля: прохід з кластеризацією + повторне призначення"""
+        with self._lock:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM issue_clusters")
+                conn.execute("DELETE FROM issue_cluster_members")
+            self._clusters = {}
+
+        def negative_batches():
+            for page in self.db.iter_comments(include=["documents", "metadatas", "embeddings"], page_size=page_size):
+                rows = [
+                    row for row in zip(page["ids"], page["documents"], page["metadatas"], page["embeddings"])
+                    if row[2].get("sentiment") in settings.ISSUE_CLUSTER_SENTIMENTS
+                ]
+                for start in range(0, len(rows), batch_size):
+                    yield [list(column) for column in zip(*rows[start:start + batch_size])]
+
+        for ids, documents, metadatas, embeddings in negative_batches():
+            self.assign(ids, documents, metadatas, embeddings)
+
+        # Ранні коментарі призначались до ще "сирих" центроїдів - переназначаємо до фінальних
+        with self._lock:
+            for cluster in self._clusters.values():
+                cluster["categories"] = Counter()
+                cluster["examples"] = []
+        assigned = 0
+        for ids, documents, metadatas, embeddings in negative_batches():
+            assigned += self.assign(ids, documents, metadatas, embeddings, spawn=False)
+        return {"clusters": len(self._clusters), "comments": assigned}
+
+    # ==================== READERS ====================
+
+    def top_issues(
+        self, brand_name: str = None, date_from: str = None, date_to: str = None, limit: int = 10
+    ) -> dict:
+        """Найбільші кластери за кількістю коментарів (бренду, за період; дати ISO)"""
+        conditions, params = [], []
+        if brand_name:
+            conditions.append("brand_name = ?")
+            params.append(brand_name)
+        if date_from:
+            conditions.append("day >= ?")
+            params.append(date_from[:10])
+        if date_to:
+            conditions.append("day <= ?")
+            params.append(date_to[:10])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self._connect() as conn:
+            counts = conn.execute(
+                f"""
+                SELECT cluster_id, COUNT(*) FROM issue_cluster_members {where}
+                GROUP BY cluster_id ORDER BY COUNT(*) DESC
+                """,
+                params
+            ).fetchall()
+            total = sum(count for _, count in counts)
+            top = counts[:limit]
+            details = {
+                cluster_id: (json.loads(categories), json.loads(examples))
+                for cluster_id, categories, examples in conn.execute(
+                    f"""
+                    SELECT cluster_id, categories, examples FROM issue_clusters
+                    WHERE cluster_id IN ({', '.join('?' for _ in top)})
+                    """,
+                    [cluster_id for cluster_id, _ in top]
+                ).fetchall()
+            } if top else {}
+
+        issues = []
+        for cluster_id, count in top:
+            categories, examples = details.get(cluster_id, ({}, []))
+            top_categories = [name for name, _ in Counter(categories).most_common(3)]
+            if brand_name:
+                examples = [e for e in examples if e["brand_name"] == brand_name] or examples
+            issues.append({
+                "cluster_id": cluster_id,
+                "label": ", ".join(top_categories) or (examples[0]["text"][:60] if examples else ""),
+                "count": count,
+                "share": round(count / total, 4) if total else 0.0,
+                "categories": top_categories,
+                "examples": [{"id": e["id"], "text": e["text"]} for e in examples]
+            })
+
+        return {
+            "brand_name": brand_name,
+            "date_from": date_from,
+            "date_to": date_to,
+            "total_comments": total,
+            "clusters": len(counts),
+            "issues": issues
+        }
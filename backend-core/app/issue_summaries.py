@@ -0,0 +1,280 @@
+"""
+Резюме проблем по брендах за день: одне LLM резюме на (бренд, день, sentiment)
+
+Алерти, детекція криз і чат раніше кожен окремо просили LLM підсумувати ті
+самі свіжі негативні згадки. Тепер резюме кошика зберігається в SQLite
+разом з ID згадок, з яких воно зроблене (і їх хешем):
+- ID ті самі - віддаємо збережене без LLM;
+- нових згадок менше порогу - теж збережене (pending_comments показує, скільки
+  ще не враховано);
+- інакше - інкрементальне оновлення: у промпт іде попереднє резюме і лише
+  нові згадки.
+Алерти, детекція криз і чат лише читають збережені резюме і ніколи не чекають
+LLM заради них: алерт і криза ставлять свої згадки у фоновий refresher
+(schedule), а резюме з'явиться в наступній перевірці.
+Кошик brand_name="*" - усі бренди разом.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+from app.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Кошик по всіх брендах
+ALL_BRANDS = "*"
+
+SEVERITY_ORDER = {"critical": 4, "high": 3, "medium": 2, "low": 1}
+
+
+def inputs_hash(comment_ids: Iterable[str]) -> str:
+    return hashlib.sha1("\n".join(sorted(comment_ids)).encode("utf-8")).hexdigest()
+
+
+class IssueSummaryService:
+    """Таблиця issue_summaries: (brand_name, day, sentiment) -> резюме + ID згадок"""
+
+    def __init__(self, db_manager, openai_service, path: str = None):
+        self.db = db_manager
+        self.openai = openai_service
+        self.path = path or settings.ISSUE_SUMMARIES_PATH or os.path.join(
+            settings.CHROMA_PERSIST_DIR, "issue_summaries.sqlite3"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Один LLM виклик на кошик, навіть якщо алерт і endpoint питають одночасно
+        self._bucket_locks = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+        # Фоновий refresher: (бренд, sentiment) -> останні rows, старіші замінюються
+        self._scheduled: Dict[tuple, List[Tuple]] = {}
+        self._scheduled_cond = threading.Condition()
+        self._thread = None
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS issue_summaries (
+                    brand_name TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    sentiment TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    main_issues TEXT NOT NULL,
+                    recommendations TEXT NOT NULL,
+                    comment_ids TEXT NOT NULL,
+                    inputs_hash TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (brand_name, day, sentiment)
+                ) WITHOUT ROWID
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _bucket_lock(self, key: tuple) -> threading.Lock:
+        with self._locks_guard:
+            return self._bucket_locks[key]
+
+    def _load(self, brand_name: str, day: str, sentiment: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT summary, main_issues, recommendations, comment_ids, inputs_hash, updated_at
+                FROM issue_summaries WHERE brand_name = ? AND day = ? AND sentiment = ?
+                """,
+                (brand_name, day, sentiment)
+            ).fetchone()
+        if row is None:
+            return None
+        summary, main_issues, recommendations, comment_ids, hashed, updated_at = row
+        return {
+            "brand_name": brand_name,
+            "day": day,
+            "sentiment": sentiment,
+            "summary": summary,
+            "main_issues": json.loads(main_issues),
+            "recommendations": json.loads(recommendations),
+            "comment_ids": json.loads(comment_ids),
+            "inputs_hash": hashed,
+            "updated_at": updated_at
+        }
+
+    def _store(self, summary: Dict):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO issue_summaries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    summary["brand_name"],
+                    summary["day"],
+                    summary["sentiment"],
+                    summary["summary"],
+                    json.dumps(summary["main_issues"], ensure_ascii=False),
+                    json.dumps(summary["recommendations"], ensure_ascii=False),
+                    json.dumps(summary["comment_ids"]),
+                    summary["inputs_hash"],
+                    summary["updated_at"]
+                )
+            )
+
+    def _public(self, summary: Dict, current_ids: set) -> Dict:
+        """Резюме для відповіді API: без списку ID, з кількістю ще не врахованих згадок"""
+        summarized = set(summary["comment_ids"])
+        result = {key: value for key, value in summary.items() if key != "comment_ids"}
+        result["comment_count"] = len(summarized)
+        result["pending_comments"] = len(current_ids - summarized)
+        return result
+
+    def _refresh_bucket(self, brand_name: str, day: str, sentiment: str, rows: List[Tuple]) -> Optional[Dict]:
+        """rows - (id, document, metadata) кошика; None - резюме немає і LLM не відповів"""
+        current_ids = {comment_id for comment_id, _, _ in rows}
+
+        with self._bucket_lock((brand_name, day, sentiment)):
+            stored = self._load(brand_name, day, sentiment)
+            if stored and stored["inputs_hash"] == inputs_hash(current_ids):
+                CACHE_REQUESTS.labels(cache="issue_summary", result="hit").inc()
+                return self._public(stored, current_ids)
+
+            summarized = set(stored["comment_ids"]) if stored else set()
+            new_rows = [row for row in rows if row[0] not in summarized]
+            threshold = max(
+                settings.ISSUE_SUMMARY_MIN_NEW_COMMENTS,
+                len(summarized) * settings.ISSUE_SUMMARY_MIN_NEW_RATIO
+            )
+            if stored and len(new_rows) < threshold:
+                # Нових згадок мало - резюме досі відображає кошик
+                CACHE_REQUESTS.labels(cache="issue_summary", result="hit").inc()
+                return self._public(stored, current_ids)
+
+            CACHE_REQUESTS.labels(cache="issue_summary", result="miss").inc()
+            # Найсерйозніші першими: у промпт іде не більше ISSUE_SUMMARY_SAMPLE згадок
+            new_rows.sort(key=lambda row: SEVERITY_ORDER.get(row[2].get("severity"), 0), reverse=True)
+            sample = [
+                {"body": document, "platform": metadata.get("platform"), "severity": metadata.get("severity")}
+                for _, document, metadata in new_rows[:settings.ISSUE_SUMMARY_SAMPLE]
+            ]
+            result = self.openai.summarize_issues(sample, previous=stored)
+            if result is None:
+                return self._public(stored, current_ids) if stored else None
+
+            summary = {
+                "brand_name": brand_name,
+                "day": day,
+                "sentiment": sentiment,
+                **result,
+                # Згадки, що не потрапили у вибірку, теж вважаються врахованими
+                "comment_ids": sorted(summarized | current_ids),
+                "inputs_hash": inputs_hash(current_ids),
+                "updated_at": datetime.now().isoformat()
+            }
+            self._store(summary)
+            return self._public(summary, current_ids)
+
+    def refresh(self, brand_name: Optional[str], rows: Iterable[Tuple], sentiment: str = "negative") -> List[Dict]:
+        """Актуальні резюме по днях для згадок rows ((id, document, metadata) одного бренду або всіх)
+
+        Повертає резюме від старих днів до нових (дні без резюме пропускаються).
+        """
+        by_day = defaultdict(list)
+        for comment_id, document, metadata in rows:
+            if metadata.get("sentiment") != sentiment:
+                continue
+            day = (metadata.get("timestamp") or "")[:10]
+            if day:
+                by_day[day].append((comment_id, document, metadata))
+
+        summaries = []
+        for day in sorted(by_day):
+            summary = self._refresh_bucket(brand_name or ALL_BRANDS, day, sentiment, by_day[day])
+            if summary:
+                summaries.append(summary)
+        return summaries
+
+    def schedule(self, brand_name: Optional[str], rows: Iterable[Tuple], sentiment: str = "negative"):
+        """refresh у фоновому потоці - для шляхів запиту (ingest, дашборд, live)
+
+        Поки кошик чекає, новіші rows для того самого (бренд, sentiment)
+        замінюють старіші, тож LLM викликається один раз на останній стан.
+        """
+        rows = [row for row in rows if row[2].get("sentiment") == sentiment]
+        if not rows:
+            return
+        with self._scheduled_cond:
+            self._scheduled[(brand_name, sentiment)] = rows
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="issue-summaries", daemon=True)
+                self._thread.start()
+            self._scheduled_cond.notify()
+
+    def _run(self):
+        while True:
+            with self._scheduled_cond:
+                while not self._scheduled:
+                    self._scheduled_cond.wait()
+                key = next(iter(self._scheduled))
+                rows = self._scheduled.pop(key)
+            brand_name, sentiment = key
+            try:
+                self.refresh(brand_name, rows, sentiment)
+            except Exception as e:
+                logger.error(f"Issue summary refresh failed for {brand_name or ALL_BRANDS}: {str(e)}")
+
+    def summaries(self, brand_name: str = None, days: int = None, sentiment: str = "negative") -> List[Dict]:
+        """Резюме за останні days днів, з оновленням кошиків (один прохід по коментарях)"""
+        first_day = (date.today() - timedelta(days=(days or settings.ISSUE_SUMMARY_DAYS) - 1)).isoformat()
+        rows = []
+        for page in self.db.iter_comments(include=["documents", "metadatas"]):
+            for comment_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                if (metadata.get("timestamp") or "")[:10] < first_day:
+                    continue
+                if brand_name and metadata.get("brand_name") != brand_name:
+                    continue
+                rows.append((comment_id, document, metadata))
+        return self.refresh(brand_name, rows, sentiment)
+
+    def cached(self, brand_name: str = None, days: int = None, sentiment: str = "negative") -> List[Dict]:
+        """Лише збережені резюме (без LLM і без читання коментарів) - для алертів, криз і чату"""
+        first_day = (date.today() - timedelta(days=(days or settings.ISSUE_SUMMARY_DAYS) - 1)).isoformat()
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT day, summary, main_issues, recommendations, updated_at
+                FROM issue_summaries
+                WHERE brand_name = ? AND sentiment = ? AND day >= ?
+                ORDER BY day
+                """,
+                (brand_name or ALL_BRANDS, sentiment, first_day)
+            ).fetchall()
+        return [
+            {
+                "brand_name": brand_name or ALL_BRANDS,
+                "day": day,
+                "sentiment": sentiment,
+                "summary": summary,
+                "main_issues": json.loads(main_issues),
+                "recommendations": json.loads(recommendations),
+                "updated_at": updated_at
+            }
+            for day, summary, main_issues, recommendations, updated_at in rows
+        ]
+
+
+def merge_summaries(summaries: List[Dict], limit: int = 5) -> Dict:
+    """Одне резюме з кількох днів: останній день першим, без повторів проблем і рекомендацій"""
+    latest_first = list(reversed(summaries))
+    main_issues, recommendations = [], []
+    for summary in latest_first:
+        main_issues.extend(issue for issue in summary["main_issues"] if issue not in main_issues)
+        recommendations.extend(item for item in summary["recommendations"] if item not in recommendations)
+    return {
+        "summary": latest_first[0]["summary"] if latest_first else "",
+        "main_issues": main_issues[:limit],
+        "recommendations": recommendations[:limit]
+    }
@@ -0,0 +1,134 @@
+"""
+Старт сервісу: вимірювання часу запуску, фоновий warm-up, readiness
+
+Liveness - процес живий і обробляє HTTP.
+Readiness - сервіси створені і (якщо увімкнено) прогріті, можна давати трафік.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from app.config import settings
+from app.metrics import STARTUP_DURATION
+
+logger = logging.getLogger(__name__)
+
+
+class StartupState:
+    """Стан запуску процесу"""
+
+    def __init__(self):
+        self.ready = False
+        self.boot_seconds = None
+        self.warmup_started_at = None
+        self.warmup_finished_at = None
+        self.warmup_timings = {}
+        self.error = None
+
+    def as_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "boot_seconds": self.boot_seconds,
+            "warmup_started_at": self.warmup_started_at,
+            "warmup_finished_at": self.warmup_finished_at,
+            "warmup_timings": self.warmup_timings,
+            "error": self.error
+        }
+
+
+startup_state = StartupState()
+
+
+def record_boot(boot_started: float):
+    """Фіксує час від початку імпорту app.main до старту lifespan"""
+    startup_state.boot_seconds = round(time.perf_counter() - boot_started, 3)
+    STARTUP_DURATION.labels(phase="boot").set(startup_state.boot_seconds)
+    logger.info(f"Worker booted in {startup_state.boot_seconds}s")
+
+
+def run_warmup():
+    """Створює сервіси та прогріває embedding модель і індекси"""
+    # Імпорт тут: dependencies тягне всі сервіси
+    from app.dependencies import (
+        get_db_manager, get_analytics_service, get_openai_service, get_telegram_service,
+        get_change_log_follower
+    )
+
+    started = time.perf_counter()
+    startup_state.warmup_started_at = datetime.now().isoformat()
+
+    try:
+        step_started = time.perf_counter()
+        db_manager = get_db_manager()
+        get_openai_service()
+        get_analytics_service()
+        get_telegram_service()
+        if settings.INGEST_MODE == "queue":
+            get_change_log_follower().start()
+        timings = {"services": time.perf_counter() - step_started}
+    except Exception as e:
+        # Без бази сервіс не готовий
+        startup_state.error = f"Service initialization failed: {str(e)}"
+        logger.error(startup_state.error)
+        return
+
+    try:
+        timings.update(db_manager.warm_up())
+    except Exception as e:
+        # Прогрів - оптимізація: без нього запити працюють, просто перші повільніші
+        startup_state.error = f"Warm-up incomplete: {str(e)}"
+        logger.warning(startup_state.error)
+
+    startup_state.warmup_timings = {k: round(v, 3) for k, v in timings.items()}
+    startup_state.warmup_finished_at = datetime.now().isoformat()
+    startup_state.ready = True
+
+    total = time.perf_counter() - started
+    STARTUP_DURATION.labels(phase="warmup").set(total)
+    logger.info(f"Warm-up finished in {total:.2f}s: {startup_state.warmup_timings}")
+
+
+def subscribe_change_listeners():
+    """Підписує слухачів записів до першого запиту (процес, що застосовує записи)
+
+    Підписка синхронна: з фонового потоку ingest, що прийшов раніше за неї,
+    пройшов би повз кластери, чернетки й алерти. Сама робота слухачів - у
+    їхніх потоках. У режимі черги записи застосовує і слухає ingest writer.
+    """
+    if settings.INGEST_MODE == "queue":
+        return
+    from app.dependencies import get_draft_precomputer, get_ingest_alert_checker, get_issue_clusterer
+
+    started = time.perf_counter()
+    try:
+        if settings.DRAFT_PRECOMPUTE:
+            get_draft_precomputer()
+        # Алерти сплеску після ingest
+        get_ingest_alert_checker()
+        if settings.ISSUE_CLUSTERING:
+            get_issue_clusterer()
+    except Exception as e:
+        # Запити працюють і без слухачів; warm-up покаже, чи доступна база
+        startup_state.error = f"Change listeners failed: {str(e)}"
+        logger.error(startup_state.error)
+        return
+    STARTUP_DURATION.labels(phase="listeners").set(time.perf_counter() - started)
+
+
+def start_warmup():
+    """Слухачі записів, потім warm-up у фоні (WARMUP_ON_STARTUP) або одразу готовність"""
+    subscribe_change_listeners()
+    
+    if not settings.WARMUP_ON_STARTUP:
+        # Сервіси створяться ліниво при першому запиті
+        startup_state.ready = True
+        if settings.INGEST_MODE == "queue":
+            # Але change log треба слухати з самого старту
+            from app.dependencies import get_change_log_follower
+            threading.Thread(
+                target=lambda: get_change_log_follower().start(), name="ingest-follower-init", daemon=True
+            ).start()
+        return
+
+    threading.Thread(target=run_warmup, name="warmup", daemon=True).start()
@@ -0,0 +1,266 @@
+"""
+Live події для дашборду: pub/sub у процесі + публікатор дельт з шляху запису
+
+ChromaDBManager повідомляє про кожен застосований запис (напряму або з
+change log у режимі черги). LivePublisher перетворює їх на компактні
+події для підписаних брендів:
+- review - короткий зміст нового відгуку (критичні першими);
+- stats - скільки додано + оновлені лічильники і оцінка бренду;
+- alert - бренд щойно перейшов у стан сплеску негативу;
+- brand_deleted - дані бренду видалено.
+
+Шлях запису лише кладе операцію в обмежену чергу і не чекає. Повільний
+клієнт не гальмує інших: його черга обмежена, найстаріші події
+відкидаються, а клієнт отримує resync - сигнал перечитати /api/dashboard.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.metrics import LIVE_EVENTS_DROPPED, LIVE_SUBSCRIBERS
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_ORDER = {"critical": 4, "high": 3, "medium": 2, "low": 1}
+
+# Довжина тексту в review події
+REVIEW_TEXT_CHARS = 200
+
+
+class Subscription:
+    """Підписка одного клієнта: обмежена черга подій + пробудження event loop"""
+
+    def __init__(self, brand_name: Optional[str], loop: asyncio.AbstractEventLoop, max_events: int = None):
+        self.brand_name = brand_name
+        self.max_events = max_events or settings.LIVE_SUBSCRIBER_QUEUE
+        self._loop = loop
+        self._events = deque()
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event()
+
+    def wants(self, brand_name: Optional[str]) -> bool:
+        return self.brand_name is None or brand_name is None or brand_name == self.brand_name
+
+    def push(self, event: Dict):
+        """Викликається з потоку публікатора"""
+        with self._lock:
+            if len(self._events) >= self.max_events:
+                self._events.popleft()
+                self._dropped += 1
+                LIVE_EVENTS_DROPPED.labels(reason="slow_client").inc()
+            self._events.append(event)
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # Event loop вже закрито - клієнт пішов
+            pass
+
+    def resync(self):
+        """Події втрачено не через клієнта - він має перечитати стан"""
+        with self._lock:
+            self._dropped += 1
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            pass
+
+    async def next_batch(self, timeout: float) -> List[Dict]:
+        """Накопичені події (порожній список - таймаут, час для heartbeat)"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            dropped, self._dropped = self._dropped, 0
+
+        if dropped:
+            events.insert(0, {"event": "resync", "data": {"dropped": dropped}})
+        return events
+
+
+class EventBus:
+    """Розсилка подій підпискам за брендом"""
+
+    def __init__(self):
+        self._subscriptions: List[Subscription] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, brand_name: Optional[str], loop: asyncio.AbstractEventLoop) -> Subscription:
+        subscription = Subscription(brand_name, loop)
+        with self._lock:
+            self._subscriptions.append(subscription)
+            LIVE_SUBSCRIBERS.set(len(self._subscriptions))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+            LIVE_SUBSCRIBERS.set(len(self._subscriptions))
+
+    def has_subscribers(self, brand_name: Optional[str] = None) -> bool:
+        with self._lock:
+            return any(s.wants(brand_name) for s in self._subscriptions)
+
+    def publish(self, brand_name: Optional[str], event: str, data: Dict):
+        """brand_name=None - подія для всіх підписок"""
+        with self._lock:
+            targets = [s for s in self._subscriptions if s.wants(brand_name)]
+        for subscription in targets:
+            subscription.push({"event": event, "data": data})
+
+    def resync_all(self):
+        with self._lock:
+            targets = list(self._subscriptions)
+        for subscription in targets:
+            subscription.resync()
+
+
+def review_summary(comment_id: str, document: str, metadata: Dict) -> Dict:
+    """Компактний зміст відгуку для review події"""
+    text = document or ""
+    if len(text) > REVIEW_TEXT_CHARS:
+        text = text[:REVIEW_TEXT_CHARS].rstrip() + "..."
+    return {
+        "id": comment_id,
+        "brand_name": metadata.get("brand_name"),
+        "platform": metadata.get("platform"),
+        "sentiment": metadata.get("sentiment"),
+        "severity": metadata.get("severity"),
+        "rating": metadata.get("rating"),
+        "timestamp": metadata.get("timestamp"),
+        "text": text
+    }
+
+
+class LivePublisher:
+    """Фоновий потік: записи -> події review/stats/alert
+
+    review події йдуть одразу, stats і alert для бренду - не частіше
+    LIVE_STATS_INTERVAL (серія записів дає одне перерахування).
+    """
+
+    def __init__(self, bus: EventBus, db_manager, analytics_service, max_pending: int = 1000):
+        self.bus = bus
+        self.db = db_manager
+        self.analytics = analytics_service
+        self._changes = queue.Queue(maxsize=max_pending)
+        # Бренд -> накопичені дельти до наступної stats події
+        self._pending_stats: Dict[str, Dict] = {}
+        self._last_stats_at: Dict[str, float] = {}
+        self._alerting: Dict[str, bool] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def on_change(self, op: str, payload: dict):
+        """Слухач ChromaDBManager: не блокує шлях запису"""
+        if not self.bus.has_subscribers():
+            return
+        try:
+            self._changes.put_nowait((op, payload))
+        except queue.Full:
+            LIVE_EVENTS_DROPPED.labels(reason="publisher_overflow").inc()
+            self.bus.resync_all()
+
+    def _dispatch(self, op: str, payload: dict):
+        if op == "delete_brand":
+            brand_name = payload["brand_name"]
+            self._pending_stats.pop(brand_name, None)
+            self._alerting.pop(brand_name, None)
+            self.bus.publish(brand_name, "brand_deleted", {"brand_name": brand_name})
+            return
+
+        if payload.get("collection") != settings.COMMENTS_COLLECTION:
+            return
+
+        if op == "delete":
+            # Бренд видалених записів невідомий - хай клієнти перечитають
+            self.bus.resync_all()
+            return
+
+        by_brand = {}
+        for comment_id, document, metadata in zip(payload["ids"], payload["documents"], payload["metadatas"]):
+            by_brand.setdefault(metadata.get("brand_name"), []).append((comment_id, document, metadata))
+
+        for brand_name, rows in by_brand.items():
+            if not self.bus.has_subscribers(brand_name):
+                continue
+
+            delta = self._pending_stats.setdefault(brand_name, {"added": 0, "sentiment": Counter()})
+            delta["added"] += len(rows)
+            delta["sentiment"].update(metadata.get("sentiment", "neutral") for _, _, metadata in rows)
+
+            rows.sort(key=lambda row: SEVERITY_ORDER.get(row[2].get("severity"), 0), reverse=True)
+            for comment_id, document, metadata in rows[:settings.LIVE_MAX_REVIEWS_PER_BATCH]:
+                self.bus.publish(brand_name, "review", review_summary(comment_id, document, metadata))
+
+    def _flush_stats(self, force: bool = False):
+        now = time.monotonic()
+        for brand_name in list(self._pending_stats):
+            if not force and now - self._last_stats_at.get(brand_name, 0.0) < settings.LIVE_STATS_INTERVAL:
+                continue
+            delta = self._pending_stats.pop(brand_name)
+            self._last_stats_at[brand_name] = now
+
+            try:
+                stats = self.analytics.get_statistics(filters={"brand_name": brand_name})
+                # reputation_score у статистиці - загальний, панелі бренду потрібен його власний
+                reputation = self.analytics.calculate_reputation_score(brand_name=brand_name)
+                self.bus.publish(brand_name, "stats", {
+                    "brand_name": brand_name,
+                    "added": delta["added"],
+                    "added_by_sentiment": dict(delta["sentiment"]),
+                    "total_mentions": stats["total_mentions"],
+                    "sentiment_distribution": stats["sentiment_distribution"],
+                    "severity_distribution": stats["severity_distribution"],
+                    "average_rating": stats["average_rating"],
+                    "reputation_score": reputation["overall_score"],
+                    "risk_level": reputation["risk_level"],
+                    "data_version": self.db.data_version
+                })
+
+                alert = self.analytics.check_negative_spike_alert(brand_name=brand_name)
+                # Подія лише на переході "немає сплеску" -> "сплеск"
+                if alert and not self._alerting.get(brand_name):
+                    self.bus.publish(brand_name, "alert", alert)
+                self._alerting[brand_name] = bool(alert)
+            except Exception as e:
+                logger.error(f"Live stats for {brand_name} failed: {str(e)}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                change = self._changes.get(timeout=settings.LIVE_STATS_INTERVAL)
+            except queue.Empty:
+                change = None
+
+            try:
+                while change is not None:
+                    self._dispatch(*change)
+                    change = self._changes.get_nowait()
+            except queue.Empty:
+                pass
+            except Exception as e:
+                logger.error(f"Live event dispatch failed: {str(e)}")
+
+            self._flush_stats()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.db.add_change_listener(self.on_change)
+        self._thread = threading.Thread(target=self._run, name="live-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -1,7 +1,13 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import time
+BOOT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response, Depends
+from fastapi.responses import PlainTextResponse, JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
-from datetime import datetime
+from typing import List, Literal
+from datetime import date, datetime, timedelta
+import asyncio
 import logging
 import traceback
 
@@ -22,18 +28,49 @@ from app.models import (
     CommentInput, DocumentInput, SearchResultInput, ChatMessage,
     GenerateResponseRequest, ResponseDraft, StatisticsResponse,
     CrisisAlert, ExternalReviewsBatch, ReviewFilters, StatisticsFilters,
-    BrandComparisonRequest, BrandComparison
+    BrandComparisonRequest, BrandComparison, BatchSearchRequest, BulkDraftRequest
+)
+from app.database import ChromaDBManager
+from app.analytics import AnalyticsService, DASHBOARD_SECTIONS
+from app.openai_service import OpenAIService
+from app.dependencies import (
+    get_db_manager, get_analytics_service, get_openai_service,
+    get_ingest_queue, get_change_log_follower, get_live_publisher, get_reputation_history,
+    get_draft_store, get_bulk_drafter, get_issue_summary_service, get_intent_router,
+    get_issue_clusterer
 )
-from app.database import db_manager
-from app.analytics import analytics_service
-from app.openai_service import openai_service
+from app.lifecycle import startup_state, record_boot, start_warmup
+from app.config import settings
+from app.metrics import MetricsMiddleware, CHAT_DURATION, COLLECTION_SIZE, render_latest
+from app.profiling import ProfilingMiddleware, ProfiledRoute, slow_query_log, profile_store, annotate
+from app.drafts import BulkDrafter, DraftStore, drafts_usable
+from app.intent_router import IntentRouter, answer_metric_question, metric_filters
+from app.issue_clusters import IssueClusterer
+from app.issue_summaries import IssueSummaryService
+from app.live import LivePublisher
+from app.reputation_history import ReputationHistory
+from app.streaming import SSE_HEADERS, SSE_HEARTBEAT, sse_event, sse_stream
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Старт: фіксуємо час boot і запускаємо фоновий warm-up"""
+    record_boot(BOOT_STARTED)
+    start_warmup()
+    yield
+
 
 app = FastAPI(
     title="BrandPulse API",
     description="Brand Reputation Monitoring & Crisis Detection System",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Блокуючі handler-и - звичайні def: FastAPI виконує їх у пулі потоків, тож
+# одночасні запити справді перетинаються (single-flight, мікро-пакети embedding)
+app.router.route_class = ProfiledRoute
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -42,23 +79,64 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/")
 async def root():
-    """Health check"""
+    """Health check: liveness (процес відповідає) і readiness окремо"""
     return {
         "status": "ok",
         "service": "BrandPulse API",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "live": True,
+        "ready": startup_state.ready,
+        "startup": startup_state.as_dict()
     }
 
 
+@app.get("/health/live")
+async def health_live():
+    """Liveness probe"""
+    return {"live": True}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness probe: 503 поки сервіси не створені і не прогріті"""
+    if not startup_state.ready:
+        return JSONResponse(status_code=503, content={"ready": False, "error": startup_state.error})
+    return {"ready": True}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus метрики"""
+    # Не ініціалізуємо базу заради scrape - розміри з'являться після старту
+    if get_db_manager.is_initialized():
+        try:
+            for name, size in get_db_manager().collection_sizes().items():
+                COLLECTION_SIZE.labels(collection=name).set(size)
+        except Exception as e:
+            logger.error(f"Error reading collection sizes: {str(e)}")
+    
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+
 # ==================== COMMENTS ====================
 
 @app.post("/api/reviews/external", response_model=dict)
-async def add_external_reviews(data: ExternalReviewsBatch):
-    """Додати відгуки у зовнішньому форматі (appstore, googleplay, etc)"""
+def add_external_reviews(
+    data: ExternalReviewsBatch,
+    db_manager: ChromaDBManager = Depends(get_db_manager)
+):
+    """Додати відгуки у зовнішньому форматі (appstore, googleplay, etc)
+
+    Сплеск негативу перевіряє IngestAlertChecker, коли запис застосовано
+    (у режимі черги - writer), а не цей запит.
+    """
     try:
         logger.info(f"Received {len(data.reviews)} reviews")
         
@@ -80,7 +158,7 @@ async def add_external_reviews(data: ExternalReviewsBatch):
             "instagram": "instagram"
         }
         
-        comment_ids = []
+        prepared_comments = []
         
         for idx, review in enumerate(data.reviews):
             try:
@@ -127,9 +205,7 @@ async def add_external_reviews(data: ExternalReviewsBatch):
                 
                 logger.info(f"Comment data prepared: platform={comment_data['platform']}, sentiment={comment_data['sentiment']}, categories={len(comment_data['category'])}, severity={comment_data['severity']}, author={comment_data['author']}")
                 
-                comment_id = db_manager.add_comment(comment_data)
-                comment_ids.append(comment_id)
-                logger.info(f"Review {review.id} saved with ID: {comment_id}")
+                prepared_comments.append(comment_data)
                 
             except Exception as e:
                 logger.error(f"Error processing review {idx + 1} (ID: {review.id}): {str(e)}")
@@ -137,24 +213,10 @@ async def add_external_reviews(data: ExternalReviewsBatch):
                 # Продовжуємо обробку інших відгуків
                 continue
         
-        logger.info(f"Successfully processed {len(comment_ids)}/{len(data.reviews)} reviews")
+        # Зберігаємо одним пакетом (embedding батчами замість по одному)
+        comment_ids = db_manager.add_comments(prepared_comments) if prepared_comments else []
         
-        # Автоматична перевірка алертів
-        try:
-            from app.telegram_service import telegram_service
-            
-            # Перевіряємо для кожного бренду
-            brands_in_batch = set(review.brand for review in data.reviews)
-            
-            for brand in brands_in_batch:
-                alert = analytics_service.check_negative_spike_alert(brand_name=brand)
-                if alert:
-                    logger.warning(f"Alert detected for brand {brand}: {alert['increase_ratio']:.1f}x increase")
-                    # Відправляємо в Telegram
-                    telegram_service.send_alert(alert)
-        except Exception as e:
-            logger.error(f"Error checking alerts: {str(e)}")
-            # Не зупиняємо процес через помилку алертів
+        logger.info(f"Successfully processed {len(comment_ids)}/{len(data.reviews)} reviews")
         
         return {
             "success": True,
@@ -170,7 +232,10 @@ async def add_external_reviews(data: ExternalReviewsBatch):
 
 
 @app.post("/api/comments", response_model=dict)
-async def add_comment(comment: CommentInput):
+def add_comment(
+    comment: CommentInput,
+    db_manager: ChromaDBManager = Depends(get_db_manager)
+):
     """Додати коментар/відгук"""
     try:
         logger.info(f"Adding comment via standard endpoint")
@@ -188,14 +253,14 @@ async def add_comment(comment: CommentInput):
 
 
 @app.post("/api/comments/batch", response_model=dict)
-async def add_comments_batch(comments: List[CommentInput]):
+def add_comments_batch(
+    comments: List[CommentInput],
+    db_manager: ChromaDBManager = Depends(get_db_manager)
+):
     """Додати кілька коментарів одночасно"""
     try:
         logger.info(f"Adding {len(comments)} comments in batch")
-        comment_ids = []
-        for comment in comments:
-            comment_id = db_manager.add_comment(comment.model_dump())
-            comment_ids.append(comment_id)
+        comment_ids = db_manager.add_comments([comment.model_dump() for comment in comments])
         
         logger.info(f"Added {len(comment_ids)} comments")
         return {
@@ -212,7 +277,10 @@ async def add_comments_batch(comments: List[CommentInput]):
 # ==================== DOCUMENTS ====================
 
 @app.post("/api/documents", response_model=dict)
-async def add_document(doc: DocumentInput):
+def add_document(
+    doc: DocumentInput,
+    db_manager: ChromaDBManager = Depends(get_db_manager)
+):
     """Додати документ до бази знань"""
     try:
         doc_id = db_manager.add_document(
@@ -234,7 +302,10 @@ async def add_document(doc: DocumentInput):
 # ==================== SERP ====================
 
 @app.post("/api/serp", response_model=dict)
-async def add_serp_result(serp: SearchResultInput):
+def add_serp_result(
+    serp: SearchResultInput,
+    db_manager: ChromaDBManager = Depends(get_db_manager)
+):
     """Додати результат з Google SERP"""
     try:
         serp_id = db_manager.add_serp_result(serp.model_dump())
@@ -249,7 +320,10 @@ async def add_serp_result(serp: SearchResultInput):
 
 
 @app.post("/api/serp/batch", response_model=dict)
-async def add_serp_batch(results: List[SearchResultInput]):
+def add_serp_batch(
+    results: List[SearchResultInput],
+    db_manager: ChromaDBManager = Depends(get_db_manager)
+):
     """Додати кілька SERP результатів"""
     try:
         serp_ids = []
@@ -270,7 +344,10 @@ async def add_serp_batch(results: List[SearchResultInput]):
 # ==================== STATISTICS ====================
 
 @app.post("/api/statistics", response_model=StatisticsResponse)
-async def get_statistics_post(filters: StatisticsFilters = None):
+def get_statistics_post(
+    filters: StatisticsFilters = None,
+    analytics_service: AnalyticsService = Depends(get_analytics_service)
+):
     """Отримати статистику по бренду (POST з фільтрами)"""
     try:
         logger.info(f"Getting statistics with filters: {filters}")
@@ -298,7 +375,9 @@ async def get_statistics_post(filters: StatisticsFilters = None):
 
 
 @app.get("/api/statistics", response_model=StatisticsResponse)
-async def get_statistics_get():
+def get_statistics_get(
+    analytics_service: AnalyticsService = Depends(get_analytics_service)
+):
     """Отримати статистику по бренду (GET без фільтрів)"""
     try:
         logger.info("Getting statistics (no filters)")
@@ -311,7 +390,9 @@ async def get_statistics_get():
 
 
 @app.get("/api/reputation-score")
-async def get_reputation_score():
+def get_reputation_score(
+    analytics_service: AnalyticsService = Depends(get_analytics_service)
+):
     """Отримати загальну оцінку репутації"""
     try:
         score = analytics_service.calculate_reputation_score()
@@ -321,10 +402,37 @@ async def get_reputation_score():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/reputation-score/history")
+def get_reputation_score_history(
+    brand_name: str = None,
+    date_from: str = None,
+    date_to: str = None,
+    reputation_history: ReputationHistory = Depends(get_reputation_history)
+):
+    """Денна історія оцінки репутації (без brand_name - усі бренди разом)
+
+    Читає збережені денні знімки, сирі коментарі не зачіпаються.
+    """
+    try:
+        days = reputation_history.history(brand_name=brand_name, date_from=date_from, date_to=date_to)
+        annotate(rows_returned=len(days))
+        return {
+            "brand_name": brand_name,
+            "days": days,
+            "total": len(days)
+        }
+    except Exception as e:
+        logger.error(f"Error reading reputation history: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ==================== CRISIS DETECTION ====================
 
 @app.get("/api/alerts/check")
-async def check_alerts(brand_name: str = None):
+def check_alerts(
+    brand_name: str = None,
+    analytics_service: AnalyticsService = Depends(get_analytics_service)
+):
     """Перевірити алерти про збільшення негативних згадок"""
     try:
         logger.info(f"Checking alerts for brand: {brand_name or 'all'}")
@@ -348,14 +456,197 @@ async def check_alerts(brand_name: str = None):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/issue-summaries")
+def get_issue_summaries(
+    brand_name: str = None,
+    days: int = None,
+    sentiment: Literal["positive", "negative", "neutral"] = "negative",
+    cached_only: bool = False,
+    issue_summary_service: IssueSummaryService = Depends(get_issue_summary_service)
+):
+    """Резюме проблем бренду по днях (оновлюються, якщо надійшло достатньо нових згадок)
+
+    cached_only=true - лише збережені резюме, без LLM.
+    """
+    try:
+        logger.info(f"Getting issue summaries for brand: {brand_name or 'all'}")
+        if cached_only:
+            summaries = issue_summary_service.cached(brand_name, days, sentiment)
+        else:
+            summaries = issue_summary_service.summaries(brand_name, days, sentiment)
+        return {
+            "brand_name": brand_name,
+            "sentiment": sentiment,
+            "days": summaries,
+            "total": len(summaries)
+        }
+    except Exception as e:
+        logger.error(f"Error getting issue summaries: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/issues/top")
+def get_top_issues(
+    brand_name: str = None,
+    days: int = None,
+    limit: int = 10,
+    issue_clusterer: IssueClusterer = Depends(get_issue_clusterer)
+):
+    """Топ проблем з кластерів негативних коментарів (без LLM)"""
+    try:
+        date_from = (date.today() - timedelta(days=days - 1)).isoformat() if days else None
+        return issue_clusterer.top_issues(brand_name, date_from=date_from, limit=min(max(limit, 1), 50))
+    except Exception as e:
+        logger.error(f"Error getting top issues: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/categories")
+def get_categories(db_manager: ChromaDBManager = Depends(get_db_manager)):
+    """Канонічні категорії: коди, аліаси і рядки, зведені до них за схожістю"""
+    try:
+        return {"categories": db_manager.categories.catalog()}
+    except Exception as e:
+        logger.error(f"Error getting categories: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ==================== DASHBOARD ====================
+
+@app.get("/api/dashboard")
+def get_dashboard(
+    brand_name: str = None,
+    date_from: str = None,
+    date_to: str = None,
+    reviews_limit: int = 20,
+    sections: str = None,
+    analytics_service: AnalyticsService = Depends(get_analytics_service)
+):
+    """Усі дані дашборду одним запитом
+
+    statistics, reputation_score, brands, alerts і перша сторінка reviews
+    рахуються з одного читання коментарів (top_issues - з кластерів проблем). sections (через кому) - лише
+    потрібні секції, наприклад для оновлення однієї з них.
+    """
+    try:
+        requested = [s.strip() for s in sections.split(",") if s.strip()] if sections else list(DASHBOARD_SECTIONS)
+        unknown = [s for s in requested if s not in DASHBOARD_SECTIONS]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Невідомі секції: {', '.join(unknown)}. Доступні: {', '.join(DASHBOARD_SECTIONS)}"
+            )
+
+        logger.info(f"Building dashboard for brand: {brand_name or 'all'}, sections: {requested}")
+        dashboard = analytics_service.get_dashboard(
+            brand_name=brand_name,
+            date_from=date_from,
+            date_to=date_to,
+            reviews_limit=reviews_limit,
+            sections=requested
+        )
+        built = dashboard["sections"]
+
+        response = {
+            "brand_name": brand_name,
+            "date_from": date_from,
+            "date_to": date_to,
+            "data_version": dashboard["data_version"],
+            "errors": dashboard["errors"]
+        }
+
+        for name in ("statistics", "reputation_score", "brands", "top_issues"):
+            if name in built:
+                response[name] = built[name]
+
+        if "alerts" in built:
+            alert = built["alerts"]
+            response["alerts"] = {"alert_detected": True, "alert": alert} if alert else {
+                "alert_detected": False,
+                "message": "Алертів не виявлено"
+            }
+
+        if "reviews" in built:
+            results = built["reviews"]
+            response["reviews"] = {
+                "data": results["results"],
+                "pagination": _review_pagination(results),
+                "filters_applied": dashboard["review_filters"]
+            }
+
+        logger.info(f"Dashboard built ({dashboard['comments_reads']} comment reads, {len(dashboard['errors'])} failed sections)")
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error building dashboard: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/live")
+async def live_events(
+    request: Request,
+    brand_name: str = None,
+    live_publisher: LivePublisher = Depends(get_live_publisher)
+):
+    """Підписка на live події (SSE): review, stats, alert, brand_deleted, resync
+
+    brand_name - лише події бренду (без нього - усі). resync означає, що
+    частину подій втрачено і стан треба перечитати через /api/dashboard.
+    """
+    bus = live_publisher.bus
+    subscription = bus.subscribe(brand_name, asyncio.get_running_loop())
+    logger.info(f"Live subscription opened for brand: {brand_name or 'all'}")
+    
+    async def events():
+        try:
+            yield sse_event("subscribed", {
+                "brand_name": brand_name,
+                "data_version": live_publisher.db.data_version
+            })
+            while not await request.is_disconnected():
+                batch = await subscription.next_batch(settings.LIVE_HEARTBEAT_SECONDS)
+                if not batch:
+                    yield SSE_HEARTBEAT
+                for event in batch:
+                    yield sse_event(event["event"], event["data"])
+        finally:
+            bus.unsubscribe(subscription)
+            logger.info(f"Live subscription closed for brand: {brand_name or 'all'}")
+    
+    # Асинхронний генератор: тисячі підписок не займають потоки threadpool
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 # ==================== RESPONSE GENERATOR ====================
 
 @app.post("/api/generate-response", response_model=List[ResponseDraft])
-async def generate_response(request: GenerateResponseRequest):
-    """Згенерувати відповіді на коментар"""
+def generate_response(
+    request: GenerateResponseRequest,
+    http_response: Response,
+    db_manager: ChromaDBManager = Depends(get_db_manager),
+    openai_service: OpenAIService = Depends(get_openai_service),
+    draft_store: DraftStore = Depends(get_draft_store)
+):
+    """Згенерувати відповіді на коментар
+
+    Якщо чернетки вже згенеровані (bulk задача або DRAFT_PRECOMPUTE) з поточною
+    базою знань, тим самим tone_adjustment і всіма потрібними стилями -
+    віддаються збережені (X-Draft-Source: stored).
+    """
     try:
         logger.info(f"Generating response for comment: {request.comment_id}")
         
+        stored = draft_store.get_drafts(request.comment_id, kb_version=db_manager.knowledge_version)
+        if drafts_usable(stored, request.tone_adjustment, request.tones):
+            by_tone = {draft.tone: draft for draft in stored["drafts"]}
+            http_response.headers["X-Draft-Source"] = "stored"
+            if stored["context_tokens"] is not None:
+                http_response.headers["X-Context-Tokens"] = str(stored["context_tokens"])
+            return [by_tone[tone] for tone in request.tones]
+        
         # Отримуємо коментар
         comment = db_manager.get_comment_by_id(request.comment_id)
         if not comment:
@@ -364,10 +655,11 @@ async def generate_response(request: GenerateResponseRequest):
         brand_name = comment["metadata"].get("brand_name", "Unknown")
         logger.info(f"Generating response for brand: {brand_name}")
         
-        # Отримуємо контекст з бази знань
-        knowledge = db_manager.search_knowledge(comment["document"], n_results=3)
+        # Отримуємо контекст з бази знань (у межах бюджету токенів)
+        knowledge = db_manager.search_knowledge(comment["document"], n_results=5)
         knowledge_docs = knowledge.get("documents", [[]])[0] if knowledge.get("documents") else []
-        context = "\n".join(knowledge_docs) if knowledge_docs else "Немає додаткового контексту"
+        context, context_tokens = openai_service.build_response_context(knowledge_docs)
+        http_response.headers["X-Context-Tokens"] = str(context_tokens)
         
         # Генеруємо відповіді
         drafts = openai_service.generate_response_drafts(
@@ -379,6 +671,7 @@ async def generate_response(request: GenerateResponseRequest):
         )
         
         logger.info(f"Generated {len(drafts)} response drafts")
+        http_response.headers["X-Draft-Source"] = "generated"
         return drafts
         
     except HTTPException:
@@ -389,92 +682,244 @@ async def generate_response(request: GenerateResponseRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# ==================== CHAT ====================
+@app.post("/api/generate-response/stream")
+def generate_response_stream(
+    request: GenerateResponseRequest,
+    db_manager: ChromaDBManager = Depends(get_db_manager),
+    openai_service: OpenAIService = Depends(get_openai_service)
+):
+    """Згенерувати відповіді на коментар (SSE)
 
-@app.post("/api/chat")
-async def chat(message: ChatMessage):
-    """Чат про бренд"""
+    Для кожного стилю: draft_start, token..., draft; в кінці done з sources і usage.
+    """
     try:
-        logger.info(f"Chat query: {message.message}")
+        logger.info(f"Streaming response for comment: {request.comment_id}")
         
-        # Детекція запиту на порівняння брендів
-        comparison_keywords = ['порівня', 'порівнай', 'порівняти', 'vs', 'проти', 'compare', 'чи краще', 'відмінності']
-        is_comparison = any(keyword in message.message.lower() for keyword in comparison_keywords)
-        
-        if is_comparison:
-            # Спробуємо витягнути назви брендів
-            all_brands = db_manager.get_all_brands()
-            mentioned_brands = []
-            
-            for brand in all_brands:
-                if brand.lower() in message.message.lower():
-                    mentioned_brands.append(brand)
-            
-            if len(mentioned_brands) >= 2:
-                logger.info(f"Detected brand comparison: {mentioned_brands}")
-                
-                # Використовуємо порівняння брендів
-                comparisons = analytics_service.compare_brands(mentioned_brands[:5])  # Макс 5 брендів
-                
-                if not comparisons:
-                    return {
-                        "answer": f"Не знайдено даних для брендів: {', '.join(mentioned_brands)}",
-                        "sources": {"brands_compared": 0}
-                    }
-                
-                # Генеруємо відповідь про порівняння
-                answer = openai_service.generate_brand_comparison_answer(comparisons)
-                
-                return {
-                    "answer": answer,
-                    "sources": {
-                        "brands_compared": len(comparisons),
-                        "comparison_data": comparisons
-                    }
-                }
+        comment = db_manager.get_comment_by_id(request.comment_id)
+        if not comment:
+            raise HTTPException(status_code=404, detail="Коментар не знайдено")
         
-        # Звичайний чат (не порівняння)
-        # Збираємо статистику
-        stats = analytics_service.get_statistics()
+        brand_name = comment["metadata"].get("brand_name", "Unknown")
         
-        # Шукаємо релевантні коментарі
-        relevant_comments = db_manager.search_comments(message.message, n_results=10)
+        knowledge = db_manager.search_knowledge(comment["document"], n_results=5)
+        knowledge_docs = knowledge.get("documents", [[]])[0] if knowledge.get("documents") else []
+        context, _ = openai_service.build_response_context(knowledge_docs)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error preparing response stream: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    def events():
+        for event in openai_service.stream_response_drafts(
+            comment=comment["document"],
+            brand_name=brand_name,
+            context=context,
+            tones=request.tones,
+            tone_adjustment=request.tone_adjustment
+        ):
+            if event["event"] == "done":
+                event["data"]["sources"] = {
+                    "comment_id": request.comment_id,
+                    "brand_name": brand_name,
+                    "knowledge_docs_count": len(knowledge_docs)
+                }
+            yield event
+    
+    return StreamingResponse(sse_stream(events()), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.post("/api/generate-response/bulk", status_code=202)
+def generate_responses_bulk(
+    request: BulkDraftRequest,
+    bulk_drafter: BulkDrafter = Depends(get_bulk_drafter)
+):
+    """Запустити пакетну генерацію чернеток для відгуків за фільтрами
+
+    Задача працює у фоні; прогрес - GET /api/generate-response/bulk/{job_id},
+    чернетки - GET /api/generate-response/drafts/{comment_id}.
+    """
+    try:
+        filter_dict = _review_filter_dict(request.filters)
+        logger.info(f"Starting bulk draft job with filters: {filter_dict}")
+        return bulk_drafter.start(
+            filter_dict,
+            tones=request.tones,
+            tone_adjustment=request.tone_adjustment,
+            overwrite=request.overwrite
+        )
+    except Exception as e:
+        logger.error(f"Error starting bulk draft job: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/generate-response/bulk/{job_id}")
+def get_bulk_draft_job(
+    job_id: str,
+    draft_store: DraftStore = Depends(get_draft_store)
+):
+    """Прогрес і лічильники пакетної задачі (токени, оцінка вартості)"""
+    try:
+        job = draft_store.get_job(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Задачу не знайдено")
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting bulk draft job: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/generate-response/drafts/{comment_id}")
+def get_stored_drafts(
+    comment_id: str,
+    db_manager: ChromaDBManager = Depends(get_db_manager),
+    draft_store: DraftStore = Depends(get_draft_store)
+):
+    """Збережені чернетки відповідей для коментаря (stale - база знань змінилась після генерації)"""
+    try:
+        stored = draft_store.get_drafts(comment_id)
+        if not stored:
+            raise HTTPException(status_code=404, detail="Чернеток для коментаря немає")
+        stored["stale"] = stored["kb_version"] != db_manager.knowledge_version
+        return stored
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting stored drafts: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ==================== CHAT ====================
+
+def _route_chat(message_text: str, db_manager: ChromaDBManager, intent_router: IntentRouter) -> dict:
+    """Маршрут повідомлення (metric / comparison / open) + анотація для профілювання"""
+    route = intent_router.route(message_text, db_manager.get_all_brands())
+    annotate(chat_intent=route["intent"], chat_route_method=route["method"], chat_route_ms=route["route_ms"])
+    logger.info(f"Chat route: {route['intent']} ({route['method']}, {route['confidence']})")
+    return route
+
+
+def _routing_info(route: dict, started: float) -> dict:
+    """Рішення маршрутизатора і латентність для відповіді; total_ms також іде в histogram"""
+    elapsed = time.perf_counter() - started
+    CHAT_DURATION.labels(intent=route["intent"]).observe(elapsed)
+    return {
+        "intent": route["intent"],
+        "method": route["method"],
+        "confidence": route["confidence"],
+        "brands": route["brands"],
+        "route_ms": route["route_ms"],
+        "total_ms": round(elapsed * 1000, 2)
+    }
+
+
+def _metric_answer(route: dict, analytics_service: AnalyticsService) -> tuple:
+    """Відповідь на metric запит з агрегатів: (answer, sources)"""
+    filters = metric_filters(route)
+    stats = analytics_service.get_statistics(filters)
+    sources = {"statistics_filters": filters, "metric_kinds": route["metric_kinds"]}
+    return answer_metric_question(route, stats), sources
+
+
+def _comparison_answer(route: dict, analytics_service: AnalyticsService, openai_service: OpenAIService) -> tuple:
+    """Відповідь на порівняння брендів: (answer, sources)"""
+    comparisons = analytics_service.compare_brands(route["brands"])
+    if not comparisons:
+        return f"Не знайдено даних для брендів: {', '.join(route['brands'])}", {"brands_compared": 0}
+    answer = openai_service.generate_brand_comparison_answer(comparisons)
+    return answer, {"brands_compared": len(comparisons), "comparison_data": comparisons}
+
+
+def _chat_context(
+    message_text: str,
+    db_manager: ChromaDBManager,
+    analytics_service: AnalyticsService
+) -> tuple:
+    """Контекст для звичайного чату: (context_data, кількість знайдених коментарів)"""
+    # Збираємо статистику
+    stats = analytics_service.get_statistics()
+    
+    # Шукаємо релевантні коментарі
+    relevant_comments = db_manager.search_comments(message_text, n_results=10)
+    
+    # ChromaDB повертає списки в списках
+    docs = relevant_comments.get("documents", [[]])[0] if relevant_comments.get("documents") else []
+    metas = relevant_comments.get("metadatas", [[]])[0] if relevant_comments.get("metadatas") else []
+    
+    # Кандидати в порядку релевантності; обрізає і відбирає їх ContextBuilder
+    comment_snippets = [
+        f"- [{m.get('platform')}] ({m.get('sentiment')}): {d}"
+        for d, m in zip(docs, metas)
+    ]
+    
+    # Шукаємо в базі знань
+    knowledge = db_manager.search_knowledge(message_text, n_results=5)
+    knowledge_docs = knowledge.get("documents", [[]])[0] if knowledge.get("documents") else []
+    
+    # Збережені резюме проблем (без LLM): бренду з запитання або всіх брендів
+    mentioned = [brand for brand in db_manager.get_all_brands() if brand.lower() in message_text.lower()]
+    summaries = analytics_service.issue_summaries.cached(mentioned[0] if len(mentioned) == 1 else None)
+    issue_summaries = [
+        f"- {summary['day']}: {summary['summary']} (проблеми: {', '.join(summary['main_issues'])})"
+        for summary in reversed(summaries)
+    ]
+    
+    # Формуємо контекст
+    context_data = {
+        "total_mentions": stats["total_mentions"],
+        "sentiment_distribution": stats["sentiment_distribution"],
+        "top_categories": stats["top_categories"],
+        "platform_distribution": stats["platform_distribution"],
+        "issue_summaries": issue_summaries,
+        "relevant_comments": comment_snippets,
+        "knowledge_base": knowledge_docs
+    }
+    return context_data, len(docs)
+
+
+@app.post("/api/chat")
+def chat(
+    message: ChatMessage,
+    db_manager: ChromaDBManager = Depends(get_db_manager),
+    analytics_service: AnalyticsService = Depends(get_analytics_service),
+    openai_service: OpenAIService = Depends(get_openai_service),
+    intent_router: IntentRouter = Depends(get_intent_router)
+):
+    """Чат про бренд: metric - шаблон з агрегатів, comparison - порівняння, open - RAG"""
+    try:
+        started = time.perf_counter()
+        logger.info(f"Chat query: {message.message}")
         
-        # ChromaDB повертає списки в списках
-        docs = relevant_comments.get("documents", [[]])[0] if relevant_comments.get("documents") else []
-        metas = relevant_comments.get("metadatas", [[]])[0] if relevant_comments.get("metadatas") else []
+        route = _route_chat(message.message, db_manager, intent_router)
+        if route["intent"] == "metric":
+            answer, sources = _metric_answer(route, analytics_service)
+            return {"answer": answer, "sources": sources, "routing": _routing_info(route, started)}
         
-        comments_text = "\n".join([
-            f"- [{m.get('platform')}] ({m.get('sentiment')}): {d[:150]}..."
-            for d, m in zip(docs, metas)
-        ]) if docs else "Немає релевантних коментарів"
+        if route["intent"] == "comparison":
+            answer, sources = _comparison_answer(route, analytics_service, openai_service)
+            return {"answer": answer, "sources": sources, "routing": _routing_info(route, started)}
         
-        # Шукаємо в базі знань
-        knowledge = db_manager.search_knowledge(message.message, n_results=5)
-        knowledge_docs = knowledge.get("documents", [[]])[0] if knowledge.get("documents") else []
-        knowledge_text = "\n".join(knowledge_docs) if knowledge_docs else "Немає релевантних документів"
-        
-        # Формуємо контекст
-        context_data = {
-            "total_mentions": stats["total_mentions"],
-            "sentiment_distribution": stats["sentiment_distribution"],
-            "top_categories": stats["top_categories"],
-            "platform_distribution": stats["platform_distribution"],
-            "relevant_comments": comments_text,
-            "knowledge_base": knowledge_text
-        }
+        # Відкрите питання: повний RAG
+        context_data, found_count = _chat_context(message.message, db_manager, analytics_service)
         
         # Отримуємо відповідь від LLM
-        answer = openai_service.answer_chat_query(message.message, context_data)
+        result = openai_service.answer_chat_query(message.message, context_data)
         
-        logger.info("Chat response generated successfully")
+        annotate(rows_returned=found_count)
+        logger.info(f"Chat response generated successfully ({result['usage']['context_tokens']} context tokens)")
         
         return {
-            "answer": answer,
+            "answer": result["answer"],
             "sources": {
-                "comments_count": len(docs),
-                "knowledge_docs_count": len(knowledge_docs)
-            }
+                "comments_count": result["usage"]["comments_used"],
+                "knowledge_docs_count": result["usage"]["knowledge_chunks_used"]
+            },
+            "usage": result["usage"],
+            "routing": _routing_info(route, started)
         }
     except Exception as e:
         logger.error(f"Error in chat: {str(e)}")
@@ -482,40 +927,111 @@ async def chat(message: ChatMessage):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/chat/stream")
+def chat_stream(
+    message: ChatMessage,
+    db_manager: ChromaDBManager = Depends(get_db_manager),
+    analytics_service: AnalyticsService = Depends(get_analytics_service),
+    openai_service: OpenAIService = Depends(get_openai_service),
+    intent_router: IntentRouter = Depends(get_intent_router)
+):
+    """Чат про бренд (SSE): події token, в кінці done з sources, usage і routing"""
+    try:
+        started = time.perf_counter()
+        logger.info(f"Chat stream query: {message.message}")
+        
+        route = _route_chat(message.message, db_manager, intent_router)
+        if route["intent"] in ("metric", "comparison"):
+            if route["intent"] == "metric":
+                answer, sources = _metric_answer(route, analytics_service)
+            else:
+                answer, sources = _comparison_answer(route, analytics_service, openai_service)
+                sources.pop("comparison_data", None)
+            # Шаблон і порівняння не стрімимо: відповідь приходить одним token
+            events = [
+                {"event": "token", "data": {"text": answer}},
+                {"event": "done", "data": {"sources": sources, "routing": _routing_info(route, started)}}
+            ]
+            return StreamingResponse(sse_stream(events), media_type="text/event-stream", headers=SSE_HEADERS)
+        
+        context_data, found_count = _chat_context(message.message, db_manager, analytics_service)
+        annotate(rows_returned=found_count)
+    except Exception as e:
+        logger.error(f"Error in chat stream: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    def events():
+        for event in openai_service.stream_chat_answer(message.message, context_data):
+            if event["event"] == "done":
+                usage = event["data"]["usage"]
+                event["data"]["sources"] = {
+                    "comments_count": usage["comments_used"],
+                    "knowledge_docs_count": usage["knowledge_chunks_used"]
+                }
+                event["data"]["routing"] = _routing_info(route, started)
+            yield event
+    
+    # Синхронний генератор Starlette ітерує в threadpool - event loop не блокується
+    return StreamingResponse(sse_stream(events()), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 # ==================== SEARCH ====================
 
+def _review_pagination(results: dict) -> dict:
+    """Пагінація відповіді filter_comments (для /api/reviews/filter і дашборду)"""
+    return {
+        "total": results["total"],
+        "filtered_count": results["filtered_count"],
+        "returned_count": results["returned_count"],
+        "offset": results["offset"],
+        "limit": results["limit"],
+        "has_more": results["offset"] + results["returned_count"] < results["filtered_count"]
+    }
+
+
+def _review_filter_dict(filters: ReviewFilters) -> dict:
+    """ReviewFilters -> dict для filter_comments"""
+    filter_dict = {}
+    
+    if filters.brand_name:
+        filter_dict["brand_name"] = filters.brand_name
+    if filters.severity:
+        filter_dict["severity"] = filters.severity
+    if filters.sentiment:
+        filter_dict["sentiment"] = filters.sentiment
+    if filters.categories:
+        filter_dict["categories"] = filters.categories
+    if filters.platforms:
+        filter_dict["platforms"] = filters.platforms
+    if filters.rating_min is not None:
+        filter_dict["rating_min"] = filters.rating_min
+    if filters.rating_max is not None:
+        filter_dict["rating_max"] = filters.rating_max
+    if filters.date_from:
+        filter_dict["date_from"] = filters.date_from
+    if filters.date_to:
+        filter_dict["date_to"] = filters.date_to
+    if filters.text:
+        filter_dict["text"] = filters.text
+    
+    filter_dict["limit"] = filters.limit
+    filter_dict["offset"] = filters.offset
+    filter_dict["sort_by"] = filters.sort_by
+    filter_dict["sort_order"] = filters.sort_order
+    return filter_dict
+
+
 @app.post("/api/reviews/filter")
-async def filter_reviews(filters: ReviewFilters):
+def filter_reviews(
+    filters: ReviewFilters,
+    db_manager: ChromaDBManager = Depends(get_db_manager)
+):
     """Фільтрація відгуків за різними критеріями"""
     try:
         logger.info(f"Filtering reviews with: brand={filters.brand_name}, severity={filters.severity}, sentiment={filters.sentiment}, categories={filters.categories}")
         
-        # Конвертуємо фільтри в dict
-        filter_dict = {}
-        
-        if filters.brand_name:
-            filter_dict["brand_name"] = filters.brand_name
-        if filters.severity:
-            filter_dict["severity"] = filters.severity
-        if filters.sentiment:
-            filter_dict["sentiment"] = filters.sentiment
-        if filters.categories:
-            filter_dict["categories"] = filters.categories
-        if filters.platforms:
-            filter_dict["platforms"] = filters.platforms
-        if filters.rating_min is not None:
-            filter_dict["rating_min"] = filters.rating_min
-        if filters.rating_max is not None:
-            filter_dict["rating_max"] = filters.rating_max
-        if filters.date_from:
-            filter_dict["date_from"] = filters.date_from
-        if filters.date_to:
-            filter_dict["date_to"] = filters.date_to
-        
-        filter_dict["limit"] = filters.limit
-        filter_dict["offset"] = filters.offset
-        filter_dict["sort_by"] = filters.sort_by
-        filter_dict["sort_order"] = filters.sort_order
+        filter_dict = _review_filter_dict(filters)
         
         # Фільтруємо
         results = db_manager.filter_comments(filter_dict)
@@ -525,14 +1041,7 @@ async def filter_reviews(filters: ReviewFilters):
         return {
             "success": True,
             "data": results["results"],
-            "pagination": {
-                "total": results["total"],
-                "filtered_count": results["filtered_count"],
-                "returned_count": results["returned_count"],
-                "offset": results["offset"],
-                "limit": results["limit"],
-                "has_more": results["offset"] + results["returned_count"] < results["filtered_count"]
-            },
+            "pagination": _review_pagination(results),
             "filters_applied": filter_dict
         }
         
@@ -542,39 +1051,52 @@ async def filter_reviews(filters: ReviewFilters):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _format_search_hit(comment_id: str, document: str, metadata: dict) -> dict:
+    """Коментар у результатах пошуку"""
+    # Конвертуємо category зі строки в масив
+    category = metadata.get("category", "")
+    category_list = category.split(", ") if category else []
+    
+    return {
+        "id": comment_id,
+        "text": document,
+        "platform": metadata.get("platform"),
+        "sentiment": metadata.get("sentiment"),
+        "timestamp": metadata.get("timestamp"),
+        "rating": metadata.get("rating"),
+        "category": category_list,
+        "severity": metadata.get("severity")
+    }
+
+
 @app.get("/api/search/comments")
-async def search_comments(query: str, limit: int = 10):
-    """Пошук по коментарях"""
+def search_comments(
+    query: str,
+    limit: int = 10,
+    mode: Literal["auto", "keyword", "vector", "hybrid"] = "auto",
+    db_manager: ChromaDBManager = Depends(get_db_manager)
+):
+    """Пошук по коментарях (BM25, вектор або гібрид)"""
     try:
-        logger.info(f"Searching comments: {query}")
-        results = db_manager.search_comments(query, n_results=limit)
+        logger.info(f"Searching comments ({mode}): {query}")
+        results = db_manager.search_comments(query, n_results=limit, mode=mode)
         
         # ChromaDB повертає списки в списках
         ids = results.get("ids", [[]])[0] if results.get("ids") else []
         docs = results.get("documents", [[]])[0] if results.get("documents") else []
         metas = results.get("metadatas", [[]])[0] if results.get("metadatas") else []
+        scores = results.get("scores", [[]])[0] if results.get("scores") else []
         
-        formatted_results = []
-        for i, (doc, metadata) in enumerate(zip(docs, metas)):
-            # Конвертуємо category зі строки в масив
-            category = metadata.get("category", "")
-            category_list = category.split(", ") if category else []
-            
-            formatted_results.append({
-                "id": ids[i],
-                "text": doc,
-                "platform": metadata.get("platform"),
-                "sentiment": metadata.get("sentiment"),
-                "timestamp": metadata.get("timestamp"),
-                "rating": metadata.get("rating"),
-                "category": category_list,
-                "severity": metadata.get("severity")
-            })
+        formatted_results = [
+            {**_format_search_hit(ids[i], doc, metadata), "score": scores[i] if i < len(scores) else None}
+            for i, (doc, metadata) in enumerate(zip(docs, metas))
+        ]
         
         logger.info(f"Found {len(formatted_results)} results")
         
         return {
             "query": query,
+            "mode": results.get("mode"),
             "results": formatted_results,
             "total": len(formatted_results)
         }
@@ -584,10 +1106,51 @@ async def search_comments(query: str, limit: int = 10):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/search/comments/batch")
+def search_comments_batch(
+    request: BatchSearchRequest,
+    db_manager: ChromaDBManager = Depends(get_db_manager)
+):
+    """Семантичний пошук для кількох запитів одним пакетом embedding і одним query
+
+    Результати згруповані по запитах у порядку запиту; distance - відстань
+    до запиту (менше - ближче).
+    """
+    try:
+        logger.info(f"Batch searching comments: {len(request.queries)} queries")
+        grouped = db_manager.search_comments_batch(
+            request.queries,
+            n_results=request.limit,
+            filter_dict=request.where()
+        )
+        
+        response = []
+        for query, results in zip(request.queries, grouped):
+            hits = [
+                {**_format_search_hit(comment_id, doc, metadata), "distance": round(distance, 6)}
+                for comment_id, doc, metadata, distance in zip(
+                    results["ids"], results["documents"], results["metadatas"], results["distances"]
+                )
+            ]
+            response.append({"query": query, "results": hits, "total": len(hits)})
+        
+        return {
+            "mode": "vector",
+            "queries": response,
+            "total_queries": len(response)
+        }
+    except Exception as e:
+        logger.error(f"Error batch searching comments: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ==================== BRANDS MANAGEMENT ====================
 
 @app.get("/api/brands", response_model=List[str])
-async def get_all_brands():
+def get_all_brands(
+    db_manager: ChromaDBManager = Depends(get_db_manager)
+):
     """Отримати список всіх брендів"""
     try:
         logger.info("Getting all brands")
@@ -600,7 +1163,10 @@ async def get_all_brands():
 
 
 @app.delete("/api/brands/{brand_name}")
-async def delete_brand(brand_name: str):
+def delete_brand(
+    brand_name: str,
+    db_manager: ChromaDBManager = Depends(get_db_manager)
+):
     """Видалити всі дані по бренду"""
     try:
         logger.info(f"Deleting brand: {brand_name}")
@@ -618,7 +1184,10 @@ async def delete_brand(brand_name: str):
 
 
 @app.post("/api/brands/compare", response_model=List[BrandComparison])
-async def compare_brands(request: BrandComparisonRequest):
+def compare_brands(
+    request: BrandComparisonRequest,
+    analytics_service: AnalyticsService = Depends(get_analytics_service)
+):
     """Порівняння брендів"""
     try:
         logger.info(f"Comparing brands: {request.brand_names}")
@@ -639,8 +1208,55 @@ async def compare_brands(request: BrandComparisonRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ==================== ADMIN ====================
+
+@app.get("/api/admin/slow-queries")
+async def get_slow_queries(limit: int = 50, route: str = None):
+    """Останні повільні запити (новіші першими)"""
+    entries = slow_query_log.entries(limit=limit, route=route)
+    return {
+        "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "count": len(entries),
+        "entries": entries
+    }
+
+
+@app.get("/api/admin/profiles")
+async def list_profiles():
+    """Список збережених профілів запитів"""
+    return {"profiles": profile_store.list()}
+
+
+@app.get("/api/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    """Звіт cProfile для запиту (profile_id з заголовка X-Profile-Id)"""
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Профіль не знайдено")
+    return f"{profile['method']} {profile['route']} - {profile['duration_ms']} ms\n\n{profile['report']}"
+
+
+@app.get("/api/admin/ingest")
+def get_ingest_status():
+    """Стан single-writer черги і версія даних цього воркера"""
+    status = {
+        "mode": settings.INGEST_MODE,
+        "worker_data_version": get_db_manager().data_version if get_db_manager.is_initialized() else None
+    }
+    if settings.INGEST_MODE != "queue":
+        return status
+    
+    try:
+        status["queue"] = get_ingest_queue().stats()
+        if get_change_log_follower.is_initialized():
+            status["last_refresh_at"] = get_change_log_follower().last_refresh_at
+        return status
+    except Exception as e:
+        logger.error(f"Error reading ingest queue: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 if __name__ == "__main__":
     import uvicorn
-    from app.config import settings
     logger.info(f"Starting BrandPulse API on port {settings.PORT}")
     uvicorn.run(app, host="0.0.0.0", port=settings.PORT)
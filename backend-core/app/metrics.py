@@ -0,0 +1,228 @@
+"""
+Prometheus метрики для гарячих шляхів backend-core
+
+Усі метрики живуть у глобальному реєстрі prometheus_client і віддаються
+через GET /metrics. Оновлення - це інкремент лічильника під локом,
+тому метрики можна тримати увімкненими в production.
+"""
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+from app.streaming import is_event_stream
+
+
+# Межі бакетів (секунди): від швидких фільтрів до повільних LLM викликів
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    "brandpulse_http_request_duration_seconds",
+    "Латентність HTTP запитів по маршрутах",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+CHROMA_OPERATION_DURATION = Histogram(
+    "brandpulse_chroma_operation_duration_seconds",
+    "Тривалість операцій ChromaDB (включно з embedding для add/query)",
+    ["collection", "operation"],
+    buckets=LATENCY_BUCKETS
+)
+
+EMBEDDING_DURATION = Histogram(
+    "brandpulse_embedding_duration_seconds",
+    "Тривалість одного виклику embedding функції",
+    buckets=LATENCY_BUCKETS
+)
+
+EMBEDDING_BATCH_SIZE = Histogram(
+    "brandpulse_embedding_batch_size",
+    "Текстів в одному виклику моделі (мікро-пакет із кількох запитів)",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 1024, 4096)
+)
+
+EMBEDDING_QUEUE_WAIT = Histogram(
+    "brandpulse_embedding_queue_wait_seconds",
+    "Очікування запиту в черзі пулу embedding до початку обчислення",
+    ["queue"],
+    buckets=LATENCY_BUCKETS
+)
+
+EMBEDDED_TEXTS = Counter(
+    "brandpulse_embedded_texts_total",
+    "Кількість текстів, пропущених через embedding функцію"
+)
+
+OPENAI_REQUEST_DURATION = Histogram(
+    "brandpulse_openai_request_duration_seconds",
+    "Латентність викликів OpenAI",
+    ["operation", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+OPENAI_TIME_TO_FIRST_TOKEN = Histogram(
+    "brandpulse_openai_time_to_first_token_seconds",
+    "Час до першого токена у стрімінгових викликах OpenAI",
+    ["operation"],
+    buckets=LATENCY_BUCKETS
+)
+
+OPENAI_TOKENS = Counter(
+    "brandpulse_openai_tokens_total",
+    "Використані токени OpenAI",
+    ["operation", "kind"]
+)
+
+DRAFT_JOB_COMMENTS = Counter(
+    "brandpulse_draft_job_comments_total",
+    "Коментарі, оброблені пакетними задачами чернеток",
+    ["status"]
+)
+
+DRAFT_PRECOMPUTE_COMMENTS = Counter(
+    "brandpulse_draft_precompute_comments_total",
+    "Чернетки, згенеровані після ingest (і видалені після зміни бази знань)",
+    ["status"]
+)
+
+CHAT_ROUTES = Counter(
+    "brandpulse_chat_routes_total",
+    "Рішення маршрутизатора чату (intent: metric/comparison/open; method: rule/model)",
+    ["intent", "method"]
+)
+
+CHAT_DURATION = Histogram(
+    "brandpulse_chat_duration_seconds",
+    "Тривалість обробки повідомлення чату по маршрутах",
+    ["intent"],
+    buckets=LATENCY_BUCKETS
+)
+
+CATEGORY_DECISIONS = Counter(
+    "brandpulse_category_decisions_total",
+    "Нові рядки категорій, зведені за embedding схожістю (matched / other)",
+    ["result"]
+)
+
+ISSUE_CLUSTER_ASSIGNMENTS = Counter(
+    "brandpulse_issue_cluster_assignments_total",
+    "Негативні коментарі, призначені кластерам проблем (assigned / new_cluster)",
+    ["result"]
+)
+
+ANALYTICS_SHARD_DURATION = Histogram(
+    "brandpulse_analytics_shard_duration_seconds",
+    "Шардована аналітика: побудова колонок (build), дописування нових рядків (append) і агрегація в пулі (aggregate)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+
+ALERT_QUEUE_DEPTH = Gauge(
+    "brandpulse_alert_queue_depth",
+    "Кількість алертів, що очікують відправки в Telegram"
+)
+
+CACHE_REQUESTS = Counter(
+    "brandpulse_cache_requests_total",
+    "Звернення до кешів (hit/miss)",
+    ["cache", "result"]
+)
+
+STARTUP_DURATION = Gauge(
+    "brandpulse_startup_duration_seconds",
+    "Тривалість запуску воркера по фазах (boot, listeners, warmup)",
+    ["phase"]
+)
+
+INGEST_QUEUE_DEPTH = Gauge(
+    "brandpulse_ingest_queue_depth",
+    "Кількість записів, що очікують single-writer (INGEST_MODE=queue)"
+)
+
+LIVE_SUBSCRIBERS = Gauge(
+    "brandpulse_live_subscribers",
+    "Кількість підписок на live події (/api/live)"
+)
+
+LIVE_EVENTS_DROPPED = Counter(
+    "brandpulse_live_events_dropped_total",
+    "Live події, відкинуті через повільних клієнтів або переповнення черги",
+    ["reason"]
+)
+
+COLLECTION_SIZE = Gauge(
+    "brandpulse_collection_size",
+    "Кількість записів у колекціях ChromaDB",
+    ["collection"]
+)
+
+
+@contextmanager
+def track_duration(histogram, **labels):
+    """Вимірює тривалість блоку і записує в histogram"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        target = histogram.labels(**labels) if labels else histogram
+        target.observe(time.perf_counter() - started)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """Фіксує hit/miss для кешу (ratio рахується в Prometheus)"""
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def record_openai_usage(operation: str, usage):
+    """Записує використання токенів з відповіді OpenAI"""
+    if usage is None:
+        return
+    OPENAI_TOKENS.labels(operation=operation, kind="prompt").inc(usage.prompt_tokens or 0)
+    OPENAI_TOKENS.labels(operation=operation, kind="completion").inc(usage.completion_tokens or 0)
+
+
+def render_latest() -> tuple:
+    """Повертає (body, content_type) для /metrics"""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI middleware: histogram латентності по шаблону маршруту
+
+    Мітка route - це шаблон (/api/brands/{brand_name}), а не сирий шлях,
+    щоб кардинальність не росла разом з кількістю брендів чи ID.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        event_stream = False
+
+        async def send_wrapper(message):
+            nonlocal status_code, event_stream
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                event_stream = is_event_stream(message)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # SSE (/api/live, стрімінг чату і чернеток) тримає з'єднання хвилинами - це не латентність
+            if not event_stream:
+                route = scope.get("route")
+                route_path = getattr(route, "path", None) or "unmatched"
+                HTTP_REQUEST_DURATION.labels(
+                    method=scope["method"],
+                    route=route_path,
+                    status=str(status_code)
+                ).observe(time.perf_counter() - started)
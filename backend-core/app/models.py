@@ -214,6 +214,77 @@ class StatisticsFilters(BaseModel):
         }
 
 
+class BatchSearchRequest(BaseModel):
+    """Пакетний семантичний пошук по коментарях"""
+    queries: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=50,
+        description="Запити (однакові рахуються один раз)"
+    )
+    limit: int = Field(
+        10,
+        ge=1,
+        le=100,
+        description="Кількість результатів на запит"
+    )
+    brand_name: Optional[str] = Field(
+        None,
+        description="Фільтр по бренду"
+    )
+    platforms: Optional[List[str]] = Field(
+        None,
+        description="Фільтр по платформах"
+    )
+    sentiment: Optional[List[Literal["positive", "negative", "neutral"]]] = Field(
+        None,
+        description="Фільтр по настрою"
+    )
+    severity: Optional[List[Literal["low", "medium", "high", "critical"]]] = Field(
+        None,
+        description="Фільтр по рівню серйозності"
+    )
+    rating_min: Optional[float] = Field(
+        None,
+        ge=0,
+        le=5,
+        description="Мінімальний рейтинг"
+    )
+    rating_max: Optional[float] = Field(
+        None,
+        ge=0,
+        le=5,
+        description="Максимальний рейтинг"
+    )
+    
+    def where(self) -> Optional[dict]:
+        """Фільтри у форматі where ChromaDB (None - без фільтрів)"""
+        conditions = []
+        if self.brand_name:
+            conditions.append({"brand_name": self.brand_name})
+        for field, values in (("platform", self.platforms), ("sentiment", self.sentiment), ("severity", self.severity)):
+            if values:
+                conditions.append({field: {"$in": list(values)}})
+        if self.rating_min is not None:
+            conditions.append({"rating": {"$gte": self.rating_min}})
+        if self.rating_max is not None:
+            conditions.append({"rating": {"$lte": self.rating_max}})
+        
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "queries": ["не проходить оплата", "довга доставка", "додаток вилітає"],
+                "limit": 5,
+                "brand_name": "Zara",
+                "sentiment": ["negative"]
+            }
+        }
+
+
 class ReviewFilters(BaseModel):
     """Фільтри для пошуку відгуків"""
     brand_name: Optional[str] = Field(
@@ -256,6 +327,10 @@ class ReviewFilters(BaseModel):
         None,
         description="Дата до (ISO format)"
     )
+    text: Optional[str] = Field(
+        None,
+        description="Пошук по тексту: всі слова мають зустрітись (частина слова теж підходить)"
+    )
     limit: Optional[int] = Field(
         100,
         ge=1,
@@ -296,6 +371,39 @@ class ReviewFilters(BaseModel):
         }
 
 
+class BulkDraftRequest(BaseModel):
+    """Пакетна генерація чернеток для відібраних відгуків"""
+    filters: ReviewFilters = Field(
+        default_factory=lambda: ReviewFilters(
+            severity=["high", "critical"],
+            sentiment=["negative"],
+            sort_by="severity"
+        ),
+        description="Відбір коментарів (як у /api/reviews/filter; limit - скільки взяти)"
+    )
+    tones: List[ResponseTone] = Field(default=[ResponseTone.OFFICIAL, ResponseTone.FRIENDLY, ResponseTone.TECH_SUPPORT])
+    tone_adjustment: Optional[float] = Field(default=0.5, ge=0, le=1, description="0=строго офіційний, 1=максимально дружній")
+    overwrite: bool = Field(
+        False,
+        description="Перегенерувати коментарі, для яких чернетки вже збережені"
+    )
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "filters": {
+                    "brand_name": "Zara",
+                    "severity": ["high", "critical"],
+                    "sentiment": ["negative"],
+                    "date_from": "2025-10-03T00:00:00",
+                    "sort_by": "severity",
+                    "limit": 50
+                },
+                "tones": ["official", "friendly"]
+            }
+        }
+
+
 class BrandComparisonRequest(BaseModel):
     """Запит на порівняння брендів"""
     brand_names: List[str] = Field(..., min_length=2, max_length=5, description="Список брендів для порівняння")
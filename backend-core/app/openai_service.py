@@ -1,40 +1,155 @@
-from openai import OpenAI
 from app.config import settings
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
 from app.models import ResponseTone, ResponseDraft
+from app.metrics import OPENAI_REQUEST_DURATION, OPENAI_TIME_TO_FIRST_TOKEN, record_openai_usage
+from app.profiling import stage
+from app.context_builder import ContextBuilder, context_budget
+from app.tokens import count_tokens
 import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Маркери текстового формату стрімінгових чернеток
+DRAFT_TONE_MARKER = "=== tone:"
+DRAFT_ACTIONS_MARKER = ">>> actions:"
+DRAFT_LINKS_MARKER = ">>> links:"
+
+
+class DraftStreamParser:
+    """Розбирає потік чернеток з маркерами на події по стилях
+
+    Текст поточного стилю віддається одразу; рядок, що може бути маркером
+    (починається з "=" чи ">"), притримується до кінця рядка.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._at_line_start = True
+        self._tone = None
+        self._text = []
+        self._actions = []
+        self._links = []
+
+    def _finish_draft(self) -> List[Dict]:
+        if self._tone is None:
+            return []
+        draft = {
+            "tone": self._tone,
+            "text": "".join(self._text).strip(),
+            "action_items": self._actions,
+            "suggested_links": self._links
+        }
+        self._tone = None
+        return [{"event": "draft", "data": draft}] if draft["text"] else []
+
+    def _marker_line(self, line: str) -> List[Dict]:
+        line = line.strip()
+        if line.startswith(DRAFT_TONE_MARKER):
+            events = self._finish_draft()
+            tone = line[len(DRAFT_TONE_MARKER):].strip()
+            try:
+                tone = ResponseTone(tone).value
+            except ValueError:
+                logger.warning(f"Unknown tone in draft stream: {tone}")
+                tone = ResponseTone.OFFICIAL.value
+            self._tone, self._text, self._actions, self._links = tone, [], [], []
+            return events + [{"event": "draft_start", "data": {"tone": tone}}]
+        if line.startswith(DRAFT_ACTIONS_MARKER):
+            self._actions = [a.strip() for a in line[len(DRAFT_ACTIONS_MARKER):].split(";") if a.strip()]
+        elif line.startswith(DRAFT_LINKS_MARKER):
+            self._links = [link.strip() for link in line[len(DRAFT_LINKS_MARKER):].split(";") if link.strip()]
+        return []
+
+    def _text_piece(self, piece: str) -> List[Dict]:
+        if self._tone is None or not piece:
+            # Текст до першого маркера (преамбула моделі) відкидаємо
+            return []
+        self._text.append(piece)
+        return [{"event": "token", "data": {"tone": self._tone, "text": piece}}]
+
+    def feed(self, delta: str) -> List[Dict]:
+        self._buffer += delta
+        events = []
+        while self._buffer:
+            newline = self._buffer.find("\n")
+            if self._at_line_start and self._buffer[0] in "=>":
+                # Можливий маркер: чекаємо повний рядок
+                if newline == -1:
+                    break
+                line, self._buffer = self._buffer[:newline], self._buffer[newline + 1:]
+                if line.startswith(("===", ">>>")):
+                    events.extend(self._marker_line(line))
+                else:
+                    events.extend(self._text_piece(line + "\n"))
+                continue
+
+            if newline == -1:
+                events.extend(self._text_piece(self._buffer))
+                self._buffer = ""
+                self._at_line_start = False
+            else:
+                events.extend(self._text_piece(self._buffer[:newline + 1]))
+                self._buffer = self._buffer[newline + 1:]
+                self._at_line_start = True
+        return events
+
+    def close(self) -> List[Dict]:
+        """Кінець потоку: дочитати буфер і закрити останню чернетку"""
+        events = []
+        if self._buffer:
+            if self._buffer.startswith(("===", ">>>")):
+                events.extend(self._marker_line(self._buffer))
+            else:
+                events.extend(self._text_piece(self._buffer))
+            self._buffer = ""
+        return events + self._finish_draft()
+
+
+def _chunk_usage(chunk):
+    """usage з chunk-а include_usage (CompletionUsage або None)
+
+    ChatCompletionChunk у openai 1.10 ще не має поля usage - воно приходить
+    як extra атрибут-словник.
+    """
+    usage = getattr(chunk, "usage", None)
+    if isinstance(usage, dict):
+        from openai.types import CompletionUsage
+        usage = CompletionUsage.model_validate(usage)
+    return usage
+
 
 class OpenAIService:
     def __init__(self):
+        # openai імпортуємо тут, щоб не сповільнювати старт app.main
+        from openai import OpenAI
+        
         self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
     
-    def generate_response_drafts(
-        self, 
-        comment: str,
-        brand_name: str,
-        context: str,
-        tones: List[ResponseTone],
-        tone_adjustment: float = 0.5
-    ) -> List[ResponseDraft]:
-        """Генерує чернетки відповідей у різних стилях"""
-        
-        tone_descriptions = {
-            ResponseTone.OFFICIAL: "Офіційний, професійний, формальний. Відповідь на 'Ви', без емоджі.",
-            ResponseTone.FRIENDLY: "Дружній, неформальний, емпатійний. Можна використовувати 'ти', емоджі.",
-            ResponseTone.TECH_SUPPORT: "Технічний, детальний, з конкретними кроками розв'язання проблеми."
-        }
-        
-        tone_names = {
-            ResponseTone.OFFICIAL: "official",
-            ResponseTone.FRIENDLY: "friendly",
-            ResponseTone.TECH_SUPPORT: "tech_support"
-        }
-        
-        system_prompt = f"""Ти - експерт з customer support для бренду {brand_name}.
+    def _chat_completion(self, operation: str, **kwargs):
+        """Виклик chat.completions з метриками латентності та токенів"""
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with stage("llm"):
+                response = self.client.chat.completions.create(**kwargs)
+            status = "ok"
+            record_openai_usage(operation, response.usage)
+            return response
+        finally:
+            OPENAI_REQUEST_DURATION.labels(operation=operation, status=status).observe(
+                time.perf_counter() - started
+            )
+    
+    TONE_DESCRIPTIONS = {
+        ResponseTone.OFFICIAL: "Офіційний, професійний, формальний. Відповідь на 'Ви', без емоджі.",
+        ResponseTone.FRIENDLY: "Дружній, неформальний, емпатійний. Можна використовувати 'ти', емоджі.",
+        ResponseTone.TECH_SUPPORT: "Технічний, детальний, з конкретними кроками розв'язання проблеми."
+    }
+    
+    def _draft_system_prompt(self, brand_name: str, context: str, tone_adjustment: float) -> str:
+        return f"""Ти - експерт з customer support для бренду {brand_name}.
 Твоє завдання - генерувати професійні відповіді на відгуки користувачів.
 
 Контекст про бренд:
@@ -50,12 +165,31 @@ Tone adjustment: {tone_adjustment} (0=максимально оіційний, 1
 Відповідай українською мовою!
 Відповідь має бути природною, емпатійною і корисною.
 Не використовуй шаблонні фрази!"""
-
-        # Формуємо опис стилів
-        tones_text = "\n".join([
-            f"- **{tone_names[tone]}**: {tone_descriptions[tone]}"
+    
+    def _tones_text(self, tones: List[ResponseTone]) -> str:
+        """Опис стилів для промпту"""
+        return "\n".join([
+            f"- **{tone.value}**: {self.TONE_DESCRIPTIONS[tone]}"
             for tone in tones
         ])
+    
+    def generate_response_drafts(
+        self, 
+        comment: str,
+        brand_name: str,
+        context: str,
+        tones: List[ResponseTone],
+        tone_adjustment: float = 0.5,
+        usage: Dict = None
+    ) -> List[ResponseDraft]:
+        """Генерує чернетки відповідей у різних стилях
+
+        usage (необов'язково) - лічильники виклику: додаються prompt_tokens,
+        completion_tokens і fallback (1, якщо повернуто fallback чернетки).
+        """
+        
+        system_prompt = self._draft_system_prompt(brand_name, context, tone_adjustment)
+        tones_text = self._tones_text(tones)
 
         user_prompt = f"""Відгук користувача:
 \"\"\"
@@ -78,8 +212,9 @@ Tone adjustment: {tone_adjustment} (0=максимально оіційний, 1
 ]"""
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
+            response = self._chat_completion(
+                "generate_response_drafts",
+                model=settings.OPENAI_MODEL,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
@@ -88,6 +223,10 @@ Tone adjustment: {tone_adjustment} (0=максимально оіційний, 1
                 response_format={"type": "json_object"}
             )
             
+            if usage is not None and response.usage is not None:
+                usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + (response.usage.prompt_tokens or 0)
+                usage["completion_tokens"] = usage.get("completion_tokens", 0) + (response.usage.completion_tokens or 0)
+            
             content = response.choices[0].message.content
             logger.info(f"OpenAI response: {content[:200]}...")  # Логуємо відповідь
             
@@ -121,12 +260,16 @@ Tone adjustment: {tone_adjustment} (0=максимально оіційний, 1
             # Якщо не згенеровано жодної відповіді - використовуємо fallback
             if not drafts:
                 logger.error("No valid drafts generated, using fallback")
+                if usage is not None:
+                    usage["fallback"] = 1
                 return self._get_fallback_responses(comment, brand_name, tones)
             
             return drafts
         
         except Exception as e:
             logger.error(f"Error generating responses: {e}")
+            if usage is not None:
+                usage["fallback"] = 1
             return self._get_fallback_responses(comment, brand_name, tones)
     
     def _get_fallback_responses(self, comment: str, brand_name: str, tones: List[ResponseTone]) -> List[ResponseDraft]:
@@ -177,92 +320,230 @@ Tone adjustment: {tone_adjustment} (0=максимально оіційний, 1
         
         return drafts
     
-    def answer_chat_query(self, query: str, context_data: dict) -> str:
-        """Відповідає на запитання користувача про бренд"""
+    def build_response_context(self, knowledge_chunks: List[str]) -> tuple:
+        """Контекст бази знань для чернеток відповідей у межах RESPONSE_CONTEXT_TOKENS
+
+        Повертає (текст контексту, кількість токенів).
+        """
+        builder = ContextBuilder(settings.RESPONSE_CONTEXT_TOKENS)
+        builder.add_ranked("knowledge", knowledge_chunks)
+        context = builder.build()
+        
+        knowledge = context["sections"].get("knowledge")
+        return ("\n".join(knowledge) if knowledge else "Немає додаткового контексту"), context["tokens"]
+    
+    def _chat_messages(self, query: str, context_data: dict) -> tuple:
+        """Промпт чату в межах бюджету токенів: (messages, usage)
+
+        context_data["relevant_comments"] і ["knowledge_base"] - списки кандидатів
+        у порядку релевантності; у промпт потрапляє стільки, скільки вміщує
+        бюджет токенів моделі.
+        """
         
         system_prompt = """Ти - AI аналітик репутації бренду. 
 Відповідай на запитання користувача на основі наданих даних про бренд.
 Будь конкретним, використовуй цифри та факти.
 Відповідай українською мовою."""
 
-        # Формуємо контекст з даних
-        context_summary = f"""
+        stats_summary = f"""
 Дані про бренд:
 - Всього згадувань: {context_data.get('total_mentions', 0)}
 - Розподіл настроїв: {context_data.get('sentiment_distribution', {})}
 - Топ категорії проблем: {context_data.get('top_categories', [])}
 - Платформи: {context_data.get('platform_distribution', {})}
-
-Релевантні коментарі:
-{context_data.get('relevant_comments', 'Немає даних')}
+"""
+        question = f"\n\nЗапитання: {query}"
+        
+        # Фіксовані частини резервуємо, решту бюджету ділять коментарі та база знань
+        builder = ContextBuilder(context_budget())
+        builder.reserve(
+            system_prompt, "Контекст:\n", stats_summary,
+            "Резюме проблем:\nРелевантні коментарі:\nБаза знань:\n", question
+        )
+        builder.add_ranked("issues", context_data.get("issue_summaries", []), max_item_tokens=150)
+        builder.add_ranked("comments", context_data.get("relevant_comments", []), max_item_tokens=120)
+        builder.add_ranked("knowledge", context_data.get("knowledge_base", []), max_item_tokens=350)
+        context = builder.build()
+        
+        issues = context["sections"].get("issues", [])
+        comments = context["sections"].get("comments", [])
+        knowledge = context["sections"].get("knowledge", [])
+        comments_text = "\n".join(comments) if comments else "Немає релевантних коментарів"
+        knowledge_text = "\n".join(knowledge) if knowledge else "Немає релевантних документів"
+        issues_text = f"Резюме проблем:\n{chr(10).join(issues)}\n" if issues else ""
+        context_summary = f"""{stats_summary}
+{issues_text}Релевантні коментарі:
+{comments_text}
 
 База знань:
-{context_data.get('knowledge_base', 'Немає даних')}
+{knowledge_text}
 """
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Контекст:\n{context_summary}{question}"}
+        ]
+        usage = {
+            "context_tokens": sum(count_tokens(m["content"]) for m in messages),
+            "budget_tokens": builder.budget_tokens,
+            "issue_summaries_used": len(issues),
+            "comments_used": len(comments),
+            "knowledge_chunks_used": len(knowledge),
+            "snippets_dropped": context["dropped"]
+        }
+        return messages, usage
+    
+    def answer_chat_query(self, query: str, context_data: dict) -> Dict:
+        """Відповідає на запитання користувача про бренд. Повертає {"answer", "usage"}"""
+        messages, usage = self._chat_messages(query, context_data)
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Контекст:\n{context_summary}\n\nЗапитання: {query}"}
-                ],
+            response = self._chat_completion(
+                "answer_chat_query",
+                model=settings.OPENAI_MODEL,
+                messages=messages,
                 temperature=0.5
             )
             
-            return response.choices[0].message.content
+            if response.usage is not None:
+                usage["prompt_tokens"] = response.usage.prompt_tokens
+                usage["completion_tokens"] = response.usage.completion_tokens
+            return {"answer": response.choices[0].message.content, "usage": usage}
         
         except Exception as e:
-            return f"Вибачте, сталася помилка при обробці запиту: {str(e)}"
+            return {"answer": f"Вибачте, сталася помилка при обробці запиту: {str(e)}", "usage": usage}
     
-    def analyze_crisis_severity(self, mentions: List[dict]) -> dict:
-        """Аналізує серйозність кризи за допомогою LLM"""
+    def stream_chat_answer(self, query: str, context_data: dict) -> Iterator[Dict]:
+        """Стрімінгова версія answer_chat_query
+
+        Події: {"event": "token", "data": {"text"}} для кожного шматка відповіді,
+        в кінці {"event": "done", "data": {"usage"}}.
+        """
+        messages, usage = self._chat_messages(query, context_data)
         
-        mentions_text = "\n".join([
-            f"- [{m.get('platform')}] {m.get('body')[:100]}... (настрій: {m.get('sentiment')})"
-            for m in mentions[:20]  # Беремо перші 20
-        ])
+        try:
+            for kind, value in self._chat_completion_stream(
+                "answer_chat_query",
+                model=settings.OPENAI_MODEL,
+                messages=messages,
+                temperature=0.5
+            ):
+                if kind == "delta":
+                    yield {"event": "token", "data": {"text": value}}
+                else:
+                    usage.update(value)
+        except Exception as e:
+            logger.error(f"Error streaming chat answer: {e}")
+            yield {"event": "error", "data": {"detail": f"Вибачте, сталася помилка при обробці запиту: {str(e)}"}}
         
-        system_prompt = """Ти - експерт з кризового менеджменту репутації бренду.
-Проаналізуй згадування та визнач:
-1. Серйозність ситуації (low/medium/high/critical)
-2. Основні теми проблем
-3. Рекомендації для команди
-
-Відповідай JSON."""
+        yield {"event": "done", "data": {"usage": usage}}
+    
+    def stream_response_drafts(
+        self,
+        comment: str,
+        brand_name: str,
+        context: str,
+        tones: List[ResponseTone],
+        tone_adjustment: float = 0.5
+    ) -> Iterator[Dict]:
+        """Стрімінгова версія generate_response_drafts
+
+        Модель пише чернетки текстом з маркерами (не JSON - його не можна
+        показувати частинами). Для кожного стилю: "draft_start", потік "token",
+        і "draft" з готовою чернеткою (текст, action items, посилання).
+        В кінці "done" з usage. Якщо OpenAI недоступний - fallback чернетки.
+        """
+        user_prompt = f"""Відгук користувача:
+\"\"\"
+{comment}
+\"\"\"
 
-        user_prompt = f"""Аналіз {len(mentions)} згадувань бренду:
+Згенеруй відповіді у таких стилях:
+{self._tones_text(tones)}
 
-{mentions_text}
+ВАЖЛИВО: Відповідь має бути ПОВНОЮ і КОНКРЕТНОЮ!
 
-Формат відповіді:
-{{
-  "severity": "low/medium/high/critical",
-  "main_topics": ["тема 1", "тема 2"],
-  "recommendations": ["рекомендація 1", "рекомендація 2"],
-  "summary": "короткий опис ситуації"
-}}"""
+Формат відповіді (простий текст, кожен стиль окремим блоком):
+{DRAFT_TONE_MARKER} official
+ПОВНИЙ текст відповіді на відгук (3-5 речень)
+{DRAFT_ACTIONS_MARKER} дія 1; дія 2
+{DRAFT_LINKS_MARKER} посилання 1"""
 
+        parser = DraftStreamParser()
+        usage = {"context_tokens": count_tokens(context)}
+        streamed = set()
+        
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
+            for kind, value in self._chat_completion_stream(
+                "generate_response_drafts",
+                model=settings.OPENAI_MODEL,
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": self._draft_system_prompt(brand_name, context, tone_adjustment)},
                     {"role": "user", "content": user_prompt}
                 ],
-                temperature=0.3,
-                response_format={"type": "json_object"}
-            )
-            
-            return json.loads(response.choices[0].message.content)
-        
+                temperature=0.7
+            ):
+                if kind == "usage":
+                    usage.update(value)
+                    continue
+                for event in parser.feed(value):
+                    if event["event"] == "draft":
+                        streamed.add(event["data"]["tone"])
+                    yield event
         except Exception as e:
-            return {
-                "severity": "medium",
-                "main_topics": ["Невідомо"],
-                "recommendations": ["Проаналізувати ситуацію вручну"],
-                "summary": f"Помилка аналізу: {str(e)}"
-            }
+            logger.error(f"Error streaming responses: {e}")
+            yield {"event": "error", "data": {"detail": str(e)}}
+        
+        # Останню чернетку закриваємо і після помилки: її текст уже пішов клієнту
+        for event in parser.close():
+            if event["event"] == "draft":
+                streamed.add(event["data"]["tone"])
+            yield event
+        
+        # Стилі, яких модель не дописала, закриваємо fallback текстом
+        missing = [tone for tone in tones if tone.value not in streamed]
+        for draft in self._get_fallback_responses(comment, brand_name, missing) if missing else []:
+            yield {"event": "draft", "data": draft.model_dump(mode="json")}
+        
+        yield {"event": "done", "data": {"usage": usage}}
+    
+    def _chat_completion_stream(self, operation: str, **kwargs) -> Iterator[tuple]:
+        """Стрімінговий chat.completions: ("delta", текст)..., в кінці ("usage", {...})
+
+        Пише ті самі метрики, що й _chat_completion, плюс time-to-first-token.
+        """
+        started = time.perf_counter()
+        status = "error"
+        first_token = True
+        try:
+            stream = self.client.chat.completions.create(
+                stream=True,
+                # include_usage: останній chunk містить usage (openai SDK цього ще не знає)
+                extra_body={"stream_options": {"include_usage": True}},
+                **kwargs
+            )
+            for chunk in stream:
+                usage = _chunk_usage(chunk)
+                if usage:
+                    record_openai_usage(operation, usage)
+                    yield "usage", {
+                        "prompt_tokens": usage.prompt_tokens,
+                        "completion_tokens": usage.completion_tokens
+                    }
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token:
+                        OPENAI_TIME_TO_FIRST_TOKEN.labels(operation=operation).observe(
+                            time.perf_counter() - started
+                        )
+                        first_token = False
+                    yield "delta", delta
+            status = "ok"
+        finally:
+            OPENAI_REQUEST_DURATION.labels(operation=operation, status=status).observe(
+                time.perf_counter() - started
+            )
     
     def generate_brand_comparison_answer(self, comparisons: List[dict]) -> str:
         """Генерує відповідь про порівняння брендів"""
@@ -306,8 +587,9 @@ Tone adjustment: {tone_adjustment} (0=максимально оіційний, 1
 Зроби детальний аналіз і порівняння."""
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
+            response = self._chat_completion(
+                "generate_brand_comparison_answer",
+                model=settings.OPENAI_MODEL,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
@@ -334,37 +616,51 @@ Tone adjustment: {tone_adjustment} (0=максимально оіційний, 1
             
             return result
 
-    def analyze_negative_spike(self, negative_comments: List[dict], increase_ratio: float) -> dict:
-        """Аналіз сплеску негативних згадок"""
-        
+    def summarize_issues(self, comments: List[dict], previous: dict = None) -> Optional[dict]:
+        """Резюме проблем з набору згадок (або оновлення попереднього резюме новими)
+
+        comments - {"body", "platform", "severity"}; previous - попереднє резюме
+        {"summary", "main_issues", "recommendations"}, тоді в промпт ідуть лише нові
+        згадки. Повертає None, якщо OpenAI не відповів.
+        """
         comments_text = "\n".join([
-            f"- [{c.get('platform')}] {c.get('body')[:150]}..."
-            for c in negative_comments[:15]
+            f"- [{c.get('platform')}, {c.get('severity')}] {(c.get('body') or '')[:200]}"
+            for c in comments
         ])
         
-        system_prompt = """Ти - експерт з кризового менеджменту репутації.
-Проаналізуй сплеск негативних згадок і дай:
-1. Коротке резюме (2-3 речення)
-2. Основні проблеми
-3. Рекомендації для команди
-
-Відповідай JSON."""
+        system_prompt = """Ти - аналітик репутації бренду.
+Стисло підсумуй, на що скаржаться користувачі: основні проблеми і що з ними робити.
+Відповідай українською, JSON."""
         
-        user_prompt = f"""Збільшення негативу: {increase_ratio:.1f}x
+        if previous:
+            previous_text = json.dumps(
+                {key: previous.get(key) for key in ("summary", "main_issues", "recommendations")},
+                ensure_ascii=False
+            )
+            user_prompt = f"""Попереднє резюме:
+{previous_text}
 
-Негативні згадки:
+Нові згадки:
 {comments_text}
 
+Онови резюме з урахуванням нових згадок."""
+        else:
+            user_prompt = f"""Згадки:
+{comments_text}"""
+        
+        user_prompt += """
+
 Формат:
-{{
-  "summary": "коротке резюме",
+{
+  "summary": "коротке резюме (2-3 речення)",
   "main_issues": ["проблема 1", "проблема 2"],
   "recommendations": ["рекомендація 1", "рекомендація 2"]
-}}"""
+}"""
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
+            response = self._chat_completion(
+                "summarize_issues",
+                model=settings.OPENAI_MODEL,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
@@ -373,15 +669,13 @@ Tone adjustment: {tone_adjustment} (0=максимально оіційний, 1
                 response_format={"type": "json_object"}
             )
             
-            return json.loads(response.choices[0].message.content)
-        
-        except Exception as e:
+            result = json.loads(response.choices[0].message.content)
             return {
-                "summary": f"Виявлено збільшення негативних згадок у {increase_ratio:.1f} разів. Потрібна увага.",
-                "main_issues": ["Невідомо"],
-                "recommendations": ["Проаналізувати вручну"]
+                "summary": result.get("summary", ""),
+                "main_issues": result.get("main_issues", []),
+                "recommendations": result.get("recommendations", [])
             }
-
-
-# Singleton
-openai_service = OpenAIService()
+        
+        except Exception as e:
+            logger.error(f"Error summarizing issues: {e}")
+            return None
@@ -0,0 +1,247 @@
+"""
+Профілювання запитів та slow-query log
+
+- RequestTrace збирає тривалість стадій (chroma, embedding, llm, filter, sort...)
+  і довільні анотації (фільтри, rows_scanned, rows_returned) для поточного запиту.
+- ProfilingMiddleware вмикає cProfile для запиту за заголовком X-Profile: 1
+  або з ймовірністю PROFILE_SAMPLE_RATE, і пише повільні запити в slow-query log.
+"""
+import cProfile
+import inspect
+import io
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from typing import List, Optional
+
+from fastapi.routing import APIRoute
+
+from app.config import settings
+from app.streaming import is_event_stream
+
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+
+class RequestTrace:
+    """Стадії та анотації одного HTTP запиту"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.stages = defaultdict(float)
+        self.info = {}
+        # cProfile кожного потоку запиту (event loop і пул потоків); None - без профілю
+        self.profilers = None
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Додає тривалість блоку до стадії поточного запиту (поза запитом - no-op)"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.stages[name] += time.perf_counter() - started
+
+
+def annotate(**info):
+    """Додає анотації до поточного запиту (filters, rows_scanned, rows_returned...)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.info.update(info)
+
+
+class SlowQueryLog:
+    """Кільцевий буфер повільних запитів"""
+
+    def __init__(self, max_entries: int):
+        self._entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def record(self, entry: dict):
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self, limit: int = 50, route: str = None) -> List[dict]:
+        """Останні записи (новіші першими), опційно по маршруту"""
+        with self._lock:
+            items = list(self._entries)
+        items.reverse()
+        if route:
+            items = [e for e in items if e["route"] == route]
+        return items[:limit]
+
+
+class ProfileStore:
+    """Останні N профілів запитів (profile_id -> звіт pstats)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, profile_id: str, summary: dict):
+        with self._lock:
+            self._profiles[profile_id] = summary
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            items = list(self._profiles.values())
+        items.reverse()
+        return [{k: v for k, v in p.items() if k != "report"} for p in items]
+
+
+slow_query_log = SlowQueryLog(settings.SLOW_QUERY_LOG_SIZE)
+profile_store = ProfileStore(settings.PROFILE_STORE_SIZE)
+
+# cProfile на один потік не можна вмикати двічі - профілюємо один запит за раз
+_profiler_lock = threading.Lock()
+
+
+def _format_profile(profilers: List[cProfile.Profile], limit: int = 40) -> str:
+    """Текстовий звіт pstats (усі потоки запиту разом), відсортований за cumulative time"""
+    stream = io.StringIO()
+    stats = pstats.Stats(*profilers, stream=stream)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue()
+
+
+def profiled(func):
+    """Синхронний handler з cProfile запиту
+
+    FastAPI виконує def handler-и в пулі потоків, а cProfile бачить лише потік,
+    у якому його ввімкнули - тому для кожного виклику окремий профайлер,
+    який middleware потім зводить в один звіт.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        trace = _current_trace.get()
+        if trace is None or trace.profilers is None:
+            return func(*args, **kwargs)
+        profiler = cProfile.Profile()
+        trace.profilers.append(profiler)
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute, що обгортає синхронні handler-и в profiled"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: стадії запиту, семпльований cProfile і slow-query log
+
+    cProfile працює на потоці event loop (туди можуть потрапити й інші
+    корутини, що виконувались паралельно з цим запитом), а синхронні
+    handler-и профілюються в пулі потоків через ProfiledRoute.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wants_profile(self, scope) -> bool:
+        for name, value in scope.get("headers", []):
+            if name == PROFILE_HEADER:
+                return value in (b"1", b"true")
+        return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope["method"], scope["path"])
+        token = _current_trace.set(trace)
+
+        profiler = None
+        profile_id = None
+        if self._wants_profile(scope) and _profiler_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            profile_id = str(uuid.uuid4())
+            trace.profilers = [profiler]
+
+        status_code = 500
+        event_stream = False
+
+        async def send_wrapper(message):
+            nonlocal status_code, event_stream
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                event_stream = is_event_stream(message)
+                if profile_id:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (PROFILE_ID_HEADER, profile_id.encode())
+                    ]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            if profiler:
+                profiler.enable()
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiler:
+                profiler.disable()
+                _profiler_lock.release()
+            duration = time.perf_counter() - started
+            _current_trace.reset(token)
+
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+
+            if profiler:
+                profile_store.save(profile_id, {
+                    "profile_id": profile_id,
+                    "timestamp": datetime.now().isoformat(),
+                    "method": trace.method,
+                    "route": route,
+                    "duration_ms": round(duration * 1000, 2),
+                    "report": _format_profile(trace.profilers)
+                })
+
+            # SSE з'єднання живуть хвилинами - у slow-query log вони витіснили б справжні запити
+            if duration * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS and not event_stream:
+                slow_query_log.record({
+                    "timestamp": datetime.now().isoformat(),
+                    "method": trace.method,
+                    "route": route,
+                    "path": trace.path,
+                    "status": status_code,
+                    "duration_ms": round(duration * 1000, 2),
+                    "filters": trace.info.get("filters"),
+                    "rows_scanned": trace.info.get("rows_scanned"),
+                    "rows_returned": trace.info.get("rows_returned"),
+                    "stages_ms": {k: round(v * 1000, 2) for k, v in trace.stages.items()},
+                    "profile_id": profile_id
+                })
@@ -0,0 +1,141 @@
+"""
+Денна історія оцінки репутації по брендах
+
+Раз на день (scripts/reputation_history.py snapshot з cron) для кожного
+бренду зберігається оцінка за день, оцінки по платформах, розподіл
+sentiment і кількість згадок. Графіки за місяці читають лише цю таблицю
+(рядок на бренд на день), без проходу по сирих коментарях.
+Рядки з brand_name="*" - усі бренди разом (як /api/reputation-score).
+"""
+import json
+import os
+import sqlite3
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+from app.analytics import score_comments
+from app.config import settings
+
+# Агрегат по всіх брендах
+ALL_BRANDS = "*"
+
+
+class ReputationHistory:
+    """Таблиця daily_reputation у SQLite: (brand_name, day) -> оцінка і лічильники"""
+
+    def __init__(self, db_manager, path: str = None):
+        self.db = db_manager
+        self.path = path or settings.REPUTATION_HISTORY_PATH or os.path.join(
+            settings.CHROMA_PERSIST_DIR, "reputation_history.sqlite3"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS daily_reputation (
+                    brand_name TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    overall_score REAL NOT NULL,
+                    platform_scores TEXT NOT NULL,
+                    positive INTEGER NOT NULL,
+                    negative INTEGER NOT NULL,
+                    neutral INTEGER NOT NULL,
+                    volume INTEGER NOT NULL,
+                    average_rating REAL,
+                    computed_at TEXT NOT NULL,
+                    PRIMARY KEY (brand_name, day)
+                ) WITHOUT ROWID
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def snapshot(self, date_from: date, date_to: date) -> int:
+        """Перерахувати дні [date_from, date_to] з коментарів (один прохід), повертає кількість рядків
+
+        Дні в діапазоні перезаписуються повністю: якщо коментарі бренду за
+        день видалили, його рядок зникне.
+        """
+        first, last = date_from.isoformat(), date_to.isoformat()
+        buckets = defaultdict(list)
+
+        for page in self.db.iter_comments(include=["metadatas"]):
+            for metadata in page["metadatas"]:
+                # ISO timestamp починається з дати - без розбору datetime на кожен рядок
+                day = (metadata.get("timestamp") or "")[:10]
+                if not first <= day <= last:
+                    continue
+                buckets[(metadata.get("brand_name") or "Unknown", day)].append(metadata)
+                buckets[(ALL_BRANDS, day)].append(metadata)
+
+        computed_at = datetime.now().isoformat()
+        rows = []
+        for (brand_name, day), metadatas in buckets.items():
+            components = score_comments(metadatas)
+            sentiment = components["sentiment_counts"]
+            rows.append((
+                brand_name,
+                day,
+                round(components["score"], 1),
+                json.dumps(components["platform_scores"], ensure_ascii=False),
+                sentiment["positive"],
+                sentiment["negative"],
+                sentiment["neutral"],
+                components["volume"],
+                components["average_rating"],
+                computed_at
+            ))
+
+        with self._connect() as conn:
+            conn.execute("DELETE FROM daily_reputation WHERE day >= ? AND day <= ?", (first, last))
+            conn.executemany(
+                "INSERT INTO daily_reputation VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return len(rows)
+
+    def history(self, brand_name: str = None, date_from: str = None, date_to: str = None) -> List[Dict]:
+        """Рядки бренду (або всіх брендів) за період, від старих до нових"""
+        date_to = date_to or date.today().isoformat()
+        date_from = date_from or (
+            date.fromisoformat(date_to[:10]) - timedelta(days=settings.REPUTATION_HISTORY_DEFAULT_DAYS)
+        ).isoformat()
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT day, overall_score, platform_scores, positive, negative, neutral, volume, average_rating
+                FROM daily_reputation
+                WHERE brand_name = ? AND day >= ? AND day <= ?
+                ORDER BY day
+                """,
+                (brand_name or ALL_BRANDS, date_from[:10], date_to[:10])
+            ).fetchall()
+
+        return [
+            {
+                "date": day,
+                "overall_score": overall_score,
+                "platform_scores": json.loads(platform_scores),
+                "sentiment_distribution": {"positive": positive, "negative": negative, "neutral": neutral},
+                "volume": volume,
+                "average_rating": average_rating
+            }
+            for day, overall_score, platform_scores, positive, negative, neutral, volume, average_rating in rows
+        ]
+
+    def stats(self) -> Dict:
+        """Покриття історії: дні і бренди"""
+        with self._connect() as conn:
+            first, last, days = conn.execute(
+                "SELECT MIN(day), MAX(day), COUNT(DISTINCT day) FROM daily_reputation"
+            ).fetchone()
+            brands = conn.execute(
+                "SELECT COUNT(DISTINCT brand_name) FROM daily_reputation WHERE brand_name != ?",
+                (ALL_BRANDS,)
+            ).fetchone()[0]
+        return {"first_day": first, "last_day": last, "days": days, "brands": brands}
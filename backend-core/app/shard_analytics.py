@@ -0,0 +1,439 @@
+"""
+Шардована агрегація аналітики в пулі процесів (великі корпуси)
+
+Прохід одного потоку Python по мільйонах metadata впирається в одне ядро.
+Коли аналітика читає ANALYTICS_PARALLEL_MIN_ROWS рядків і більше, metadata
+один раз на версію даних перекладаються в колонки numpy (коди бренду,
+платформи, sentiment і severity, рейтинг, час UTC, день, маска канонічних
+категорій) в одному блоці shared memory. Воркери пулу відкривають блок за
+іменем - рядки не серіалізуються. Кожен воркер рахує свій діапазон рядків
+(шард) одразу для кількох груп фільтрів і повертає часткові агрегати
+(лічильники, суми, гістограми), які складаються в батьківському процесі.
+
+Колонки перебудовуються з нуля лише після видалень. Нові коментарі
+ShardedAnalytics бачить як слухач записів і дописує їх до колонок попередньої
+версії (кодуються лише нові рядки, старі колонки копіюються numpy), тож
+ingest, що безперервно змінює версію даних, не повертає O(N) прохід Python
+у кожен виклик дашборду.
+
+Воркери стартують через spawn: батьківський процес має потоки (embedding
+пул, live події), fork їх стан не переносить коректно. З одним воркером
+(одне ядро) колонки агрегуються в самому процесі, без пулу.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from multiprocessing import get_context, shared_memory
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.metrics import ANALYTICS_SHARD_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Порядок ключів - як у відповідях get_statistics
+SENTIMENTS = ["positive", "negative", "neutral"]
+SEVERITIES = ["low", "medium", "high", "critical"]
+# Внесок sentiment у тренд репутації
+SENTIMENT_VALUES = {"positive": 1.0, "neutral": 0.5, "negative": 0.0}
+
+WEEK_SECONDS = 7 * 86400
+
+COLUMNS = [
+    ("brand", np.int32),
+    ("platform", np.int32),
+    ("sentiment", np.int32),
+    ("severity", np.int32),
+    ("rating", np.float64),
+    ("ts", np.float64),  # UTC, секунди; NaN - timestamp не розібрано
+    ("day", np.int32),   # toordinal() дати timestamp як записано (timeline)
+    ("mask", np.int64),  # маска канонічних категорій
+]
+
+
+def parse_seconds(value) -> Optional[float]:
+    """ISO рядок -> UTC секунди (без timezone - UTC), None якщо не розібрано"""
+    try:
+        timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except Exception:
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+class ColumnarComments:
+    """Колонки коментарів однієї версії даних у shared memory
+
+    previous - колонки попередньої версії: metadatas тоді лише нові рядки,
+    що дописуються в кінець (коди старих рядків не змінюються - словники
+    лише доповнюються).
+    """
+
+    def __init__(self, metadatas: List[dict], version: int, category_mask, previous: "ColumnarComments" = None):
+        self.version = version
+        if previous is None:
+            self.vocab = {"brand": [], "platform": [], "sentiment": list(SENTIMENTS), "severity": list(SEVERITIES)}
+        else:
+            self.vocab = {kind: list(values) for kind, values in previous.vocab.items()}
+        self.codes = {kind: {value: code for code, value in enumerate(values)} for kind, values in self.vocab.items()}
+        # Скільки шардованих обчислень зараз читають блок; retired - замінено новою версією
+        self.users = 0
+        self.retired = False
+
+        arrays = self._encode(metadatas, category_mask)
+        if previous is not None:
+            old = previous.arrays()
+            arrays = {name: np.concatenate([old[name], arrays[name]]) for name, _ in COLUMNS}
+            del old
+        self.rows = len(arrays["brand"])
+
+        # Усі колонки в одному блоці, зсуви вирівняні на 8 байт
+        layout, offset = [], 0
+        for name, dtype in COLUMNS:
+            layout.append((name, np.dtype(dtype).str, offset))
+            offset += -(-arrays[name].nbytes // 8) * 8
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 8))
+        for name, dtype, start in layout:
+            np.ndarray(self.rows, dtype=dtype, buffer=self.shm.buf, offset=start)[:] = arrays[name]
+        self.spec = {
+            "name": self.shm.name,
+            "rows": self.rows,
+            "layout": layout,
+            "sentiments": len(self.vocab["sentiment"]),
+            "platforms": len(self.vocab["platform"]),
+            "severities": len(self.vocab["severity"]),
+            "sentiment_values": [SENTIMENT_VALUES.get(s, float("nan")) for s in self.vocab["sentiment"]],
+        }
+
+    def _encode(self, metadatas: List[dict], category_mask) -> Dict[str, np.ndarray]:
+        """metadata -> колонки (прохід Python по рядках)"""
+        lists = {name: [] for name, _ in COLUMNS}
+        today = datetime.now().toordinal()
+        code = self._code
+        for metadata in metadatas:
+            lists["brand"].append(code("brand", metadata.get("brand_name")))
+            lists["platform"].append(code("platform", metadata.get("platform", "unknown")))
+            lists["sentiment"].append(code("sentiment", metadata.get("sentiment", "neutral")))
+            lists["severity"].append(code("severity", metadata.get("severity", "medium")))
+            lists["rating"].append(metadata.get("rating") or 0.0)
+            try:
+                timestamp = datetime.fromisoformat(metadata["timestamp"].replace('Z', '+00:00'))
+                day = timestamp.toordinal()
+                if timestamp.tzinfo is None:
+                    timestamp = timestamp.replace(tzinfo=timezone.utc)
+                seconds = timestamp.timestamp()
+            except Exception:
+                day, seconds = today, float("nan")
+            lists["day"].append(day)
+            lists["ts"].append(seconds)
+            lists["mask"].append(category_mask(metadata))
+        return {name: np.asarray(lists.pop(name), dtype=dtype) for name, dtype in COLUMNS}
+
+    def _code(self, kind: str, value) -> int:
+        codes = self.codes[kind]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.vocab[kind])
+            self.vocab[kind].append(value)
+        return code
+
+    def group(self, filters: dict = None) -> dict:
+        """Фільтри get_statistics (brand_name, date_from/date_to, platforms) -> коди для воркерів"""
+        filters = filters or {}
+        group = {"brand": None, "dated": False, "date_from": None, "date_to": None, "platforms": None}
+        if filters.get("brand_name"):
+            group["brand"] = self.codes["brand"].get(filters["brand_name"], -1)
+        if filters.get("date_from") or filters.get("date_to"):
+            # Як у проході по рядках: нерозібраний timestamp відкидається, нерозібраний фільтр ігнорується
+            group["dated"] = True
+            group["date_from"] = parse_seconds(filters["date_from"]) if filters.get("date_from") else None
+            group["date_to"] = parse_seconds(filters["date_to"]) if filters.get("date_to") else None
+        if filters.get("platforms"):
+            platforms = self.codes["platform"]
+            group["platforms"] = [
+                platforms[value] for value in (getattr(p, "value", p) for p in filters["platforms"])
+                if value in platforms
+            ]
+        return group
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return _views(self.shm, self.spec)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# ==================== ВОРКЕР ====================
+
+# Блоки, відкриті у воркері (ім'я -> SharedMemory); тримаємо лише останній
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _views(shm: shared_memory.SharedMemory, spec: dict) -> Dict[str, np.ndarray]:
+    return {
+        name: np.ndarray(spec["rows"], dtype=dtype, buffer=shm.buf, offset=offset)
+        for name, dtype, offset in spec["layout"]
+    }
+
+
+def _attach(spec: dict) -> Dict[str, np.ndarray]:
+    for name in [name for name in _attached if name != spec["name"]]:
+        _attached.pop(name).close()
+    shm = _attached.get(spec["name"])
+    if shm is None:
+        shm = _attached[spec["name"]] = shared_memory.SharedMemory(name=spec["name"])
+    return _views(shm, spec)
+
+
+def _aggregate(columns: Dict[str, np.ndarray], group: dict, spec: dict, now: float, start: int = 0) -> dict:
+    selected = np.ones(len(columns["brand"]), dtype=bool)
+    if group["brand"] is not None:
+        selected &= columns["brand"] == group["brand"]
+    if group["dated"]:
+        ts = columns["ts"]
+        selected &= ~np.isnan(ts)
+        if group["date_from"] is not None:
+            selected &= ts >= group["date_from"]
+        if group["date_to"] is not None:
+            selected &= ts <= group["date_to"]
+    if group["platforms"] is not None:
+        selected &= np.isin(columns["platform"], group["platforms"])
+
+    sentiments = spec["sentiments"]
+    sentiment = columns["sentiment"][selected]
+    platform = columns["platform"][selected]
+    rating = columns["rating"][selected]
+    rated = rating[rating > 0]
+    days, day_counts = np.unique(columns["day"][selected].astype(np.int64) * sentiments + sentiment, return_counts=True)
+    # Перша позиція маски - щоб порядок рівних категорій збігався з проходом по рядках
+    masks, first, mask_counts = np.unique(columns["mask"][selected], return_index=True, return_counts=True)
+    first = np.flatnonzero(selected)[first] + start
+
+    # Тренд: останні 7 днів проти попередніх 7 (NaN у порівняннях - False)
+    ts = columns["ts"][selected]
+    values = np.asarray(spec["sentiment_values"])[sentiment]
+    known = ~np.isnan(values)
+    recent = known & (ts > now - WEEK_SECONDS)
+    previous = known & ~recent & (ts > now - 2 * WEEK_SECONDS)
+
+    return {
+        "rows": int(selected.sum()),
+        "platform_sentiment": np.bincount(
+            platform * sentiments + sentiment, minlength=spec["platforms"] * sentiments
+        ),
+        "severity": np.bincount(columns["severity"][selected], minlength=spec["severities"]),
+        "rating_sum": float(rated.sum()),
+        "rating_count": int(rated.size),
+        "timeline": (days, day_counts),
+        "masks": (masks, mask_counts, first),
+        "trend": [float(values[recent].sum()), int(recent.sum()), float(values[previous].sum()), int(previous.sum())],
+    }
+
+
+def aggregate_shard(spec: dict, start: int, stop: int, groups: List[dict], now: float) -> List[dict]:
+    """Часткові агрегати рядків [start, stop) для кожної групи фільтрів (у процесі пулу)"""
+    columns = {name: array[start:stop] for name, array in _attach(spec).items()}
+    return [_aggregate(columns, group, spec, now, start) for group in groups]
+
+
+def _merge_counts(pairs: List[tuple]) -> Dict[int, int]:
+    keys = np.concatenate([keys for keys, _ in pairs])
+    counts = np.concatenate([counts for _, counts in pairs])
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return dict(zip(unique.tolist(), np.bincount(inverse, weights=counts).astype(np.int64).tolist()))
+
+
+def _merge_masks(triples: List[tuple]) -> Dict[int, int]:
+    """{маска: кількість} у порядку першої появи маски"""
+    counts, first = {}, {}
+    for masks, mask_counts, positions in triples:
+        for mask, count, position in zip(masks.tolist(), mask_counts.tolist(), positions.tolist()):
+            counts[mask] = counts.get(mask, 0) + count
+            first[mask] = min(first.get(mask, position), position)
+    return {mask: counts[mask] for mask in sorted(counts, key=first.get)}
+
+
+def merge(partials: List[dict]) -> dict:
+    """Складає часткові агрегати шардів"""
+    return {
+        "rows": sum(p["rows"] for p in partials),
+        "platform_sentiment": sum(p["platform_sentiment"] for p in partials),
+        "severity": sum(p["severity"] for p in partials),
+        "rating_sum": sum(p["rating_sum"] for p in partials),
+        "rating_count": sum(p["rating_count"] for p in partials),
+        "timeline": _merge_counts([p["timeline"] for p in partials]),
+        "masks": _merge_masks([p["masks"] for p in partials]),
+        "trend": [sum(values) for values in zip(*(p["trend"] for p in partials))],
+    }
+
+
+# ==================== ПУЛ ====================
+
+class ShardedAnalytics:
+    """Пул процесів і колонки поточної версії даних"""
+
+    def __init__(self, workers: int = None):
+        self.workers = workers or settings.ANALYTICS_WORKERS or os.cpu_count() or 1
+        self._pool = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._current: Optional[ColumnarComments] = None
+        # (версія, ліміт, поріг), для яких корпус виявився меншим за поріг (без повторного count)
+        self._small_version = None
+        # db, на записи якого підписані; metadata коментарів, доданих після побудови _current
+        self._listening = None
+        self._appended: List[dict] = []
+        # Видалення коментарів: дописати не можна, лише повна перебудова
+        self._rebuild = True
+        atexit.register(self.close)
+
+    @property
+    def enabled(self) -> bool:
+        return settings.ANALYTICS_PARALLEL_MIN_ROWS > 0
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"))
+            return self._pool
+
+    @contextmanager
+    def lease(self, db) -> Iterator[Optional[ColumnarComments]]:
+        """Колонки поточної версії даних або None (корпус менший за поріг - звичайний прохід)"""
+        columns = self._acquire(db) if self.enabled else None
+        try:
+            yield columns
+        finally:
+            if columns is not None:
+                with self._lock:
+                    columns.users -= 1
+                    if columns.retired and not columns.users:
+                        columns.close()
+
+    def on_change(self, op: str, payload: dict):
+        """Слухач записів: нові коментарі чекають дописування до колонок"""
+        comments = payload.get("collection") == settings.COMMENTS_COLLECTION
+        with self._lock:
+            if op == "delete_brand" or (op == "delete" and comments):
+                self._rebuild = True
+            elif op == "add" and comments and self._current is not None and not self._rebuild:
+                self._appended.extend(payload["metadatas"])
+                # Аналітику давно не читали - дешевше перебудувати, ніж тримати хвіст
+                if len(self._appended) > max(self._current.rows, settings.ANALYTICS_PARALLEL_MIN_ROWS):
+                    self._rebuild = True
+            if self._rebuild:
+                self._appended = []
+
+    def _acquire(self, db) -> Optional[ColumnarComments]:
+        with self._lock:
+            if self._listening is not db:
+                # Підписка до першої побудови: жоден запис після неї не пропаде
+                db.add_change_listener(self.on_change)
+                self._listening = db
+                self._rebuild = True
+        # Версію беремо до читання: якщо дані змінились під час побудови, наступний виклик перебудує
+        version = db.data_version
+        limit = settings.ANALYTICS_SCAN_LIMIT or None
+        small_key = (version, limit, settings.ANALYTICS_PARALLEL_MIN_ROWS)
+        with self._lock:
+            if self._current is not None and self._current.version == version:
+                self._current.users += 1
+                return self._current
+            if self._small_version == small_key:
+                return None
+
+        # Ліміт читання нижче порога (за замовчуванням) - count не потрібен
+        rows = limit if limit and limit < settings.ANALYTICS_PARALLEL_MIN_ROWS else db.comments_collection.count()
+        if limit:
+            rows = min(rows, limit)
+        if rows < settings.ANALYTICS_PARALLEL_MIN_ROWS:
+            self._small_version = small_key
+            return None
+
+        with self._build_lock:
+            with self._lock:
+                if self._current is not None and self._current.version == version:
+                    self._current.users += 1
+                    return self._current
+                base = None if self._rebuild else self._current
+                appended, self._appended = self._appended, []
+                self._rebuild = False
+                if base is not None:
+                    base.users += 1
+            started = time.perf_counter()
+            columns = None
+            if base is not None:
+                try:
+                    columns = self._extend(db, base, appended, version, limit)
+                finally:
+                    with self._lock:
+                        base.users -= 1
+                        if base.retired and not base.users:
+                            base.close()
+            if columns is not None:
+                ANALYTICS_SHARD_DURATION.labels(stage="append").observe(time.perf_counter() - started)
+            else:
+                # Лише metadata: документи для агрегатів не потрібні
+                comments = db.comments_collection.get(limit=limit, include=["metadatas"])
+                columns = ColumnarComments(comments["metadatas"], version, db.categories.metadata_mask)
+                del comments
+                ANALYTICS_SHARD_DURATION.labels(stage="build").observe(time.perf_counter() - started)
+                logger.info(f"Analytics columns built: {columns.rows} rows in {time.perf_counter() - started:.2f}s")
+
+            with self._lock:
+                previous, self._current = self._current, columns
+                columns.users += 1
+                if previous is not None:
+                    previous.retired = True
+                    if not previous.users:
+                        previous.close()
+            return columns
+
+    def _extend(self, db, base: ColumnarComments, appended: List[dict], version: int, limit: Optional[int]):
+        """Колонки base + нові рядки або None, якщо потрібна повна перебудова"""
+        rows = base.rows + len(appended)
+        if limit and rows > limit:
+            return None
+        # Запис, якого слухач не бачив (або бачив двічі) - count розійдеться з колонками
+        if rows != db.comments_collection.count():
+            return None
+        return ColumnarComments(appended, version, db.categories.metadata_mask, previous=base)
+
+    def close(self):
+        """Зупиняє пул і звільняє shared memory (при виході процесу)"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            current, self._current = self._current, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        if current is not None:
+            current.close()
+
+    def aggregate(self, columns: ColumnarComments, groups: List[dict]) -> List[dict]:
+        """Агрегати для кожної групи: шарди рахуються паралельно в пулі"""
+        started = time.perf_counter()
+        now = time.time()
+        if self.workers == 1:
+            # Одне ядро: пул лише додав би пересилання - рахуємо колонки в цьому процесі
+            arrays = columns.arrays()
+            partials = [[_aggregate(arrays, group, columns.spec, now) for group in groups]]
+            del arrays
+        else:
+            bounds = np.linspace(0, columns.rows, self.workers + 1).astype(int).tolist()
+            futures = [
+                self.pool.submit(aggregate_shard, columns.spec, start, stop, groups, now)
+                for start, stop in zip(bounds, bounds[1:]) if stop > start
+            ]
+            partials = [future.result() for future in futures]
+        ANALYTICS_SHARD_DURATION.labels(stage="aggregate").observe(time.perf_counter() - started)
+        return [merge([partial[i] for partial in partials]) for i in range(len(groups))]
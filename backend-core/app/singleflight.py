@@ -0,0 +1,101 @@
+"""
+Single-flight: однакові одночасні обчислення виконуються один раз
+
+Перший виклик з ключем рахує, решта чекають його результат (або виняток).
+Успішний результат ще memo_seconds віддається з пам'яті, тож хвиля
+однакових запитів (дашборд відкрили всі одночасно) схлопується в одне
+обчислення. Ключ має містити версію даних - після запису memo не діє.
+Виклики мають перетинатися в різних потоках: handler-и, що сюди звертаються,
+мають бути def (FastAPI виконує їх у пулі потоків), а не async def.
+"""
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable
+
+from app.metrics import record_cache_lookup
+
+
+def normalize_key(params: dict) -> str:
+    """Стабільний ключ з параметрів: порожні значення відкидаються, списки сортуються (фільтри - множини)"""
+    def normalize(value):
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items() if v not in (None, "", [], {})}
+        if isinstance(value, (list, tuple, set)):
+            return sorted((normalize(v) for v in value), key=str)
+        return value
+
+    return json.dumps(
+        normalize(params),
+        sort_keys=True,
+        default=str,
+        ensure_ascii=False
+    )
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Схлопування однакових обчислень між потоками одного процесу"""
+
+    def __init__(self, memo_seconds: float = 0.0, max_entries: int = 256):
+        self.memo_seconds = memo_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, _Call] = {}
+        self._memo: Dict[Hashable, tuple] = {}
+
+    def _prune(self, now: float):
+        expired = [key for key, (expires_at, _) in self._memo.items() if expires_at <= now]
+        for key in expired:
+            del self._memo[key]
+        # Захист від росту при великій кількості різних фільтрів
+        while len(self._memo) >= self.max_entries:
+            self._memo.pop(next(iter(self._memo)))
+
+    def do(self, key: Hashable, fn: Callable[[], Any], cache: str = "singleflight") -> Any:
+        """Результат fn() для ключа: з memo, з чужого обчислення або власного"""
+        with self._lock:
+            now = time.monotonic()
+            memo = self._memo.get(key)
+            if memo is not None and memo[0] > now:
+                record_cache_lookup(cache, hit=True)
+                return memo[1]
+
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._in_flight[key] = call
+
+        if not leader:
+            record_cache_lookup(cache, hit=True)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        record_cache_lookup(cache, hit=False)
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if call.error is None and self.memo_seconds > 0:
+                    now = time.monotonic()
+                    self._prune(now)
+                    self._memo[key] = (now + self.memo_seconds, call.result)
+            call.done.set()
+        return call.result
+
+    def clear(self):
+        with self._lock:
+            self._memo.clear()
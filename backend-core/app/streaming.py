@@ -0,0 +1,33 @@
+"""
+Server-sent events для стрімінгових відповідей
+"""
+import json
+from typing import Dict, Iterable, Iterator
+
+# Без буферизації на проксі (nginx) і без кешування
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
+
+# Коментар SSE: тримає з'єднання відкритим через проксі, клієнт його ігнорує
+SSE_HEARTBEAT = ": ping\n\n"
+
+
+def is_event_stream(message: dict) -> bool:
+    """ASGI http.response.start зі стрімом SSE (з'єднання живе хвилини - не латентність запиту)"""
+    for name, value in message.get("headers", []):
+        if name.lower() == b"content-type":
+            return value.split(b";")[0].strip() == b"text/event-stream"
+    return False
+
+
+def sse_event(event: str, data) -> str:
+    """Одна подія у форматі text/event-stream"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_stream(events: Iterable[Dict]) -> Iterator[str]:
+    """Події {"event", "data"} -> рядки SSE"""
+    for event in events:
+        yield sse_event(event["event"], event["data"])
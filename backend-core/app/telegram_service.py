@@ -1,6 +1,8 @@
 import requests
 from app.config import settings
 import logging
+import queue
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -10,6 +12,42 @@ class TelegramService:
         self.bot_token = settings.TELEGRAM_BOT_TOKEN
         self.chat_id = settings.TELEGRAM_CHAT_ID
         self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
+        
+        # Черга алертів: відправка у фоновому потоці, щоб не блокувати ingest
+        self._alert_queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+    
+    def enqueue_alert(self, alert_data: dict):
+        """Поставити алерт у чергу на фонову відправку"""
+        self._ensure_worker()
+        self._alert_queue.put(alert_data)
+    
+    def queue_depth(self) -> int:
+        """Кількість алертів, що очікують відправки"""
+        return self._alert_queue.qsize()
+    
+    def _ensure_worker(self):
+        """Запускає фоновий потік відправки (один на процес)"""
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._drain_alerts,
+                    name="telegram-alerts",
+                    daemon=True
+                )
+                self._worker.start()
+    
+    def _drain_alerts(self):
+        """Відправляє алерти з черги по одному"""
+        while True:
+            alert_data = self._alert_queue.get()
+            try:
+                self.send_alert(alert_data)
+            except Exception as e:
+                logger.error(f"Failed to send queued alert: {str(e)}")
+            finally:
+                self._alert_queue.task_done()
     
     def send_message(self, text: str, parse_mode: str = "Markdown") -> bool:
         """Відправити повідомлення в Telegram"""
@@ -70,6 +108,3 @@ class TelegramService:
         
         return self.send_message(message)
 
-
-# Singleton
-telegram_service = TelegramService()
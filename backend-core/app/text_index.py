@@ -0,0 +1,221 @@
+"""
+Інвертований індекс BM25 по тексту коментарів
+
+Ключові запити (коди помилок, артикули, "refund") шукаються без embedding,
+змішані - BM25 + вектор через reciprocal rank fusion. Той самий індекс дає
+предикат `text` для /api/reviews/filter.
+
+Токенізація розрахована на українську, російську та англійську: нижній
+регістр, ё -> е, апострофи всередині слова прибираються, легкий стемінг
+закінчень (ідентифікатори з цифрами не стемляться).
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+# Слово або ідентифікатор з дефісами/крапками: "zr-1234", "e.503", "v2.1"
+TOKEN_RE = re.compile(r"\w+(?:[-.]\w+)*")
+# Роздільник частин ідентифікатора: "zr-1234" шукається і за "zr", і за "1234"
+PART_SEPARATOR_RE = re.compile(r"[-.]")
+APOSTROPHES_RE = re.compile(r"['’ʼ`]")
+
+# Закінчення від довших до коротших; відрізаємо лише якщо лишається >= 3 літер
+CYRILLIC_SUFFIXES = sorted([
+    # українська
+    "ами", "ями", "ові", "еві", "ого", "ому", "ими", "іми", "ах", "ях", "ів", "ій", "ий",
+    "ою", "ею", "ам", "ям", "ом", "ем", "ні", "ти", "ть", "ла", "ло", "ли", "ує", "ють", "ать",
+    # російська
+    "ого", "его", "ому", "ему", "ыми", "ими", "ая", "яя", "ое", "ее", "ые", "ие", "ых", "их",
+    "ой", "ей", "ом", "ов", "ев", "ам", "ям", "ах", "ях", "ет", "ит", "ут", "ют", "ть",
+    # однолітерні
+    "а", "я", "о", "е", "и", "і", "ї", "у", "ю", "ь", "ы", "й",
+], key=len, reverse=True)
+ENGLISH_SUFFIXES = ("ing", "ed", "es", "s")
+
+# BM25 параметри (стандартні значення Robertson/Sparck Jones)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Скільки термів словника підставляти замість токена, якого немає в індексі
+MAX_EXPANSIONS = 50
+
+# Константа RRF (Cormack et al.)
+RRF_K = 60
+
+
+def _stem(token: str) -> str:
+    if any(ch.isdigit() for ch in token) or len(token) <= 3:
+        return token
+
+    if "а" <= token[0] <= "я" or token[0] in "іїєґё":
+        for suffix in CYRILLIC_SUFFIXES:
+            if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+                return token[:-len(suffix)]
+        return token
+
+    for suffix in ENGLISH_SUFFIXES:
+        if token.endswith(suffix) and not token.endswith("ss") and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Токени для індексу і запиту (однакова нормалізація з обох боків)"""
+    text = APOSTROPHES_RE.sub("", (text or "").lower().replace("ё", "е"))
+    return [_stem(token) for token in TOKEN_RE.findall(text)]
+
+
+def is_keyword_query(query: str) -> bool:
+    """Запит, який має сенс шукати тільки по термах (без embedding)
+
+    Фраза в лапках, один терм або лише ідентифікатори з цифрами (коди помилок, SKU).
+    """
+    stripped = query.strip()
+    if len(stripped) > 1 and stripped[0] == stripped[-1] == '"':
+        return True
+
+    raw_tokens = TOKEN_RE.findall(stripped.lower())
+    if len(raw_tokens) <= 1:
+        return True
+    return all(any(ch.isdigit() for ch in token) for token in raw_tokens)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Злиття ранжувань: score = sum(1 / (k + rank))"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """Інвертований індекс у пам'яті: term -> {doc_id: tf}"""
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_terms: Dict[str, List[str]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+        # Відсортовані "ключ\0терм": ключ - терм або частина ідентифікатора
+        # після роздільника; префіксний пошук - bisect замість скану словника.
+        # Нові терми доливаються при наступному пошуку (одне сортування на пакет),
+        # видалені відсіюються при пошуку і прибираються, коли їх стає багато
+        self._prefixes: List[str] = []
+        self._new_prefixes: List[str] = []
+        self._removed_terms = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def add(self, ids: List[str], texts: List[str]):
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                if doc_id in self._doc_lengths:
+                    self._remove_one(doc_id)
+
+                tokens = tokenize(text)
+                counts = Counter(tokens)
+                for term, tf in counts.items():
+                    if term not in self._postings:
+                        self._new_prefixes.extend(self._prefix_entries(term))
+                    self._postings[term][doc_id] = tf
+                self._doc_terms[doc_id] = list(counts)
+                self._doc_lengths[doc_id] = len(tokens)
+                self._total_length += len(tokens)
+
+    def _remove_one(self, doc_id: str):
+        for term in self._doc_terms.pop(doc_id, []):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+                    self._removed_terms += 1
+        self._total_length -= self._doc_lengths.pop(doc_id, 0)
+
+    def remove(self, ids: List[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._remove_one(doc_id)
+
+    @staticmethod
+    def _prefix_entries(term: str) -> List[str]:
+        keys = [term] + [term[match.end():] for match in PART_SEPARATOR_RE.finditer(term)]
+        return [f"{key}\0{term}" for key in keys if key]
+
+    def _sorted_prefixes(self) -> List[str]:
+        if self._removed_terms > len(self._postings):
+            # Видалених термів більше, ніж живих - перебудовуємо з словника
+            self._prefixes = sorted(entry for term in self._postings for entry in self._prefix_entries(term))
+            self._new_prefixes, self._removed_terms = [], 0
+        elif self._new_prefixes:
+            # Два відсортовані прогони - timsort зливає їх за лінійний час
+            self._prefixes.extend(sorted(self._new_prefixes))
+            self._prefixes.sort()
+            self._new_prefixes = []
+        return self._prefixes
+
+    def _expand(self, token: str) -> List[str]:
+        """Терми, що починаються з токена запиту (або їхня частина після "-"/"."); точний збіг - лише він"""
+        if token in self._postings:
+            return [token]
+        prefixes = self._sorted_prefixes()
+        terms = {}
+        position = bisect.bisect_left(prefixes, token)
+        while position < len(prefixes) and prefixes[position].startswith(token):
+            term = prefixes[position].split("\0", 1)[1]
+            if term in self._postings:
+                terms[term] = None
+            position += 1
+        return list(terms)
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """Top-N документів за BM25"""
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count:
+                return []
+            avg_length = self._total_length / doc_count
+
+            terms = set()
+            for token in set(tokenize(query)):
+                # Частина коду/артикула ("zr", "1234") - через терми з таким префіксом
+                terms.update(self._expand(token)[:MAX_EXPANSIONS])
+
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self._postings[term]
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def match(self, text: str) -> Optional[Set[str]]:
+        """ID документів, що містять усі терми (кожен - як префікс терму документа чи його частини)
+
+        None - якщо в тексті немає жодного токена (предикат не застосовується).
+        """
+        tokens = set(tokenize(text))
+        if not tokens:
+            return None
+
+        with self._lock:
+            matched = None
+            # Починаємо з найрідкісніших термів - перетин швидко стає малим
+            for token in sorted(tokens, key=lambda t: len(self._postings.get(t, ()))):
+                docs = set()
+                for term in self._expand(token):
+                    docs.update(self._postings[term])
+                matched = docs if matched is None else matched & docs
+                if not matched:
+                    return set()
+        return matched
@@ -0,0 +1,124 @@
+"""
+Підрахунок токенів і нарізка тексту на token-bounded чанки
+
+Рахуємо токени локально через tiktoken (кодування моделі gpt-4o-mini).
+Якщо tiktoken або файл кодування недоступні (офлайн), використовуємо
+консервативну оцінку ~3 символи на токен - для кирилиці вона ближча до
+реальності, ніж класичні 4.
+"""
+import logging
+import math
+import re
+import threading
+from typing import List
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Межі речень: після .!? або переносу рядка
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+                except Exception as e:
+                    logger.warning(f"tiktoken unavailable, using approximate token counts: {str(e)}")
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Кількість токенів у тексті"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 3)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Обрізає текст до max_tokens по словах (з трикрапкою)"""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    words = text.split()
+    low, high = 0, len(words)
+    # Бінарний пошук найдовшого префікса, що влазить разом з "..."
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle]) + "...") <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]) + "..." if low else ""
+
+
+def _split_long(sentence: str, max_tokens: int) -> List[str]:
+    """Речення, довше за чанк, ріжемо по словах"""
+    pieces = []
+    current = []
+    for word in sentence.split():
+        if current and count_tokens(" ".join(current + [word])) > max_tokens:
+            pieces.append(" ".join(current))
+            current = []
+        current.append(word)
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int = None, overlap_tokens: int = None) -> List[str]:
+    """Ділить текст на чанки до max_tokens з перекриттям по реченнях
+
+    Речення не розриваються (крім довших за чанк), кінець попереднього
+    чанка (до overlap_tokens) повторюється на початку наступного, щоб
+    факт на межі чанків не губився при пошуку.
+    """
+    max_tokens = max_tokens or settings.KB_CHUNK_TOKENS
+    overlap_tokens = settings.KB_CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+
+    sentences = []
+    for sentence in SENTENCE_SPLIT_RE.split(text or ""):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if count_tokens(sentence) > max_tokens:
+            sentences.extend(_split_long(sentence, max_tokens))
+        else:
+            sentences.append(sentence)
+
+    chunks = []
+    current = []
+    for sentence in sentences:
+        # Рахуємо склеєний текст: токени на межах речень не сумуються точно
+        if current and count_tokens(" ".join(current + [sentence])) > max_tokens:
+            chunks.append(" ".join(current))
+
+            # Перекриття: хвіст попереднього чанка, що влазить в overlap_tokens
+            overlap = []
+            for previous in reversed(current):
+                candidate = [previous] + overlap
+                if count_tokens(" ".join(candidate)) > overlap_tokens or \
+                        count_tokens(" ".join(candidate + [sentence])) > max_tokens:
+                    break
+                overlap = candidate
+            current = overlap
+
+        current.append(sentence)
+
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
@@ -0,0 +1,298 @@
+"""
+Квантизований векторний індекс (int8) у memory-mapped файлах
+
+Альтернатива HNSW індексу ChromaDB для пошуку у великих колекціях. HNSW
+тримає в пам'яті float32 вектори і граф; скан цього індексу потребує в
+пам'яті (page cache) лише int8 коди. Економія RAM є тільки в процесах, що
+лише читають (API воркери в INGEST_MODE=queue): ChromaDB і далі веде HNSW
+для запису, тож writer і процес у direct режимі завантажують його при
+першому add, а vectors.f32 - друга float32 копія векторів на диску (у
+пам'ять читаються лише рядки кандидатів). Пошук у два проходи:
+1. наближений: повний скан int8 кодів частинами (відстань через int8 x float32);
+2. точний: top кандидатів переранжовуються за float32 векторами з диска
+   (читаються лише рядки кандидатів).
+
+Файли індексу колекції (append-only, крім прапорців alive):
+- codes.i8 - int8 коди (count x dim), scales.f32 - масштаб рядка;
+- norms.f32 - квадрат норми точного вектора;
+- vectors.f32 - точні вектори для переранжування;
+- alive.u8 - 0 для видалених рядків; ids.txt - ID по рядку;
+- meta.json - dim і count (пишеться останнім, тому читач бачить лише
+  повністю записані рядки).
+
+Відстань - квадрат L2, як у колекцій ChromaDB за замовчуванням.
+Пише один процес (direct режим або ingest writer), читачі підхоплюють
+нові рядки через refresh().
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.profiling import stage
+
+FILES = {
+    "codes": ("codes.i8", np.int8),
+    "scales": ("scales.f32", np.float32),
+    "norms": ("norms.f32", np.float32),
+    "vectors": ("vectors.f32", np.float32),
+    "alive": ("alive.u8", np.uint8),
+}
+
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Симетрична int8 квантизація по рядках: v ~ codes * scale"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class QuantizedVectorIndex:
+    """int8 індекс однієї колекції в директорії path"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._reset_state()
+        self.refresh()
+
+    @property
+    def exists(self) -> bool:
+        return (self.path / "meta.json").exists()
+
+    def __len__(self) -> int:
+        """Кількість живих (не видалених) рядків"""
+        with self._lock:
+            if not self.count:
+                return 0
+            return int(np.count_nonzero(self._maps["alive"]))
+
+    def _read_meta(self) -> dict:
+        with open(self.path / "meta.json", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self):
+        tmp = self.path / "meta.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "count": self.count, "metric": "l2"}, f)
+        os.replace(tmp, self.path / "meta.json")
+
+    def _map(self):
+        self._maps = {}
+        if not self.count:
+            return
+        for name, (filename, dtype) in FILES.items():
+            shape = (self.count, self.dim) if name in ("codes", "vectors") else (self.count,)
+            # alive writer змінює на місці - читач бачить це через спільні сторінки
+            self._maps[name] = np.memmap(self.path / filename, dtype=dtype, mode="r", shape=shape)
+
+    def _reset_state(self):
+        self.dim = None
+        self.count = 0
+        self._ids = []
+        self._ids_offset = 0
+        self._rows = None
+        self._maps = {}
+
+    def refresh(self) -> bool:
+        """Підхопити рядки, дописані writer-ом (True - якщо щось змінилось)"""
+        with self._lock:
+            if not self.exists:
+                return False
+            meta = self._read_meta()
+            if meta["count"] == self.count and self._maps:
+                return False
+            if meta["count"] < self.count:
+                # Індекс перебудували - читаємо з нуля
+                self._reset_state()
+
+            self.dim = meta["dim"]
+            # ids.txt дописується до meta.json - читаємо рівно count рядків
+            with open(self.path / "ids.txt", "rb") as f:
+                f.seek(self._ids_offset)
+                while len(self._ids) < meta["count"]:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    self._ids.append(line[:-1].decode("utf-8"))
+                self._ids_offset = f.tell()
+
+            if self._rows is not None:
+                for row in range(self.count, len(self._ids)):
+                    self._rows[self._ids[row]] = row
+            self.count = len(self._ids)
+            self._map()
+            return True
+
+    def add(self, ids: List[str], embeddings) -> None:
+        """Дописати вектори (лише процес-writer)"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if not len(ids):
+            return
+        with self._lock:
+            self.refresh()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self.path.mkdir(parents=True, exist_ok=True)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Розмірність {vectors.shape[1]} не збігається з індексом ({self.dim})")
+
+            codes, scales = quantize(vectors)
+            columns = {
+                "codes": codes,
+                "scales": scales,
+                "norms": np.einsum("ij,ij->i", vectors, vectors).astype(np.float32),
+                "vectors": vectors,
+                "alive": np.ones(len(ids), dtype=np.uint8),
+            }
+            for name, (filename, dtype) in FILES.items():
+                with open(self.path / filename, "ab") as f:
+                    f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+            with open(self.path / "ids.txt", "ab") as f:
+                f.write("".join(f"{doc_id}\n" for doc_id in ids).encode("utf-8"))
+
+            if self._rows is not None:
+                for offset, doc_id in enumerate(ids):
+                    self._rows[doc_id] = self.count + offset
+            self._ids.extend(ids)
+            self._ids_offset = (self.path / "ids.txt").stat().st_size
+            self.count += len(ids)
+            self._write_meta()
+            self._map()
+
+    def clear(self):
+        """Видалити файли індексу (перед перебудовою)"""
+        with self._lock:
+            for filename in [f for f, _ in FILES.values()] + ["ids.txt", "meta.json"]:
+                (self.path / filename).unlink(missing_ok=True)
+            self._reset_state()
+
+    def _row_map(self) -> Dict[str, int]:
+        """Мапа id -> рядок (будується при першому видаленні чи фільтрованому пошуку)"""
+        if self._rows is None:
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        return self._rows
+
+    def rows_of(self, ids: Iterable[str]) -> np.ndarray:
+        """Відсортовані номери рядків для ID (невідомі ID пропускаються)"""
+        with self._lock:
+            row_of = self._row_map()
+            rows = [row_of[doc_id] for doc_id in ids if doc_id in row_of]
+        return np.unique(np.asarray(rows, dtype=np.int64))
+
+    def delete(self, ids: List[str]) -> int:
+        """Позначити рядки видаленими (лише процес-writer)"""
+        with self._lock:
+            self.refresh()
+            if not self.count:
+                return 0
+            row_of = self._row_map()
+            rows = [row_of.pop(doc_id) for doc_id in ids if doc_id in row_of]
+            if rows:
+                alive = np.memmap(self.path / FILES["alive"][0], dtype=np.uint8, mode="r+", shape=(self.count,))
+                alive[rows] = 0
+                alive.flush()
+            return len(rows)
+
+    def search(self, query_embeddings, n_results: int, rerank: int = None,
+               rows: np.ndarray = None) -> Tuple[List[List[str]], List[List[float]]]:
+        """Найближчі рядки для кожного запиту: (ids, квадрати L2 відстаней)
+
+        rows - відсортовані рядки, серед яких шукати (фільтр where, див. rows_of);
+        None - усі рядки.
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        rerank = max(rerank or n_results * settings.VECTOR_INDEX_RERANK_FACTOR, n_results)
+
+        with self._lock:
+            maps = self._maps
+            count = self.count
+            ids = self._ids
+        if rows is not None:
+            rows = rows[rows < count]
+        total = count if rows is None else len(rows)
+        if not total:
+            return [[] for _ in queries], [[] for _ in queries]
+
+        codes, scales, norms, alive = maps["codes"], maps["scales"], maps["norms"], maps["alive"]
+        rerank = min(rerank, total)
+        chunk = settings.VECTOR_INDEX_SCAN_CHUNK
+
+        # 1. Наближений прохід: ||v||^2 - 2 * scale * (codes . q) (||q||^2 однаковий для рядка)
+        with stage("vector_index_scan"):
+            candidates = [np.empty(0, dtype=np.int64) for _ in queries]
+            candidate_scores = [np.empty(0, dtype=np.float32) for _ in queries]
+            for start in range(0, total, chunk):
+                end = min(start + chunk, total)
+                if rows is None:
+                    # Суцільний зріз - послідовне читання memmap
+                    block, block_rows = slice(start, end), np.arange(start, end)
+                else:
+                    block = block_rows = rows[start:end]
+                dots = codes[block].astype(np.float32) @ queries.T
+                approx = norms[block, None] - 2.0 * scales[block, None] * dots
+                approx[alive[block] == 0] = np.inf
+                for q in range(len(queries)):
+                    merged_rows = np.concatenate([candidates[q], block_rows])
+                    merged_scores = np.concatenate([candidate_scores[q], approx[:, q]])
+                    if len(merged_scores) > rerank:
+                        keep = np.argpartition(merged_scores, rerank - 1)[:rerank]
+                        merged_rows, merged_scores = merged_rows[keep], merged_scores[keep]
+                    candidates[q], candidate_scores[q] = merged_rows, merged_scores
+
+        # 2. Точне переранжування кандидатів за float32 векторами
+        all_ids, all_distances = [], []
+        with stage("vector_index_rerank"):
+            vectors = maps["vectors"]
+            for q, query in enumerate(queries):
+                top_rows = np.sort(candidates[q][np.isfinite(candidate_scores[q])])
+                if not len(top_rows):
+                    all_ids.append([])
+                    all_distances.append([])
+                    continue
+                exact = vectors[top_rows]
+                distances = np.einsum("ij,ij->i", exact, exact) - 2.0 * (exact @ query) + float(query @ query)
+                found, found_distances, seen = [], [], set()
+                for i in np.argsort(distances):
+                    # Повторно доданий ID (ChromaDB його пропустила) - лише один раз
+                    if ids[top_rows[i]] in seen:
+                        continue
+                    seen.add(ids[top_rows[i]])
+                    found.append(ids[top_rows[i]])
+                    found_distances.append(float(max(distances[i], 0.0)))
+                    if len(found) == n_results:
+                        break
+                all_ids.append(found)
+                all_distances.append(found_distances)
+        return all_ids, all_distances
+
+    def memory_footprint(self) -> Dict[str, int]:
+        """Байти, що мають бути в пам'яті для скану, проти float32 векторів"""
+        if not self.count:
+            return {"scan_bytes": 0, "float32_bytes": 0}
+        return {
+            "scan_bytes": self.count * (self.dim + 4 + 4 + 1),
+            "float32_bytes": self.count * self.dim * 4
+        }
+
+    def warm_up(self):
+        """Прочитати int8 коди, щоб перший пошук не чекав диск"""
+        with self._lock:
+            codes = self._maps.get("codes")
+        if codes is not None:
+            for start in range(0, len(codes), settings.VECTOR_INDEX_SCAN_CHUNK):
+                codes[start:start + settings.VECTOR_INDEX_SCAN_CHUNK].sum()
+
+
+def build_vector_indexes() -> Dict[str, QuantizedVectorIndex]:
+    """Індекси колекцій з VECTOR_INDEX_COLLECTIONS (collection name -> index)"""
+    root = settings.VECTOR_INDEX_DIR or os.path.join(settings.CHROMA_PERSIST_DIR, "vector_index")
+    return {
+        name: QuantizedVectorIndex(os.path.join(root, name))
+        for name in settings.VECTOR_INDEX_COLLECTIONS
+    }
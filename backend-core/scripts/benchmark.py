@@ -0,0 +1,353 @@
+"""
+Бенчмарк backend-core на синтетичних корпусах (10k / 100k / 1M коментарів)
+Запустити:
+    python scripts/benchmark.py
+    python scripts/benchmark.py --sizes 10000 100000 --repeat 5
+    python scripts/benchmark.py --compare bench_results/old.json bench_results/new.json
+
+Кожен розмір прогоняється в окремому процесі з власною тимчасовою ChromaDB,
+EMBEDDING_BACKEND=hash (без моделі та мережі) і вимкненим OpenAI
+(сервіси повертають fallback-відповіді). Корпус детермінований для
+заданого --seed; час відраховується від моменту запуску, щоб вікна
+алертів і трендів (останні N днів) мали дані.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from scripts.generate_corpus import BRANDS, PHRASES, as_input_row, generate_corpus
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_OUTPUT_DIR = BACKEND_DIR / "bench_results"
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def summarize(samples: list) -> dict:
+    """min / median / p95 / mean у мілісекундах"""
+    ordered = sorted(samples)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        "runs": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 2),
+        "median_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(ordered[p95_index] * 1000, 2),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 2),
+    }
+
+
+def measure(fn, repeat: int) -> dict:
+    """Запускає fn repeat разів (плюс один прогрів) і повертає статистику"""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def concurrently(fn, workers: int):
+    """Обгортка: workers одночасних викликів fn (дашборд, відкритий усією командою)
+
+    fn має йти через HTTP (serve): лише так запити перетинаються так само,
+    як на сервері - через один event loop і пул потоків FastAPI.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def run():
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(fn) for _ in range(workers)]:
+                future.result()
+    return run
+
+
+@contextmanager
+def background_ingest(client, rows: list, batch: int = 200):
+    """Потік шле rows пакетами в /api/comments/batch, поки триває блок
+
+    Повертає лічильник {"rows": N} доданих рядків.
+    """
+    import threading
+
+    sent = {"rows": 0}
+    stop = threading.Event()
+
+    def run():
+        while not stop.is_set():
+            for start in range(0, len(rows), batch):
+                if stop.is_set():
+                    return
+                response = client.post("/api/comments/batch", json=rows[start:start + batch])
+                response.raise_for_status()
+                sent["rows"] += len(rows[start:start + batch])
+
+    thread = threading.Thread(target=run, name="benchmark-ingest", daemon=True)
+    thread.start()
+    try:
+        yield sent
+    finally:
+        stop.set()
+        thread.join()
+
+
+def measure_during_ingest(fn, client, rows: list, repeat: int) -> dict:
+    """Як measure, але паралельно йде ingest rows, і кожен виклик fn стартує
+    після нового пакета - бачить нову версію даних, як дашборд під live ingest"""
+    samples = []
+    with background_ingest(client, rows) as sent:
+        for _ in range(repeat + 1):
+            seen = sent["rows"]
+            while sent["rows"] == seen:
+                time.sleep(0.005)
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+    result = summarize(samples[1:])
+    result["ingested_rows"] = sent["rows"]
+    return result
+
+
+def disable_llm(openai_service):
+    """Замінює OpenAI клієнт заглушкою: виклики одразу падають у fallback"""
+    from types import SimpleNamespace
+
+    class OfflineCompletions:
+        def create(self, **kwargs):
+            raise RuntimeError("LLM вимкнено в бенчмарку")
+
+    openai_service.client = SimpleNamespace(chat=SimpleNamespace(completions=OfflineCompletions()))
+
+
+def serve(app):
+    """uvicorn у потоці цього процесу: (server, thread, base_url), коли готовий приймати запити"""
+    import socket
+    import threading
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="benchmark-server", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn не стартував")
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def run_size(size: int, seed: int, repeat: int) -> dict:
+    """Бенчмарк одного розміру корпусу (виконується в дочірньому процесі)"""
+    import httpx
+    from app.main import app
+    from app.config import settings
+    from app.dependencies import get_db_manager, get_openai_service
+
+    db_manager = get_db_manager()
+    disable_llm(get_openai_service())
+    now = datetime.now()
+
+    # 1. Ingest через пакетний шлях
+    print(f"📥 [{size}] Ingest...")
+    started = time.perf_counter()
+    for batch in generate_corpus(size, seed, now):
+        db_manager.add_comments(batch)
+    ingest_seconds = time.perf_counter() - started
+
+    # Запити йдуть через справжній сервер: TestClient дає кожному виклику
+    # власний event loop і показує паралелізм, якого немає в продакшені
+    server, thread, base_url = serve(app)
+    client = httpx.Client(base_url=base_url, timeout=600)
+    while client.get("/health/ready").status_code != 200:
+        time.sleep(0.1)
+    top_brand = BRANDS[0]
+    week_ago = (now - timedelta(days=7)).isoformat()
+
+    def call(method: str, url: str, **kwargs):
+        def run():
+            response = client.request(method, url, **kwargs)
+            if response.status_code != 200:
+                raise RuntimeError(f"{method} {url} -> {response.status_code}: {response.text[:200]}")
+        return run
+
+    scenarios = {
+        "statistics_all": call("GET", "/api/statistics"),
+        "statistics_brand": call("POST", "/api/statistics", json={"brand_name": top_brand}),
+        "filter_all": call("POST", "/api/reviews/filter", json={"limit": 100}),
+        "filter_brand": call("POST", "/api/reviews/filter", json={"brand_name": top_brand}),
+        "filter_brand_negative_critical": call("POST", "/api/reviews/filter", json={
+            "brand_name": top_brand, "sentiment": ["negative"], "severity": ["critical"],
+            "sort_by": "severity"
+        }),
+        "filter_last_7_days": call("POST", "/api/reviews/filter", json={"date_from": week_ago}),
+        "filter_rare_category": call("POST", "/api/reviews/filter", json={
+            "brand_name": BRANDS[-1], "categories": ["акції"], "rating_max": 2
+        }),
+        "reputation_score": call("GET", "/api/reputation-score"),
+        "statistics_all_x10_concurrent": concurrently(call("GET", "/api/statistics"), 10),
+        "reputation_score_x10_concurrent": concurrently(call("GET", "/api/reputation-score"), 10),
+        "alerts_check": call("GET", "/api/alerts/check", params={"brand_name": top_brand}),
+        "brands": call("GET", "/api/brands"),
+        "dashboard_brand": call("GET", "/api/dashboard", params={"brand_name": top_brand, "date_from": week_ago}),
+        "dashboard_brand_x10_concurrent": concurrently(
+            call("GET", "/api/dashboard", params={"brand_name": top_brand, "date_from": week_ago}), 10
+        ),
+        "search_comments_endpoint": call("GET", "/api/search/comments", params={"query": "оплата не проходить", "limit": 10}),
+        "search_comments": lambda: db_manager.search_comments("refund payment failed", n_results=10, mode="vector"),
+        # 16 одночасних пошуків через HTTP - embedding запитів збираються в мікро-пакети пулу
+        "search_comments_x16_concurrent": concurrently(call("GET", "/api/search/comments", params={
+            "query": "refund payment failed", "limit": 10, "mode": "vector"
+        }), 16),
+        "search_comments_hybrid": lambda: db_manager.search_comments("refund payment failed", n_results=10, mode="hybrid"),
+        "search_comments_keyword": lambda: db_manager.search_comments("refund", n_results=10, mode="keyword"),
+        "search_comments_batch": call("POST", "/api/search/comments/batch", json={
+            "queries": [f"{phrase} {top_brand}" for phrase in PHRASES["negative"][:6]], "limit": 10
+        }),
+        "filter_text": call("POST", "/api/reviews/filter", json={"text": "refund", "brand_name": top_brand}),
+    }
+
+    results = {}
+    try:
+        for name, fn in scenarios.items():
+            print(f"⏱️  [{size}] {name}...")
+            results[name] = measure(fn, repeat)
+
+        # Шардована аналітика по всьому корпусу: на статичних даних колонки
+        # будуються раз, під час ingest кожен запит бачить нову версію даних
+        settings.ANALYTICS_SCAN_LIMIT = 0
+        settings.ANALYTICS_PARALLEL_MIN_ROWS = min(settings.ANALYTICS_PARALLEL_MIN_ROWS, size)
+        statistics_all = call("GET", "/api/statistics")
+        print(f"⏱️  [{size}] statistics_sharded...")
+        results["statistics_sharded"] = measure(statistics_all, repeat)
+        extra = [as_input_row(comment) for batch in generate_corpus(min(size, 20_000), seed + 1, now) for comment in batch]
+        print(f"⏱️  [{size}] statistics_sharded_during_ingest...")
+        results["statistics_sharded_during_ingest"] = measure_during_ingest(statistics_all, client, extra, repeat)
+    finally:
+        client.close()
+        server.should_exit = True
+        thread.join()
+
+    return {
+        "size": size,
+        "ingest": {
+            "seconds": round(ingest_seconds, 2),
+            "rows_per_second": round(size / ingest_seconds, 1) if ingest_seconds else None,
+        },
+        "scenarios": results,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def run_all(sizes: list, seed: int, repeat: int, output: Path, keep_data: bool):
+    """Прогоняє всі розміри в окремих процесах і пише JSON звіт"""
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": seed,
+            "repeat": repeat,
+            "embedding_backend": "hash",
+        },
+        "results": [],
+    }
+
+    for size in sizes:
+        workdir = Path(tempfile.mkdtemp(prefix=f"brandpulse-bench-{size}-"))
+        result_file = workdir / "result.json"
+        env = {
+            **os.environ,
+            "CHROMA_PERSIST_DIR": str(workdir / "chroma"),
+            "EMBEDDING_BACKEND": "hash",
+            "OPENAI_API_KEY": "benchmark-offline",
+            "TELEGRAM_BOT_TOKEN": "",
+            "TELEGRAM_CHAT_ID": "",
+            # Без memo: повтори мають міряти обчислення, а не віддачу з пам'яті
+            "ANALYTICS_MEMO_SECONDS": "0",
+            # Фонові слухачі записів не мають конкурувати зі сценаріями
+            "ISSUE_CLUSTERING": "false",
+            "DRAFT_PRECOMPUTE": "false",
+        }
+        try:
+            subprocess.run(
+                [sys.executable, __file__, "--run-size", str(size), "--seed", str(seed),
+                 "--repeat", str(repeat), "--result-file", str(result_file)],
+                env=env, cwd=BACKEND_DIR, check=True
+            )
+            report["results"].append(json.loads(result_file.read_text()))
+        finally:
+            if keep_data:
+                print(f"📁 Дані збережено: {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"✅ Звіт: {output}")
+
+
+def compare(old_path: str, new_path: str):
+    """Порівняння медіан двох звітів"""
+    old = {r["size"]: r for r in json.loads(Path(old_path).read_text())["results"]}
+    new = {r["size"]: r for r in json.loads(Path(new_path).read_text())["results"]}
+
+    for size in sorted(set(old) & set(new)):
+        print(f"\n📊 {size} коментарів")
+        print(f"{'scenario':<34}{'old ms':>12}{'new ms':>12}{'ratio':>9}")
+        old_ingest = old[size]["ingest"]["seconds"] * 1000
+        new_ingest = new[size]["ingest"]["seconds"] * 1000
+        print(f"{'ingest':<34}{old_ingest:>12.1f}{new_ingest:>12.1f}{new_ingest / old_ingest:>8.2f}x")
+        for name in old[size]["scenarios"]:
+            if name not in new[size]["scenarios"]:
+                continue
+            a = old[size]["scenarios"][name]["median_ms"]
+            b = new[size]["scenarios"][name]["median_ms"]
+            ratio = b / a if a else float("nan")
+            print(f"{name:<34}{a:>12.2f}{b:>12.2f}{ratio:>8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк backend-core")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Розміри корпусу")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5, help="Повторів на сценарій")
+    parser.add_argument("--output", type=Path, default=None, help="Шлях до JSON звіту")
+    parser.add_argument("--keep-data", action="store_true", help="Не видаляти тимчасові ChromaDB")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Порівняти два звіти")
+    # Внутрішній режим дочірнього процесу
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    elif args.run_size:
+        result = run_size(args.run_size, args.seed, args.repeat)
+        args.result_file.write_text(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        output = args.output or DEFAULT_OUTPUT_DIR / f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json"
+        run_all(args.sizes, args.seed, args.repeat, output, args.keep_data)
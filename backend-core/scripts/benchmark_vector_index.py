@@ -0,0 +1,184 @@
+"""
+Recall і латентність int8 індексу проти HNSW ChromaDB на синтетичному корпусі
+Запустити:
+    python scripts/benchmark_vector_index.py --size 100000
+    python scripts/benchmark_vector_index.py --size 100000 --rerank-factor 5 10 20
+
+Корпус той самий, що в scripts/benchmark.py (EMBEDDING_BACKEND=hash), у
+тимчасовій ChromaDB. Еталон - точний пошук по float32 векторах. Recall@k
+враховує рівні відстані: результат зараховується, якщо його точна відстань
+не більша за k-ту еталонну.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+WORKDIR = Path(tempfile.mkdtemp(prefix="brandpulse-vector-bench-"))
+# Налаштування читаються при імпорті app - задаємо до нього
+os.environ.update({
+    "CHROMA_PERSIST_DIR": str(WORKDIR / "chroma"),
+    "EMBEDDING_BACKEND": "hash",
+    "OPENAI_API_KEY": "benchmark-offline",
+    "VECTOR_INDEX_COLLECTIONS": "comments",
+})
+
+import numpy as np
+
+from scripts.benchmark import summarize
+from scripts.generate_corpus import BRANDS, PHRASES, generate_corpus
+
+
+def directory_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def hnsw_bytes(persist_dir: Path) -> int:
+    """Розмір файлів HNSW сегментів (їх ChromaDB тримає в пам'яті)"""
+    return sum(
+        directory_size(segment)
+        for segment in persist_dir.iterdir()
+        if segment.is_dir() and (segment / "data_level0.bin").exists()
+    )
+
+
+def recall_at_k(found_rows: list, truth_distances: np.ndarray, exact_distances: np.ndarray, k: int) -> float:
+    threshold = truth_distances[k - 1] + 1e-5
+    hits = sum(1 for row in found_rows[:k] if exact_distances[row] <= threshold)
+    return hits / k
+
+
+def run(size: int, queries: int, k: int, rerank_factors: list, seed: int) -> dict:
+    from app.config import settings
+    from app.database import ChromaDBManager
+
+    db_manager = ChromaDBManager()
+    vector_index = db_manager.vector_indexes[settings.COMMENTS_COLLECTION]
+
+    print(f"📥 Ingest {size} коментарів (HNSW + int8)...")
+    started = time.perf_counter()
+    for batch in generate_corpus(size, seed, datetime.now()):
+        db_manager.add_comments(batch)
+    ingest_seconds = time.perf_counter() - started
+
+    rng = random.Random(seed + 1)
+    query_texts = [
+        f"{rng.choice(BRANDS)} {rng.choice(PHRASES[rng.choice(list(PHRASES))])}"
+        for _ in range(queries)
+    ]
+    query_vectors = np.asarray(db_manager.embedding_function(query_texts), dtype=np.float32)
+
+    # Еталон: точні відстані до всіх векторів
+    vectors = np.asarray(vector_index._maps["vectors"])
+    row_of = {doc_id: row for row, doc_id in enumerate(vector_index._ids)}
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+    exact = [norms - 2.0 * (vectors @ q) + float(q @ q) for q in query_vectors]
+    truth = [np.sort(d)[:k] for d in exact]
+
+    results = {}
+
+    print("⏱️  HNSW (ChromaDB)...")
+    collection = db_manager.comments_collection
+    samples, recalls = [], []
+    for q, vector in enumerate(query_vectors):
+        started = time.perf_counter()
+        found = collection.query(query_embeddings=[vector.tolist()], n_results=k, include=[])
+        samples.append(time.perf_counter() - started)
+        recalls.append(recall_at_k([row_of[i] for i in found["ids"][0]], truth[q], exact[q], k))
+    results["hnsw"] = {**summarize(samples), "recall": round(float(np.mean(recalls)), 4)}
+
+    for factor in rerank_factors:
+        name = f"int8_rerank_x{factor}"
+        print(f"⏱️  {name}...")
+        samples, recalls = [], []
+        for q, vector in enumerate(query_vectors):
+            started = time.perf_counter()
+            ids, _ = vector_index.search([vector], k, rerank=k * factor)
+            samples.append(time.perf_counter() - started)
+            recalls.append(recall_at_k([row_of[i] for i in ids[0]], truth[q], exact[q], k))
+        results[name] = {**summarize(samples), "recall": round(float(np.mean(recalls)), 4)}
+
+    # Фільтрований пошук (where): широкий фільтр за брендом і вузький за автором
+    author = collection.get(limit=1, offset=size // 2, include=["metadatas"])["metadatas"][0]["author"]
+    filters = {
+        "filtered_brand": {"brand_name": BRANDS[0]},
+        "filtered_author": {"author": author},
+    }
+    for name, where in filters.items():
+        allowed = np.asarray(sorted(row_of[i] for i in collection.get(where=where, include=[])["ids"]))
+        print(f"⏱️  {name} ({len(allowed)} рядків)...")
+        for index_name in ("hnsw", "int8"):
+            samples, recalls = [], []
+            for q, vector in enumerate(query_vectors):
+                started = time.perf_counter()
+                if index_name == "hnsw":
+                    found = collection.query(
+                        query_embeddings=[vector.tolist()], n_results=min(k, len(allowed)), where=where, include=[]
+                    )["ids"][0]
+                else:
+                    found = db_manager._query(settings.COMMENTS_COLLECTION, [query_texts[q]], k, where)["ids"][0]
+                samples.append(time.perf_counter() - started)
+                subset = exact[q][allowed]
+                limit = min(k, len(allowed))
+                recalls.append(recall_at_k(
+                    [row_of[i] for i in found], np.sort(subset)[:limit], exact[q], limit
+                ))
+            results[f"{name}_{index_name}"] = {**summarize(samples), "recall": round(float(np.mean(recalls)), 4)}
+
+    footprint = vector_index.memory_footprint()
+    memory = {
+        "hnsw_bytes": hnsw_bytes(Path(settings.CHROMA_PERSIST_DIR)),
+        "int8_scan_bytes": footprint["scan_bytes"],
+        "float32_vectors_bytes": footprint["float32_bytes"],
+    }
+    memory["reduction_vs_hnsw"] = round(memory["hnsw_bytes"] / memory["int8_scan_bytes"], 2) \
+        if memory["int8_scan_bytes"] else None
+
+    return {
+        "size": size,
+        "dimension": vector_index.dim,
+        "k": k,
+        "queries": queries,
+        "ingest_seconds": round(ingest_seconds, 2),
+        "memory": memory,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк int8 векторного індексу")
+    parser.add_argument("--size", type=int, default=100_000, help="Розмір корпусу")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank-factor", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=None, help="Шлях до JSON звіту")
+    args = parser.parse_args()
+
+    try:
+        report = run(args.size, args.queries, args.k, args.rerank_factor, args.seed)
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+    print(f"\n📊 {report['size']} векторів x {report['dimension']}, recall@{report['k']}")
+    print(f"{'index':<28}{'recall':>9}{'median ms':>12}{'p95 ms':>10}")
+    for name, stats in report["results"].items():
+        print(f"{name:<28}{stats['recall']:>9.3f}{stats['median_ms']:>12.2f}{stats['p95_ms']:>10.2f}")
+    memory = report["memory"]
+    print(
+        f"\n💾 HNSW {memory['hnsw_bytes'] / 1e6:.1f} MB, int8 скан {memory['int8_scan_bytes'] / 1e6:.1f} MB "
+        f"({memory['reduction_vs_hnsw']}x менше)"
+    )
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+        print(f"✅ Звіт: {args.output}")
@@ -0,0 +1,33 @@
+"""
+Кластеризує наявні негативні коментарі (кластери проблем) з embeddings ChromaDB
+Запустити (у режимі INGEST_MODE=queue - при зупиненому ingest_writer.py):
+    python scripts/build_issue_clusters.py
+    ISSUE_CLUSTER_NEW_DISTANCE=0.3 python scripts/build_issue_clusters.py --top 10
+
+Нові коментарі далі кластеризуються при ingest (ISSUE_CLUSTERING=true).
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from app.database import ChromaDBManager
+from app.issue_clusters import IssueClusterer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Побудова кластерів проблем")
+    parser.add_argument("--top", type=int, default=5, help="Скільки найбільших кластерів показати")
+    args = parser.parse_args()
+
+    # Напряму, без черги: кластери пише той самий процес, що й читає embeddings
+    clusterer = IssueClusterer(ChromaDBManager())
+    print(f"🧩 Кластеризація негативних коментарів ({clusterer.path})...")
+    started = time.perf_counter()
+    result = clusterer.rebuild()
+    print(f"✅ {result['comments']} коментарів у {result['clusters']} кластерах за {time.perf_counter() - started:.1f}с")
+
+    for issue in clusterer.top_issues(limit=args.top)["issues"]:
+        example = issue["examples"][0]["text"][:80] if issue["examples"] else ""
+        print(f"  #{issue['cluster_id']:<4} {issue['count']:>6}  {issue['label']:<40} {example}")
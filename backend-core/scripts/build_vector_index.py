@@ -0,0 +1,40 @@
+"""
+Будує int8 індекс (VECTOR_INDEX_COLLECTIONS) з embeddings, що вже є в ChromaDB
+Запустити (у режимі INGEST_MODE=queue - при зупиненому ingest_writer.py):
+    VECTOR_INDEX_COLLECTIONS=comments python scripts/build_vector_index.py
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from app.config import settings
+from app.database import ChromaDBManager
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Побудова int8 векторного індексу")
+    parser.add_argument("--collection", action="append", default=None,
+                        help="Колекція (можна кілька), за замовчуванням усі з VECTOR_INDEX_COLLECTIONS")
+    args = parser.parse_args()
+
+    names = args.collection or settings.VECTOR_INDEX_COLLECTIONS
+    if not names:
+        print("❌ Не вказано колекцій: задайте VECTOR_INDEX_COLLECTIONS або --collection")
+        sys.exit(1)
+    for name in names:
+        if name not in settings.VECTOR_INDEX_COLLECTIONS:
+            settings.VECTOR_INDEX_COLLECTIONS.append(name)
+
+    # Напряму, без черги: індекс пише той самий процес, що й читає embeddings
+    db_manager = ChromaDBManager()
+    for name in names:
+        print(f"🧱 Індекс {name}...")
+        started = time.perf_counter()
+        count = db_manager.build_vector_index(name)
+        footprint = db_manager.vector_indexes[name].memory_footprint()
+        print(
+            f"✅ {name}: {count} векторів за {time.perf_counter() - started:.1f}с, "
+            f"скан {footprint['scan_bytes'] / 1e6:.1f} MB (float32: {footprint['float32_bytes'] / 1e6:.1f} MB)"
+        )
@@ -0,0 +1,565 @@
+"""
+Детермінований генератор синтетичного корпусу відгуків (багато брендів, мільйони рядків)
+Запустити:
+    python scripts/generate_corpus.py --size 1000000 --brands 200 --output corpus.ndjson.gz
+    python scripts/generate_corpus.py --size 5000000 --output corpus.parquet --incidents incidents.json
+    python scripts/generate_corpus.py --size 100000 --ingest            # пакетний add_comments
+    python scripts/generate_corpus.py --size 1000 --output - | head -3
+
+Для заданих --seed і --now корпус однаковий до байта. Що моделюється:
+- бренди з нерівномірною популярністю (Zipf): перші 8 - реальні назви, далі Brand-NNNN;
+- платформи з власним міксом настрою і мов, рейтинг лише там, де він є (магазини, trustpilot);
+- severity і рейтинг залежать від настрою, 1-3 сирі категорії на відгук, частина -
+  синоніми англійською/російською (як їх повертає LLM);
+- тексти українською, англійською і російською, добовий профіль активності;
+- інциденти: вікна в кілька годин/днів, коли у бренду зростає обсяг і частка
+  негативу на одну тему (оплата, краш, доставка, логін). Перший бренд має
+  інцидент, що триває зараз. Список інцидентів (--incidents) - еталон для
+  тестів детекції спайків.
+
+Рядки NDJSON/Parquet відповідають CommentInput (POST /api/comments/batch):
+category - рядок через кому, timestamp - ISO.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import gzip
+import json
+import random
+import time
+from bisect import bisect
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+INGEST_CHUNK = 5000
+
+BRANDS = ["Zara", "H&M", "Mango", "Reserved", "Bershka", "Pull&Bear", "Uniqlo", "COS"]
+
+# Платформа -> (частка трафіку, ваги positive/neutral/negative, ваги uk/en/ru, чи є рейтинг)
+PLATFORM_PROFILES = {
+    "app_store": (0.22, (0.45, 0.15, 0.40), (0.6, 0.25, 0.15), True),
+    "google_play": (0.28, (0.40, 0.15, 0.45), (0.65, 0.15, 0.20), True),
+    "trustpilot": (0.15, (0.35, 0.15, 0.50), (0.45, 0.45, 0.10), True),
+    "reddit": (0.12, (0.25, 0.35, 0.40), (0.25, 0.70, 0.05), False),
+    "quora": (0.05, (0.25, 0.55, 0.20), (0.30, 0.65, 0.05), False),
+    "instagram": (0.18, (0.60, 0.20, 0.20), (0.70, 0.15, 0.15), False),
+}
+PLATFORMS = list(PLATFORM_PROFILES)
+SENTIMENTS = ["positive", "neutral", "negative"]
+LANGUAGES = ["uk", "en", "ru"]
+
+PLATFORM_LINKS = {
+    "app_store": "https://apps.apple.com/review/{}",
+    "google_play": "https://play.google.com/store/apps/review/{}",
+    "trustpilot": "https://www.trustpilot.com/reviews/{}",
+    "reddit": "https://www.reddit.com/r/fashion/comments/{}",
+    "quora": "https://www.quora.com/answer/{}",
+    "instagram": "https://www.instagram.com/p/{}",
+}
+
+# (сирі категорії, {мова: текст})
+TEMPLATES = {
+    "positive": [
+        (["якість"], {
+            "uk": "Чудова якість, все сподобалось",
+            "en": "Great quality, loved everything",
+            "ru": "Отличное качество, всё понравилось",
+        }),
+        (["оплата", "додаток"], {
+            "uk": "Зручний додаток, оплата пройшла за секунди",
+            "en": "Great app, checkout was quick",
+            "ru": "Удобное приложение, оплата прошла за секунды",
+        }),
+        (["доставка"], {
+            "uk": "Доставка прийшла швидше ніж очікувала",
+            "en": "Delivery arrived earlier than expected",
+            "ru": "Доставка пришла быстрее, чем ожидала",
+        }),
+        (["продукт"], {
+            "uk": "Нова колекція просто вогонь",
+            "en": "Love the new collection",
+            "ru": "Новая коллекция просто огонь",
+        }),
+        (["підтримка", "повернення"], {
+            "uk": "Підтримка швидко допомогла з поверненням",
+            "en": "Support sorted out my return in minutes",
+            "ru": "Поддержка быстро помогла с возвратом",
+        }),
+        (["ціна", "акції"], {
+            "uk": "Взяла пальто зі знижкою 50%, ціна супер",
+            "en": "Got a coat at 50% off, amazing price",
+            "ru": "Взяла пальто со скидкой 50%, цена супер",
+        }),
+        (["розмір"], {
+            "uk": "Розмір підійшов ідеально, таблиця точна",
+            "en": "Fits perfectly, the size chart is accurate",
+            "ru": "Размер подошёл идеально, таблица точная",
+        }),
+    ],
+    "neutral": [
+        (["загальне"], {
+            "uk": "Нормальний магазин, нічого особливого",
+            "en": "Decent store, nothing special",
+            "ru": "Нормальный магазин, ничего особенного",
+        }),
+        (["доставка"], {
+            "uk": "Доставка зайняла близько тижня",
+            "en": "Delivery took about a week",
+            "ru": "Доставка заняла около недели",
+        }),
+        (["ціна"], {
+            "uk": "Ціни середні для масмаркету",
+            "en": "Prices are average for fast fashion",
+            "ru": "Цены средние для масс-маркета",
+        }),
+        (["додаток", "інтерфейс"], {
+            "uk": "Додаток працює, але фільтрів мало",
+            "en": "The app works but needs more filters",
+            "ru": "Приложение работает, но фильтров мало",
+        }),
+        (["асортимент", "розмір"], {
+            "uk": "Асортимент великий, але мого розміру часто немає",
+            "en": "Big range but my size is often out of stock",
+            "ru": "Ассортимент большой, но моего размера часто нет",
+        }),
+    ],
+    "negative": [
+        (["оплата", "краш", "додаток"], {
+            "uk": "Додаток вилітає при оплаті",
+            "en": "App crashes at checkout",
+            "ru": "Приложение вылетает при оплате",
+        }),
+        (["оплата", "повернення"], {
+            "uk": "Оплата не пройшла двічі, а гроші досі не повернули",
+            "en": "Payment failed twice, refund still pending",
+            "ru": "Оплата не прошла дважды, деньги до сих пор не вернули",
+        }),
+        (["оплата"], {
+            "uk": "Не працює оплата карткою вже тиждень",
+            "en": "Card payment has been broken for a week",
+            "ru": "Не работает оплата картой уже неделю",
+        }),
+        (["краш", "додаток"], {
+            "uk": "Додаток крашиться одразу після оновлення",
+            "en": "App crashes on startup after update",
+            "ru": "Приложение падает сразу после обновления",
+        }),
+        (["доставка", "підтримка"], {
+            "uk": "Замовлення загубилось, підтримка мовчить",
+            "en": "My order got lost and support is silent",
+            "ru": "Заказ потерялся, поддержка молчит",
+        }),
+        (["доставка"], {
+            "uk": "Доставка затрималась на два тижні",
+            "en": "Delivery is two weeks late",
+            "ru": "Доставка задерживается на две недели",
+        }),
+        (["розмір", "повернення"], {
+            "uk": "Розмір не відповідає таблиці, повернення відхилили",
+            "en": "Size runs small and the return was rejected",
+            "ru": "Размер не соответствует таблице, возврат отклонили",
+        }),
+        (["якість"], {
+            "uk": "Тканина розлізлась після першого прання",
+            "en": "The fabric fell apart after one wash",
+            "ru": "Ткань расползлась после первой стирки",
+        }),
+        (["ціна", "якість"], {
+            "uk": "Ціни виросли, а якість впала",
+            "en": "Prices went up while quality went down",
+            "ru": "Цены выросли, а качество упало",
+        }),
+        (["акції", "оплата"], {
+            "uk": "Промокод не застосовується в кошику",
+            "en": "Promo code does not apply at checkout",
+            "ru": "Промокод не применяется в корзине",
+        }),
+        (["акаунт", "додаток"], {
+            "uk": "Не можу увійти в акаунт, пише невірний пароль",
+            "en": "Cannot log in, it keeps saying wrong password",
+            "ru": "Не могу войти в аккаунт, пишет неверный пароль",
+        }),
+        (["шахрайство", "оплата"], {
+            "uk": "Гроші списали, а замовлення скасували без пояснень",
+            "en": "They charged my card and cancelled the order with no explanation",
+            "ru": "Деньги списали, а заказ отменили без объяснений",
+        }),
+    ],
+}
+
+# Усі тексти по настрою (пошукові запити бенчмарків)
+PHRASES = {
+    sentiment: [text for _, texts in templates for text in texts.values()]
+    for sentiment, templates in TEMPLATES.items()
+}
+
+# Так категорії повертає LLM: та сама тема різними словами і мовами
+CATEGORY_VARIANTS = {
+    "оплата": ["payment", "payments issue", "оплата карткою", "оплата картой", "billing"],
+    "краш": ["crash", "баги", "bug", "вылетает"],
+    "додаток": ["app", "mobile app", "функціональність", "приложение"],
+    "доставка": ["delivery", "shipping", "курьер"],
+    "підтримка": ["support", "customer service", "сервіс"],
+    "повернення": ["refund", "returns", "обмін"],
+    "якість": ["quality", "брак"],
+    "розмір": ["size", "sizing", "размер"],
+    "ціна": ["price", "pricing", "цена"],
+    "акції": ["discount", "promotions", "знижки"],
+    "акаунт": ["login", "account", "логін"],
+    "шахрайство": ["fraud", "scam"],
+}
+CATEGORY_VARIANT_RATE = 0.15
+EXTRA_CATEGORY_RATE = 0.2
+EXTRA_CATEGORIES = ["інтерфейс", "асортимент", "продукт", "ціна", "підтримка", "акції"]
+
+DETAILS = {
+    "uk": ["Вже втретє за місяць.", "Дуже розчарована.", "Рекомендую друзям.", "Замовлення №{}.", "Пишу з телефону."],
+    "en": ["Third time this month.", "Really disappointed.", "Would recommend.", "Order #{}.", "Posting from my phone."],
+    "ru": ["Уже третий раз за месяц.", "Очень разочарована.", "Советую друзьям.", "Заказ №{}.", "Пишу с телефона."],
+}
+DETAIL_RATE = 0.5
+
+LLM_DESCRIPTIONS = {
+    "positive": "Користувач задоволений: {}",
+    "neutral": "Нейтральний відгук: {}",
+    "negative": "Користувач скаржиться: {}",
+}
+LLM_DESCRIPTION_RATE = 0.7
+
+SEVERITY_BY_SENTIMENT = {
+    "positive": (["low", "medium"], [0.9, 0.1]),
+    "neutral": (["low", "medium", "high"], [0.5, 0.4, 0.1]),
+    "negative": (["medium", "high", "critical"], [0.4, 0.4, 0.2]),
+}
+INCIDENT_SEVERITY = (["medium", "high", "critical"], [0.1, 0.45, 0.45])
+RATING_BY_SENTIMENT = {
+    "positive": ([3.0, 4.0, 5.0], [0.05, 0.3, 0.65]),
+    "neutral": ([2.0, 3.0, 4.0], [0.15, 0.55, 0.3]),
+    "negative": ([1.0, 2.0, 3.0], [0.6, 0.3, 0.1]),
+}
+
+# Частка відгуків по годинах доби (нічний спад, вечірній пік)
+HOURLY_WEIGHTS = [
+    0.6, 0.4, 0.3, 0.2, 0.2, 0.3, 0.6, 1.0, 1.4, 1.6, 1.7, 1.8,
+    1.9, 1.9, 1.8, 1.8, 1.9, 2.1, 2.4, 2.6, 2.5, 2.1, 1.5, 1.0,
+]
+
+# Тема інциденту -> категорія, за якою відбираються негативні шаблони
+INCIDENT_TOPICS = {
+    "payment_outage": "оплата",
+    "app_crash": "краш",
+    "delivery_delay": "доставка",
+    "login_failure": "акаунт",
+}
+INCIDENT_TEMPLATES = {
+    topic: [template for template in TEMPLATES["negative"] if category in template[0]]
+    for topic, category in INCIDENT_TOPICS.items()
+}
+INCIDENTS_PER_BRAND_MONTH = 0.5
+INCIDENT_HOURS = (4, 36)
+INCIDENT_INTENSITY = (3.0, 10.0)  # у скільки разів зростає погодинний обсяг бренду
+INCIDENT_NEGATIVE_SHARE = 0.85
+ONGOING_INCIDENT_HOURS = 12
+
+
+def brand_names(count: int) -> list:
+    """Перші BRANDS - реальні назви, далі Brand-0009, Brand-0010, ..."""
+    return BRANDS[:count] + [f"Brand-{i:04d}" for i in range(len(BRANDS) + 1, count + 1)]
+
+
+class CorpusGenerator:
+    """Потік пакетів коментарів; для (seed, now) результат завжди однаковий"""
+
+    def __init__(self, size: int, seed: int, now: datetime, days: int = 60,
+                 brands: int = len(BRANDS), incidents: bool = True, chunk: int = INGEST_CHUNK):
+        self.size = size
+        self.now = now
+        self.days = days
+        self.chunk = chunk
+        self.rng = random.Random(seed)
+        self.brands = brand_names(brands)
+        # Zipf: перший бренд найпопулярніший
+        self.brand_cum = list(accumulate(1.0 / (i + 1) for i in range(len(self.brands))))
+        self.platform_cum = list(accumulate(profile[0] for profile in PLATFORM_PROFILES.values()))
+        self.hour_cum = list(accumulate(HOURLY_WEIGHTS))
+        # Накопичені ваги: вибір - один random() і bisect замість rng.choices
+        self.platform_mix = {
+            platform: (list(accumulate(sentiments)), list(accumulate(languages)), has_rating)
+            for platform, (_, sentiments, languages, has_rating) in PLATFORM_PROFILES.items()
+        }
+        self.severity_mix = {
+            sentiment: (values, list(accumulate(weights)))
+            for sentiment, (values, weights) in {**SEVERITY_BY_SENTIMENT, "incident": INCIDENT_SEVERITY}.items()
+        }
+        self.rating_mix = {
+            sentiment: (values, list(accumulate(weights))) for sentiment, (values, weights) in RATING_BY_SENTIMENT.items()
+        }
+        self.incidents = self._plan_incidents() if incidents else []
+        self.by_brand = {}
+        for incident in self.incidents:
+            self.by_brand.setdefault(incident["brand_name"], []).append(incident)
+        self.stats = {"sentiment": Counter(), "platform": Counter(), "language": Counter(), "incident_rows": 0}
+
+    def _plan_incidents(self) -> list:
+        """Вікна інцидентів по брендах (до генерації рядків, щоб не залежали від size)"""
+        rng = self.rng
+        window_hours = self.days * 24
+        incidents = []
+        for index, brand in enumerate(self.brands):
+            expected = INCIDENTS_PER_BRAND_MONTH * self.days / 30
+            count = int(expected) + (rng.random() < expected - int(expected))
+            windows = [
+                (rng.uniform(*INCIDENT_HOURS), rng.uniform(0, window_hours)) for _ in range(count)
+            ]
+            if index == 0:
+                # Інцидент "зараз": алерти і спайки по першому бренду мають свіжі дані
+                windows.append((ONGOING_INCIDENT_HOURS, ONGOING_INCIDENT_HOURS))
+            for hours, start_offset in windows:
+                # Вікно цілком у періоді і не в майбутньому
+                start = self.now - timedelta(hours=max(start_offset, hours))
+                intensity = rng.uniform(*INCIDENT_INTENSITY)
+                topic = rng.choice(list(INCIDENT_TOPICS))
+                incidents.append({
+                    "brand_name": brand,
+                    "topic": topic,
+                    "category": INCIDENT_TOPICS[topic],
+                    "start": start,
+                    "end": min(start + timedelta(hours=hours), self.now),
+                    "intensity": round(intensity, 2),
+                    # Вага відносно фону бренду за весь період
+                    "mass": intensity * hours / window_hours,
+                    "rows": 0,
+                })
+        return incidents
+
+    def _pick_incident(self, brand: str):
+        incidents = self.by_brand.get(brand)
+        if not incidents:
+            return None
+        point = self.rng.random() * (1.0 + sum(incident["mass"] for incident in incidents))
+        for incident in incidents:
+            point -= incident["mass"]
+            if point < 0:
+                return incident
+        return None
+
+    def _background_timestamp(self) -> datetime:
+        rng = self.rng
+        while True:
+            day = (self.now - timedelta(days=rng.randrange(self.days))).replace(
+                hour=0, minute=0, second=0, microsecond=0
+            )
+            hour = self._pick(range(24), self.hour_cum)
+            timestamp = day + timedelta(hours=hour, seconds=rng.uniform(0, 3600))
+            if timestamp <= self.now:
+                return timestamp
+
+    def _categories(self, raw: list) -> list:
+        rng = self.rng
+        categories = [
+            rng.choice(CATEGORY_VARIANTS[category])
+            if category in CATEGORY_VARIANTS and rng.random() < CATEGORY_VARIANT_RATE else category
+            for category in raw
+        ]
+        if rng.random() < EXTRA_CATEGORY_RATE:
+            extra = rng.choice(EXTRA_CATEGORIES)
+            if extra not in categories:
+                categories.append(extra)
+        return categories
+
+    def _pick(self, values: list, cum: list):
+        return values[bisect(cum, self.rng.random() * cum[-1])]
+
+    def row(self, i: int) -> dict:
+        rng = self.rng
+        brand = self._pick(self.brands, self.brand_cum)
+        platform = self._pick(PLATFORMS, self.platform_cum)
+        sentiment_cum, language_cum, has_rating = self.platform_mix[platform]
+        language = self._pick(LANGUAGES, language_cum)
+
+        incident = self._pick_incident(brand)
+        if incident and rng.random() < INCIDENT_NEGATIVE_SHARE:
+            sentiment = "negative"
+            templates = INCIDENT_TEMPLATES[incident["topic"]]
+            severity = self._pick(*self.severity_mix["incident"])
+        else:
+            sentiment = self._pick(SENTIMENTS, sentiment_cum)
+            templates = TEMPLATES[sentiment]
+            severity = self._pick(*self.severity_mix[sentiment])
+        if incident:
+            start = incident["start"].timestamp()
+            timestamp = datetime.fromtimestamp(rng.uniform(start, incident["end"].timestamp()))
+            incident["rows"] += 1
+            self.stats["incident_rows"] += 1
+        else:
+            timestamp = self._background_timestamp()
+
+        raw_categories, texts = rng.choice(templates)
+        body = f"{brand}: {texts[language]}"
+        if rng.random() < DETAIL_RATE:
+            body += ". " + rng.choice(DETAILS[language]).format(rng.randint(100000, 999999))
+        categories = self._categories(raw_categories)
+        rating = None
+        if has_rating:
+            rating = self._pick(*self.rating_mix[sentiment])
+
+        self.stats["sentiment"][sentiment] += 1
+        self.stats["platform"][platform] += 1
+        self.stats["language"][language] += 1
+        return {
+            "brand_name": brand,
+            "body": body,
+            "author": f"user_{rng.randint(1, max(1000, self.size // 3))}",
+            "timestamp": timestamp,
+            "rating": rating,
+            "backlink": PLATFORM_LINKS[platform].format(i),
+            "platform": platform,
+            "sentiment": sentiment,
+            "llm_description": (
+                LLM_DESCRIPTIONS[sentiment].format(", ".join(raw_categories))
+                if rng.random() < LLM_DESCRIPTION_RATE else None
+            ),
+            "category": categories,
+            "severity": severity,
+        }
+
+    def batches(self):
+        """Пакети по chunk рядків (category - список, timestamp - datetime)"""
+        batch = []
+        for i in range(self.size):
+            batch.append(self.row(i))
+            if len(batch) == self.chunk:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def incident_manifest(self) -> list:
+        """Інциденти з кількістю згенерованих рядків (еталон для детекції спайків)"""
+        return [
+            {
+                "brand_name": incident["brand_name"],
+                "topic": incident["topic"],
+                "category": incident["category"],
+                "start": incident["start"].isoformat(),
+                "end": incident["end"].isoformat(),
+                "intensity": incident["intensity"],
+                "rows": incident["rows"],
+            }
+            for incident in sorted(self.incidents, key=lambda x: x["start"])
+        ]
+
+
+def generate_corpus(size: int, seed: int, now: datetime, days: int = 60, brands: int = len(BRANDS)):
+    """Детермінований генератор коментарів (пакетами по INGEST_CHUNK)"""
+    return CorpusGenerator(size, seed, now, days=days, brands=brands).batches()
+
+
+def as_input_row(comment: dict) -> dict:
+    """Рядок у форматі CommentInput: category через кому, timestamp ISO"""
+    return {**comment, "timestamp": comment["timestamp"].isoformat(), "category": ", ".join(comment["category"])}
+
+
+def write_ndjson(generator: CorpusGenerator, path: str):
+    if path == "-":
+        stream = sys.stdout
+    elif path.endswith(".gz"):
+        stream = gzip.open(path, "wt", encoding="utf-8")
+    else:
+        stream = open(path, "w", encoding="utf-8")
+    try:
+        for batch in generator.batches():
+            stream.write("".join(json.dumps(as_input_row(c), ensure_ascii=False) + "\n" for c in batch))
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+
+def write_parquet(generator: CorpusGenerator, path: str):
+    """Parquet з row group на пакет (пам'ять не росте з розміром корпусу)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("brand_name", pa.string()),
+        ("body", pa.string()),
+        ("author", pa.string()),
+        ("timestamp", pa.timestamp("us")),
+        ("rating", pa.float64()),
+        ("backlink", pa.string()),
+        ("platform", pa.string()),
+        ("sentiment", pa.string()),
+        ("llm_description", pa.string()),
+        ("category", pa.string()),
+        ("severity", pa.string()),
+    ])
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for batch in generator.batches():
+            rows = [{**c, "category": ", ".join(c["category"])} for c in batch]
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+
+
+def ingest(generator: CorpusGenerator):
+    """Через пакетний add_comments (у режимі INGEST_MODE=queue - у чергу writer)"""
+    from app.dependencies import get_db_manager
+
+    db_manager = get_db_manager()
+    done = 0
+    for batch in generator.batches():
+        db_manager.add_comments(batch)
+        done += len(batch)
+        log(f"   📥 {done}/{generator.size}")
+
+
+def log(message: str):
+    # stdout може бути самим корпусом (--output -)
+    print(message, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генератор синтетичного корпусу відгуків")
+    parser.add_argument("--size", type=int, required=True, help="Кількість відгуків")
+    parser.add_argument("--brands", type=int, default=len(BRANDS), help="Кількість брендів")
+    parser.add_argument("--days", type=int, default=60, help="Період у днях до --now")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--now", type=datetime.fromisoformat, default=None,
+                        help="Кінець періоду (ISO); за замовчуванням - поточна година")
+    parser.add_argument("--no-incidents", action="store_true", help="Без інцидентів (рівний фон)")
+    parser.add_argument("--chunk", type=int, default=INGEST_CHUNK, help="Розмір пакета")
+    parser.add_argument("--incidents", default=None, help="JSON зі списком інцидентів")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--output", help="Файл .ndjson[.gz] / .parquet або '-' (stdout)")
+    target.add_argument("--ingest", action="store_true", help="Завантажити через add_comments")
+    args = parser.parse_args()
+
+    now = args.now or datetime.now().replace(minute=0, second=0, microsecond=0)
+    generator = CorpusGenerator(
+        args.size, args.seed, now, days=args.days, brands=args.brands,
+        incidents=not args.no_incidents, chunk=args.chunk
+    )
+    log(f"🚀 {args.size} відгуків, {len(generator.brands)} брендів, {len(generator.incidents)} інцидентів "
+        f"({now - timedelta(days=args.days):%Y-%m-%d} - {now:%Y-%m-%d %H:%M}, seed {args.seed})")
+
+    started = time.perf_counter()
+    if args.ingest:
+        ingest(generator)
+    elif args.output.endswith(".parquet"):
+        write_parquet(generator, args.output)
+    else:
+        write_ndjson(generator, args.output)
+    elapsed = time.perf_counter() - started
+
+    if args.incidents:
+        with open(args.incidents, "w", encoding="utf-8") as f:
+            json.dump(generator.incident_manifest(), f, ensure_ascii=False, indent=2)
+        log(f"🚨 Інциденти: {args.incidents}")
+
+    total = args.size or 1
+    log(f"✅ {args.size} відгуків за {elapsed:.1f}с ({args.size / elapsed:.0f} рядків/с)" if elapsed else "✅ Готово")
+    log(f"   В інцидентах: {generator.stats['incident_rows']} ({generator.stats['incident_rows'] / total * 100:.1f}%)")
+    for key in ("sentiment", "platform", "language"):
+        shares = ", ".join(f"{name} {count / total * 100:.0f}%" for name, count in generator.stats[key].most_common())
+        log(f"   {key}: {shares}")
@@ -8,7 +8,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from datetime import datetime, timedelta
 import random
-from app.database import db_manager
+from app.dependencies import get_db_manager
 from app.models import Platform, Sentiment
 
 # Тестові дані про Zara (текст, категорії[], рейтинг, severity)
@@ -157,6 +157,7 @@ LLM_DESCRIPTIONS = {
 
 def generate_test_data():
     """Генерує тестові дані про Zara"""
+    db_manager = get_db_manager()
     print("🚀 Генерація тестових даних про Zara...")
     
     # 1. Додаємо документи про бренд
@@ -0,0 +1,97 @@
+"""
+Single-writer для INGEST_MODE=queue: застосовує черговані записи до ChromaDB
+Запустити (поруч з `uvicorn app.main:app --workers N`):
+    INGEST_MODE=queue python scripts/ingest_writer.py
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import logging
+import signal
+import threading
+
+from app.config import settings
+from app.database import ChromaDBManager
+from app.ingest_queue import IngestQueue, IngestWriter
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+
+def acquire_writer_lock(queue_path: str):
+    """Лише один writer на сховище: другий процес завершиться одразу"""
+    try:
+        import fcntl
+    except ImportError:
+        # Windows: покладаємось на те, що writer запущено один
+        return None
+
+    lock_file = open(f"{queue_path}.lock", "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print(f"❌ Writer вже запущено (lock {queue_path}.lock)")
+        sys.exit(1)
+    return lock_file
+
+
+def main(drain: bool):
+    queue = IngestQueue()
+    # Тримаємо посилання до кінця main, інакше lock звільниться
+    lock = acquire_writer_lock(queue.path)
+
+    print(f"✍️  Ingest writer: черга {queue.path}, pending={queue.pending_count()}")
+    # Writer пише напряму (без черги) - він і є єдиний власник запису
+    db_manager = ChromaDBManager()
+    writer = IngestWriter(queue, db_manager)
+
+    if settings.ISSUE_CLUSTERING:
+        # Кластери проблем оновлює той, хто застосовує записи
+        from app.issue_clusters import IssueClusterer
+        IssueClusterer(db_manager).start()
+        print("🧩 Кластеризація негативних коментарів увімкнена (ISSUE_CLUSTERING)")
+
+    if settings.DRAFT_PRECOMPUTE and not drain:
+        # Чернетки для high/critical коментарів рахує лише writer - не кожен воркер
+        from app.drafts import DraftPrecomputer, DraftStore
+        from app.openai_service import OpenAIService
+        DraftPrecomputer(db_manager, OpenAIService(), DraftStore()).start()
+        print("✍️  Чернетки після ingest увімкнено (DRAFT_PRECOMPUTE)")
+
+    if not drain:
+        # Сплеск негативу видно лише після застосування запису - перевіряє writer
+        from app.analytics import AnalyticsService
+        from app.ingest_alerts import IngestAlertChecker
+        from app.openai_service import OpenAIService
+        from app.telegram_service import TelegramService
+        IngestAlertChecker(db_manager, AnalyticsService(db_manager, OpenAIService()), TelegramService()).start()
+        print("🚨 Алерти сплеску негативу після ingest")
+
+    if drain:
+        total = 0
+        while True:
+            processed = writer.run_once()
+            if not processed:
+                break
+            total += processed
+        print(f"✅ Застосовано {total} операцій, версія {queue.applied_version()}")
+        return
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    writer.run_forever(stop_event)
+    print("👋 Writer зупинено")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Single-writer для ChromaDB (INGEST_MODE=queue)")
+    parser.add_argument("--drain", action="store_true", help="Застосувати чергу і вийти")
+    args = parser.parse_args()
+
+    main(drain=args.drain)
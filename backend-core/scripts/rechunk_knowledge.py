@@ -0,0 +1,20 @@
+"""
+Переносить документи бази знань, додані до чанкування, у чанки
+Запустити:
+    python scripts/rechunk_knowledge.py
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+from app.dependencies import get_db_manager
+
+
+if __name__ == "__main__":
+    print("✂️  Чанкування документів бази знань...")
+    started = time.perf_counter()
+
+    converted = get_db_manager().rechunk_documents()
+
+    print(f"✅ Перенесено {converted} документів за {time.perf_counter() - started:.1f}с")
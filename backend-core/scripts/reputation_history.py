@@ -0,0 +1,49 @@
+"""
+Денна історія оцінки репутації: щоденний знімок і backfill
+Запустити:
+    python scripts/reputation_history.py snapshot          # вчора і сьогодні (cron раз на день)
+    python scripts/reputation_history.py backfill --days 365
+    python scripts/reputation_history.py backfill --from 2025-01-01 --to 2025-06-30
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from datetime import date, timedelta
+from app.dependencies import get_reputation_history
+
+
+def run_snapshot(date_from: date, date_to: date):
+    print(f"📈 Знімок оцінки репутації за {date_from} - {date_to}...")
+    started = time.perf_counter()
+
+    history = get_reputation_history()
+    rows = history.snapshot(date_from, date_to)
+
+    coverage = history.stats()
+    print(f"✅ Записано {rows} рядків за {time.perf_counter() - started:.1f}с")
+    print(f"   Історія: {coverage['first_day']} - {coverage['last_day']}, {coverage['days']} днів, {coverage['brands']} брендів")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Денна історія оцінки репутації")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("snapshot", help="Перерахувати вчора і сьогодні")
+
+    backfill_parser = subparsers.add_parser("backfill", help="Перерахувати минулі дні з коментарів")
+    backfill_parser.add_argument("--days", type=int, default=90, help="Скільки днів до сьогодні")
+    backfill_parser.add_argument("--from", dest="date_from", default=None, help="Перший день (YYYY-MM-DD)")
+    backfill_parser.add_argument("--to", dest="date_to", default=None, help="Останній день (YYYY-MM-DD)")
+
+    args = parser.parse_args()
+
+    today = date.today()
+    if args.command == "snapshot":
+        run_snapshot(today - timedelta(days=1), today)
+    else:
+        date_to = date.fromisoformat(args.date_to) if args.date_to else today
+        date_from = date.fromisoformat(args.date_from) if args.date_from else date_to - timedelta(days=args.days - 1)
+        run_snapshot(date_from, date_to)
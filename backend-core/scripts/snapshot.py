@@ -0,0 +1,56 @@
+"""
+Снапшот ChromaDB: експорт/імпорт усіх колекцій без повторного embedding
+Запустити:
+    python scripts/snapshot.py export ./snapshots/2025-10-05
+    python scripts/snapshot.py import ./snapshots/2025-10-05
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from app.dependencies import get_db_manager
+
+
+def export_snapshot(target_dir: str):
+    """Експорт снапшоту"""
+    print(f"📦 Експорт снапшоту в {target_dir}...")
+    started = time.perf_counter()
+
+    manifest = get_db_manager().export_snapshot(target_dir)
+
+    for name, info in manifest["collections"].items():
+        print(f"   ✓ {name}: {info['count']} записів (dim={info['dimension']})")
+    print(f"✅ Готово за {time.perf_counter() - started:.1f}с")
+
+
+def import_snapshot(source_dir: str, batch_size: int = None):
+    """Імпорт снапшоту"""
+    print(f"📥 Імпорт снапшоту з {source_dir}...")
+    started = time.perf_counter()
+
+    restored = get_db_manager().import_snapshot(source_dir, batch_size=batch_size)
+
+    for name, count in restored.items():
+        print(f"   ✓ {name}: {count} записів")
+    print(f"✅ Готово за {time.perf_counter() - started:.1f}с")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Снапшот ChromaDB (export/import)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Записати снапшот у директорію")
+    export_parser.add_argument("path", help="Директорія снапшоту")
+
+    import_parser = subparsers.add_parser("import", help="Відновити колекції зі снапшоту")
+    import_parser.add_argument("path", help="Директорія снапшоту")
+    import_parser.add_argument("--batch-size", type=int, default=None, help="Розмір пакета для add()")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_snapshot(args.path)
+    else:
+        import_snapshot(args.path, batch_size=args.batch_size)
@@ -7,8 +7,10 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from datetime import datetime
-from app.database import db_manager
-from app.analytics import analytics_service
+from app.dependencies import get_db_manager, get_analytics_service
+
+db_manager = get_db_manager()
+analytics_service = get_analytics_service()
 
 
 def test_database():
@@ -0,0 +1,71 @@
+"""
+Тест рішень категорій, спільних для процесів (два CategoryCanonicalizer на одному SQLite)
+Запустити: python scripts/test_categories.py
+"""
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.categories import ALIASES, CATEGORY_CODES, CANONICAL_CATEGORIES, CategoryCanonicalizer
+
+UNKNOWN = "zzz qqq"
+
+
+def pointing_to(category_id: str, before=None):
+    """embed: аліас - one-hot свого коду, будь-який інший рядок - one-hot category_id
+
+    before(text) викликається перед embedding невідомого рядка (інший процес
+    вирішує той самий рядок, поки цей рахує embedding).
+    """
+    def embed(texts):
+        vectors = []
+        for text in texts:
+            code = ALIASES.get(text)
+            if code is None:
+                if before is not None:
+                    before(text)
+                code = CATEGORY_CODES[category_id]
+            vectors.append(np.eye(len(CANONICAL_CATEGORIES))[code])
+        return vectors
+    return embed
+
+
+def temp_path() -> str:
+    return os.path.join(tempfile.mkdtemp(prefix="brandpulse-categories-test-"), "categories.sqlite3")
+
+
+def test_reader_sees_other_process_decision():
+    """Рішення, збережене після старту читача, знаходить filter_mask читача"""
+    path = temp_path()
+    writer = CategoryCanonicalizer(pointing_to("payment"), path)
+    reader = CategoryCanonicalizer(pointing_to("delivery"), path)
+
+    assert reader.filter_mask([UNKNOWN]) == 0
+    assert writer.codes(UNKNOWN) == [CATEGORY_CODES["payment"]]
+    assert reader.filter_mask([UNKNOWN]) == 1 << CATEGORY_CODES["payment"]
+    print("✅ filter_mask бачить рішення іншого процесу")
+
+
+def test_concurrent_decisions_keep_stored_code():
+    """Два процеси вирішують один рядок: обидва тримають код, збережений першим"""
+    path = temp_path()
+    first = CategoryCanonicalizer(pointing_to("payment"), path)
+    # Поки second рахує embedding, first встигає зберегти своє рішення
+    second = CategoryCanonicalizer(pointing_to("delivery", before=first.codes), path)
+
+    assert second.codes(UNKNOWN) == [CATEGORY_CODES["payment"]]
+    assert first.codes(UNKNOWN) == second.codes(UNKNOWN)
+    assert second.catalog()[CATEGORY_CODES["payment"]]["learned"] == [UNKNOWN]
+    print("✅ однаковий код рядка в обох процесах")
+
+
+def main():
+    test_reader_sees_other_process_decision()
+    test_concurrent_decisions_keep_stored_code()
+
+
+if __name__ == "__main__":
+    main()
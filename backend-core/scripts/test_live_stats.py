@@ -0,0 +1,81 @@
+"""
+Тест live stats подій: оцінка репутації кожного бренду рахується по його відгуках
+Запустити: python scripts/test_live_stats.py
+"""
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from datetime import datetime
+
+from app.config import settings
+from app.analytics import AnalyticsService
+from app.database import ChromaDBManager
+from app.live import LivePublisher
+
+
+class RecordingBus:
+    """EventBus з підписниками на всі бренди, що запам'ятовує події"""
+
+    def __init__(self):
+        self.events = []
+
+    def has_subscribers(self, brand_name=None) -> bool:
+        return True
+
+    def publish(self, brand_name, event: str, data: dict):
+        self.events.append((brand_name, event, data))
+
+    def resync_all(self):
+        pass
+
+
+def comments(brand_name: str, sentiment: str, rating: float, count: int) -> list:
+    return [
+        {
+            "body": f"{brand_name} відгук {i}",
+            "timestamp": datetime.now(),
+            "rating": rating,
+            "platform": "app_store",
+            "sentiment": sentiment,
+            "severity": "low" if sentiment == "positive" else "high",
+            "brand_name": brand_name,
+            "category": "сервіс"
+        }
+        for i in range(count)
+    ]
+
+
+def test_stats_score_per_brand():
+    """Позитивний і негативний бренди отримують різні оцінки"""
+    # Окрема тимчасова база і офлайн embedding
+    settings.CHROMA_PERSIST_DIR = tempfile.mkdtemp(prefix="brandpulse-live-test-")
+    settings.EMBEDDING_BACKEND = "hash"
+    db_manager = ChromaDBManager()
+    analytics_service = AnalyticsService(db_manager, openai=None)
+    bus = RecordingBus()
+    publisher = LivePublisher(bus, db_manager, analytics_service)
+    db_manager.add_change_listener(publisher.on_change)
+
+    db_manager.add_comments(comments("Happy", "positive", 5.0, 6))
+    db_manager.add_comments(comments("Angry", "negative", 1.0, 6))
+    while not publisher._changes.empty():
+        publisher._dispatch(*publisher._changes.get_nowait())
+    publisher._flush_stats(force=True)
+
+    stats = {brand: data for brand, event, data in bus.events if event == "stats"}
+    assert set(stats) == {"Happy", "Angry"}, stats
+    assert stats["Happy"]["reputation_score"] == analytics_service.calculate_reputation_score(brand_name="Happy")["overall_score"]
+    assert stats["Happy"]["reputation_score"] > stats["Angry"]["reputation_score"], stats
+    assert stats["Happy"]["risk_level"] == "low" and stats["Angry"]["risk_level"] == "high", stats
+    print(f"✅ Happy {stats['Happy']['reputation_score']} / Angry {stats['Angry']['reputation_score']}")
+
+
+def main():
+    test_stats_score_per_brand()
+
+
+if __name__ == "__main__":
+    main()
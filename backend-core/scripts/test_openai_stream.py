@@ -0,0 +1,94 @@
+"""
+Тест стрімінгу OpenAI на справжніх ChatCompletionChunk (openai SDK з requirements)
+Запустити: python scripts/test_openai_stream.py
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from openai.types.chat import ChatCompletionChunk
+
+from app.metrics import OPENAI_TOKENS
+from app.models import ResponseTone
+from app.openai_service import OpenAIService, DRAFT_TONE_MARKER, DRAFT_ACTIONS_MARKER
+
+
+def make_chunk(content: str = None, usage: dict = None) -> ChatCompletionChunk:
+    """Chunk як його будує SDK; usage-only chunk (include_usage) - без choices"""
+    data = {"id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "test", "choices": []}
+    if content is not None:
+        data["choices"] = [{"index": 0, "delta": {"content": content}, "finish_reason": None}]
+    if usage is not None:
+        data["usage"] = usage
+    return ChatCompletionChunk.model_validate(data)
+
+
+class FakeCompletions:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def create(self, **kwargs):
+        assert kwargs["stream"] is True
+        return iter(self.chunks)
+
+
+class FakeClient:
+    def __init__(self, chunks):
+        self.chat = type("Chat", (), {"completions": FakeCompletions(chunks)})()
+
+
+def make_service(pieces):
+    usage = {"prompt_tokens": 12, "completion_tokens": 5, "total_tokens": 17}
+    service = OpenAIService()
+    service.client = FakeClient([make_chunk(piece) for piece in pieces] + [make_chunk(usage=usage)])
+    return service
+
+
+def tokens(operation: str, kind: str) -> float:
+    return OPENAI_TOKENS.labels(operation=operation, kind=kind)._value.get()
+
+
+def test_chat_stream_reads_usage_chunk():
+    """Останній usage-only chunk дає usage у "done" і метриках, без "error" """
+    service = make_service(["Прив", "іт"])
+    prompt_before = tokens("answer_chat_query", "prompt")
+
+    events = list(service.stream_chat_answer("Як справи?", {}))
+
+    assert [e["event"] for e in events] == ["token", "token", "done"], events
+    assert "".join(e["data"]["text"] for e in events if e["event"] == "token") == "Привіт"
+    usage = events[-1]["data"]["usage"]
+    assert usage["prompt_tokens"] == 12 and usage["completion_tokens"] == 5
+    assert tokens("answer_chat_query", "prompt") - prompt_before == 12
+    print("✅ stream_chat_answer: usage з останнього chunk-а")
+
+
+def test_draft_stream_keeps_last_draft():
+    """Остання чернетка - зі стріму, а не fallback"""
+    text = (
+        f"{DRAFT_TONE_MARKER} official\nДякуємо за відгук.\n{DRAFT_ACTIONS_MARKER} перевірити замовлення\n"
+        f"{DRAFT_TONE_MARKER} friendly\nОй, нам дуже шкода!"
+    )
+    service = make_service([text[i:i + 7] for i in range(0, len(text), 7)])
+
+    events = list(service.stream_response_drafts(
+        "Замовлення не прийшло", "Zara", "", [ResponseTone.OFFICIAL, ResponseTone.FRIENDLY]
+    ))
+
+    assert "error" not in [e["event"] for e in events], events
+    drafts = {e["data"]["tone"]: e["data"] for e in events if e["event"] == "draft"}
+    assert drafts["official"]["text"] == "Дякуємо за відгук."
+    assert drafts["official"]["action_items"] == ["перевірити замовлення"]
+    assert drafts["friendly"]["text"] == "Ой, нам дуже шкода!"
+    assert events[-1]["data"]["usage"]["completion_tokens"] == 5
+    print("✅ stream_response_drafts: обидві чернетки зі стріму, usage у done")
+
+
+def main():
+    test_chat_stream_reads_usage_chunk()
+    test_draft_stream_keeps_last_draft()
+
+
+if __name__ == "__main__":
+    main()